@@ -0,0 +1,200 @@
+"""
+内容寻址的上传文件存储
+
+文件按 SHA-256 保存在 {root}/{hash[0:2]}/{hash[2:4]}/{hash}，相同内容只存一份。
+任务通过哈希引用文件，引用计数归零时删除文件。
+上传先写入临时文件并同时计算哈希，完成后原子地移动到最终位置。
+没有任务引用的文件（只上传未创建任务、导入失败、服务重启前遗留）按变为无引用的时间记录，
+由保留策略在宽限期后回收。
+"""
+import hashlib
+import os
+import tempfile
+import time
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def valid_digest(digest: str) -> bool:
+    return len(digest) == 64 and all(c in "0123456789abcdef" for c in digest)
+
+
+class BlobStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        # 哈希 -> 引用该文件的任务数
+        self._refs: Dict[str, int] = {}
+        # 没有引用的文件: 哈希 -> 变为无引用的时间，按时间先后排列
+        self._orphans: Dict[str, float] = {}
+        self.total_bytes = 0
+        self.dedup_hits = 0
+        self.bytes_saved = 0
+        self.bytes_freed = 0
+        self._scan()
+
+    def _scan(self):
+        """启动时登记已有文件；引用计数只在内存中，重启前的文件都视为无引用"""
+        found = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if directory == self.tmp_dir:
+                    # 上次退出时未完成的上传
+                    os.remove(path)
+                elif valid_digest(filename) and path == self.path(filename):
+                    self.total_bytes += stat.st_size
+                    found.append((stat.st_mtime, filename))
+        for mtime, digest in sorted(found):
+            self._orphans[digest] = mtime
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest: str) -> bool:
+        return valid_digest(digest) and os.path.isfile(self.path(digest))
+
+    def size(self, digest: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(digest))
+        except OSError:
+            return None
+
+    def _commit(self, tmp_path: str, digest: str, size: int) -> str:
+        """把临时文件移动到内容地址，已存在相同内容时丢弃临时文件"""
+        path = self.path(digest)
+        if os.path.isfile(path):
+            os.remove(tmp_path)
+            self.dedup_hits += 1
+            self.bytes_saved += size
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            self.total_bytes += size
+        if not self._refs.get(digest):
+            # 重新计时，避免刚上传的文件在被任务引用前就被回收
+            self._orphans.pop(digest, None)
+            self._orphans[digest] = time.time()
+        return path
+
+    def writer(self) -> "BlobWriter":
+        return BlobWriter(self)
+
+    def save_stream(self, source: BinaryIO) -> Tuple[str, int]:
+        """从同步文件对象保存，返回 (哈希, 字节数)"""
+        with self.writer() as writer:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        return writer.digest, writer.size
+
+    async def save_upload(self, upload) -> Tuple[str, int]:
+        """分块保存 UploadFile，返回 (哈希, 字节数)"""
+        with self.writer() as writer:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+        return writer.digest, writer.size
+
+    def acquire(self, digest: str):
+        self._refs[digest] = self._refs.get(digest, 0) + 1
+        self._orphans.pop(digest, None)
+
+    def release(self, digest: str):
+        """释放引用，最后一个引用释放时删除文件"""
+        count = self._refs.get(digest, 0) - 1
+        if count > 0:
+            self._refs[digest] = count
+            return
+        self._refs.pop(digest, None)
+        self.discard(digest)
+
+    def retarget(self, old: Iterable[str], new: Iterable[str]):
+        """任务引用的文件从 old 变为 new 时调整引用计数，先增后减避免误删"""
+        for digest in new:
+            self.acquire(digest)
+        for digest in old:
+            self.release(digest)
+
+    def refcount(self, digest: str) -> int:
+        return self._refs.get(digest, 0)
+
+    def discard(self, digest: str) -> bool:
+        """删除没有引用的文件"""
+        if self._refs.get(digest) or not valid_digest(digest):
+            return False
+        self._orphans.pop(digest, None)
+        path = self.path(digest)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        self.total_bytes = max(0, self.total_bytes - size)
+        self.bytes_freed += size
+        return True
+
+    def reclaim_orphans(self, grace: float, now: Optional[float] = None) -> int:
+        """删除无引用超过 grace 秒的文件，返回删除的文件数"""
+        cutoff = (time.time() if now is None else now) - grace
+        expired = []
+        for digest, since in self._orphans.items():
+            if since > cutoff:
+                break
+            expired.append(digest)
+        removed = 0
+        for digest in expired:
+            if self.discard(digest):
+                removed += 1
+            self._orphans.pop(digest, None)
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "referenced_blobs": len(self._refs),
+            "references": sum(self._refs.values()),
+            "orphan_blobs": len(self._orphans),
+            "total_bytes": self.total_bytes,
+            "dedup_hits": self.dedup_hits,
+            "bytes_saved": self.bytes_saved,
+            "bytes_freed": self.bytes_freed,
+        }
+
+
+class BlobWriter:
+    """边写临时文件边计算哈希，正常退出时提交，异常时删除临时文件"""
+
+    def __init__(self, store: BlobStore):
+        self._store = store
+        self._sha = hashlib.sha256()
+        fd, self._tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+        self._file = os.fdopen(fd, "wb")
+        self.size = 0
+        self.digest: Optional[str] = None
+
+    def write(self, chunk: bytes):
+        self._sha.update(chunk)
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return False
+        self.digest = self._sha.hexdigest()
+        self._store._commit(self._tmp_path, self.digest, self.size)
+        return False
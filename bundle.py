@@ -0,0 +1,268 @@
+"""
+任务归档包
+
+把多个任务打包成一个 tar 流（可选 gzip/zstd 压缩），每个任务一个目录：
+    tasks/{id}/task.json          任务元数据（不含日志）
+    tasks/{id}/logs.ndjson        日志，每行一个 {offset, ts, level, content}
+    tasks/{id}/file/{文件名}       任务输入文件
+    tasks/{id}/result_file/{文件名} 结果文件
+    tasks/{id}/streams.json       可续传发送流已接收的行数（仅停机快照）
+导出时边生成边发送，不产生临时文件；导入时在线程中以流方式解析，文件直接写入文件存储。
+"""
+import asyncio
+import io
+import os
+import tarfile
+import zlib
+from typing import Any, AsyncIterator, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+import codec
+import framing
+from schemas import Task, TaskLog
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 可选依赖
+    zstandard = None
+
+BLOCK_SIZE = tarfile.BLOCKSIZE
+RECORD_SIZE = tarfile.RECORDSIZE
+FILE_CHUNK_SIZE = 1024 * 1024
+LOG_CHUNK_LINES = 1000
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+BUNDLE_MEDIA_TYPES = {
+    "none": ("application/x-tar", "tar"),
+    "gzip": ("application/gzip", "tar.gz"),
+    "zstd": ("application/zstd", "tar.zst"),
+}
+
+
+def available_compressions() -> List[str]:
+    return ["none", "gzip"] + (["zstd"] if zstandard is not None else [])
+
+
+def _header(name: str, size: int, mtime: float) -> bytes:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime)
+    info.mode = 0o644
+    return info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8")
+
+
+def _padding(size: int) -> bytes:
+    remainder = size % BLOCK_SIZE
+    return b"\0" * (BLOCK_SIZE - remainder) if remainder else b""
+
+
+def _log_line(offset: int, log: TaskLog) -> bytes:
+    return codec.dumps(framing.log_entry(offset, log)) + b"\n"
+
+
+class BundleWriter:
+    """按块生成 tar 流"""
+
+    def __init__(self):
+        self.written = 0
+
+    def _emit(self, data: bytes) -> bytes:
+        self.written += len(data)
+        return data
+
+    async def member(self, name: str, data: bytes, mtime: float) -> AsyncIterator[bytes]:
+        yield self._emit(_header(name, len(data), mtime) + data + _padding(len(data)))
+
+    async def logs_member(self, name: str, logs: List[TaskLog], mtime: float) -> AsyncIterator[bytes]:
+        """日志成员需要先知道总大小：第一遍只计算长度，第二遍分块输出"""
+        count = len(logs)
+        size = 0
+        for offset in range(count):
+            size += len(_log_line(offset, logs[offset]))
+            if offset % LOG_CHUNK_LINES == 0:
+                await asyncio.sleep(0)
+        yield self._emit(_header(name, size, mtime))
+        for start in range(0, count, LOG_CHUNK_LINES):
+            yield self._emit(b"".join(
+                _log_line(offset, logs[offset])
+                for offset in range(start, min(start + LOG_CHUNK_LINES, count))))
+            await asyncio.sleep(0)
+        yield self._emit(_padding(size))
+
+    async def file_member(self, name: str, path: str) -> AsyncIterator[bytes]:
+        stat = os.stat(path)
+        yield self._emit(_header(name, stat.st_size, stat.st_mtime))
+        remaining = stat.st_size
+        with open(path, "rb") as f:
+            while remaining > 0:
+                chunk = f.read(min(FILE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise IOError(f"文件在导出过程中被截断: {path}")
+                remaining -= len(chunk)
+                yield self._emit(chunk)
+                await asyncio.sleep(0)
+        yield self._emit(_padding(stat.st_size))
+
+    def end(self) -> bytes:
+        """两个全零块结束归档，并补齐到完整记录"""
+        size = self.written + 2 * BLOCK_SIZE
+        remainder = size % RECORD_SIZE
+        tail = 2 * BLOCK_SIZE + (RECORD_SIZE - remainder if remainder else 0)
+        return self._emit(b"\0" * tail)
+
+
+async def iter_bundle(task_ids: List[str], get_task: Callable[[str], Optional[Task]],
+                      include_files: bool = True,
+                      get_streams: Optional[Callable[[str], Optional[dict]]] = None) -> AsyncIterator[bytes]:
+    """逐个任务生成tar成员，导出过程中被删除的任务跳过
+
+    停机快照不包含文件（文件存储在重启后仍然存在），但包含发送流的接收位置。
+    """
+    writer = BundleWriter()
+    for task_id in task_ids:
+        task = get_task(task_id)
+        if task is None:
+            continue
+        prefix = f"tasks/{task.id}"
+        mtime = task.updated_at.timestamp()
+        meta = codec.dumps(task.model_dump(mode="json", exclude={"logs"}))
+        async for chunk in writer.member(f"{prefix}/task.json", meta, mtime):
+            yield chunk
+        async for chunk in writer.logs_member(f"{prefix}/logs.ndjson", task.logs, mtime):
+            yield chunk
+        streams = get_streams(task.id) if get_streams is not None else None
+        if streams:
+            async for chunk in writer.member(f"{prefix}/streams.json", codec.dumps(streams), mtime):
+                yield chunk
+        if not include_files:
+            continue
+        file_path = task.params.get("file_path")
+        if file_path and os.path.isfile(file_path):
+            filename = os.path.basename(task.params.get("original_filename") or file_path)
+            name = f"{prefix}/file/{filename}"
+            async for chunk in writer.file_member(name, file_path):
+                yield chunk
+        result_path = (task.result or {}).get("file_path")
+        if result_path and os.path.isfile(result_path):
+            filename = os.path.basename(task.result.get("original_filename") or result_path)
+            async for chunk in writer.file_member(f"{prefix}/result_file/{filename}", result_path):
+                yield chunk
+    yield writer.end()
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], compression: str) -> AsyncIterator[bytes]:
+    if compression == "none":
+        async for chunk in chunks:
+            yield chunk
+        return
+    if compression == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+    else:
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class AsyncStreamReader(io.RawIOBase):
+    """在工作线程中以同步文件接口读取事件循环上的异步字节流"""
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks
+        self._loop = loop
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(
+                    self._chunks.__anext__(), self._loop).result()
+                self._buffer = memoryview(chunk)
+            except StopAsyncIteration:
+                self._eof = True
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def open_bundle(raw: io.RawIOBase) -> tarfile.TarFile:
+    """按魔数识别压缩格式，以流模式打开tar"""
+    stream = io.BufferedReader(raw, FILE_CHUNK_SIZE)
+    if stream.peek(4)[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise ValueError("服务端未安装 zstandard，无法导入 zstd 压缩的归档")
+        stream = zstandard.ZstdDecompressor().stream_reader(stream)
+    return tarfile.open(fileobj=stream, mode="r|*")
+
+
+def _check_meta(meta: Any) -> dict:
+    """task.json 及其中的 params、result 须为JSON对象"""
+    if not isinstance(meta, dict):
+        raise ValueError("task.json 不是JSON对象")
+    for key in ("params", "result"):
+        if meta.get(key) is not None and not isinstance(meta[key], dict):
+            raise ValueError(f"task.json 中的 {key} 不是JSON对象")
+    return meta
+
+
+def read_bundle(raw: io.RawIOBase, save: Callable[[BinaryIO], Tuple[str, int]],
+                discard: Callable[[str], bool]) -> Dict[str, dict]:
+    """解析归档，文件内容交给 save 保存并返回 (哈希, 字节数)
+
+    返回 原任务ID -> {"meta", "logs", "file", "result_file", "streams"}，按归档中的顺序排列，
+    文件项为 (哈希, 文件名)。失败时对已保存的文件调用 discard（仍被引用的文件不会删除）。
+    """
+    records: Dict[str, dict] = {}
+    saved: List[str] = []
+    try:
+        with open_bundle(raw) as archive:
+            for member in archive:
+                if not member.isfile():
+                    continue
+                parts = member.name.split("/")
+                if len(parts) < 3 or parts[0] != "tasks":
+                    continue
+                record = records.setdefault(parts[1], {
+                    "meta": None, "logs": [], "file": None, "result_file": None, "streams": None})
+                source = archive.extractfile(member)
+                kind = parts[2]
+                if kind == "task.json" and len(parts) == 3:
+                    record["meta"] = _check_meta(codec.loads(source.read()))
+                elif kind == "logs.ndjson" and len(parts) == 3:
+                    for line in source:
+                        if line.strip():
+                            entry = codec.loads(line)
+                            if not isinstance(entry, dict):
+                                raise ValueError("日志行不是JSON对象")
+                            record["logs"].append(TaskLog(
+                                timestamp=entry.get("ts") or "", content=entry["content"],
+                                level=entry.get("level") or "info"))
+                elif kind == "streams.json" and len(parts) == 3:
+                    record["streams"] = codec.loads(source.read())
+                    if not isinstance(record["streams"], dict):
+                        raise ValueError("streams.json 不是JSON对象")
+                elif kind in ("file", "result_file") and len(parts) == 4:
+                    digest, _ = save(source)
+                    saved.append(digest)
+                    record[kind] = (digest, os.path.basename(parts[3]))
+    except (tarfile.TarError, EOFError, zlib.error, ValueError, KeyError) as e:
+        for digest in saved:
+            discard(digest)
+        raise ValueError(f"无效的归档: {e}") from e
+    except BaseException:
+        for digest in saved:
+            discard(digest)
+        raise
+    # 没有元数据的目录无法还原为任务，丢弃其中的文件
+    for record in records.values():
+        if record["meta"] is None:
+            for kind in ("file", "result_file"):
+                if record[kind]:
+                    discard(record[kind][0])
+    return {source_id: record for source_id, record in records.items() if record["meta"] is not None}
@@ -0,0 +1,97 @@
+"""
+序列化结果缓存
+
+按 (task_id, version, view) 缓存已编码的响应体，总字节数超过上限时按LRU淘汰。
+版本号是键的一部分，任务变更后旧条目不会再命中；写入路径仍会主动清理，尽快释放内存。
+"""
+import os
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get(
+    "RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+CacheKey = Tuple[str, int, str]
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[CacheKey, bytes]" = OrderedDict()
+        # task_id -> 该任务的所有缓存键，用于按任务失效
+        self._task_keys: Dict[str, Set[CacheKey]] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, task_id: str, version: int, view: str) -> Optional[bytes]:
+        key = (task_id, version, view)
+        body = self._entries.get(key)
+        if body is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return body
+
+    def put(self, task_id: str, version: int, view: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        key = (task_id, version, view)
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._entries[key] = body
+        self._task_keys.setdefault(task_id, set()).add(key)
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            self._evict()
+
+    def get_or_encode(self, task_id: str, version: int, view: str,
+                      encode: Callable[[], bytes]) -> bytes:
+        """命中时直接返回缓存的字节，否则编码后写入缓存"""
+        body = self.get(task_id, version, view)
+        if body is None:
+            body = encode()
+            self.put(task_id, version, view, body)
+        return body
+
+    def task_bytes(self, task_id: str) -> int:
+        """任务当前缓存的各视图字节数之和"""
+        return sum(len(self._entries[key]) for key in self._task_keys.get(task_id, ()))
+
+    def invalidate(self, task_id: str):
+        """删除任务的所有缓存视图"""
+        keys = self._task_keys.pop(task_id, None)
+        if not keys:
+            return
+        for key in keys:
+            body = self._entries.pop(key, None)
+            if body is not None:
+                self.size -= len(body)
+        self.invalidations += 1
+
+    def _evict(self):
+        key, body = self._entries.popitem(last=False)
+        self.size -= len(body)
+        self.evictions += 1
+        keys = self._task_keys.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._task_keys[key[0]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,11 +1,11 @@
 import click
-import requests
 import json
 import os
-import websockets
 import asyncio
 import sys
-from datetime import datetime
+import time
+
+from sdk import AsyncTaskClient, TaskClient, msgpack, run_bounded
 
 # 服务器地址
 BASE_URL = "http://localhost:8000"
@@ -33,23 +33,14 @@ def cli():
 @cli.command()
 @click.argument('params_file', type=click.Path(exists=True))
 @click.argument('file_path', type=click.Path(exists=True), required=False)
-def create(params_file, file_path):
-    """创建新任务"""
+@click.option('--no-dedupe', is_flag=True, help='总是上传文件，不先按哈希检查服务端是否已有')
+def create(params_file, file_path, no_dedupe):
+    """创建新任务，服务端已有相同内容的文件时跳过上传"""
     try:
         params = load_json_file(params_file)
+        with TaskClient(BASE_URL) as client:
+            task = client.create_task(params, file_path, dedupe=not no_dedupe)
 
-        # 准备请求数据
-        files = {}
-        if file_path:
-            files['file'] = ('file', open(file_path, 'rb'))
-
-        data = {'params': json.dumps(params)}
-
-        # 发送请求
-        response = requests.post(f"{BASE_URL}/tasks", files=files, data=data)
-        response.raise_for_status()
-
-        task = response.json()
         click.echo(f"任务创建成功: {task['id']}")
         save_json_file(task, f"task_{task['id']}.json")
 
@@ -58,17 +49,30 @@ def create(params_file, file_path):
         sys.exit(1)
 
 
+@cli.command('list')
+@click.option('--limit', type=int, default=20, show_default=True, help='最多列出的任务数')
+@click.option('--all', 'list_all', is_flag=True, help='分页列出全部任务（从旧到新）')
+def list_tasks(limit, list_all):
+    """列出最新的任务"""
+    try:
+        with TaskClient(BASE_URL) as client:
+            listed = client.iter_tasks() if list_all else client.list_tasks(limit=limit, order="desc")
+            for task in listed:
+                click.echo(f"{task['id']}  {task['status']:<9}  {task['created_at']}")
+
+    except Exception as e:
+        click.echo(f"列出任务失败: {str(e)}", err=True)
+        sys.exit(1)
+
+
 @cli.command()
 @click.argument('task_id')
 @click.argument('output_path', type=click.Path())
 def get_file(task_id, output_path):
     """获取任务文件"""
     try:
-        response = requests.get(f"{BASE_URL}/tasks/{task_id}/file")
-        response.raise_for_status()
-
-        with open(output_path, 'wb') as f:
-            f.write(response.content)
+        with TaskClient(BASE_URL) as client:
+            client.download_file(task_id, output_path)
         click.echo(f"文件已保存到: {output_path}")
 
     except Exception as e:
@@ -84,18 +88,8 @@ def push_result(task_id, result_file, file_path):
     """提交任务结果"""
     try:
         result = load_json_file(result_file)
-
-        # 准备请求数据
-        files = {}
-        if file_path:
-            files['file'] = ('file', open(file_path, 'rb'))
-
-        data = {'result_params': json.dumps(result)}
-
-        # 发送请求
-        response = requests.post(
-            f"{BASE_URL}/tasks/{task_id}/result", files=files, data=data)
-        response.raise_for_status()
+        with TaskClient(BASE_URL) as client:
+            client.submit_result(task_id, result, file_path)
 
         click.echo("结果提交成功")
 
@@ -107,13 +101,12 @@ def push_result(task_id, result_file, file_path):
 @cli.command()
 @click.argument('task_id')
 @click.argument('output_file', type=click.Path())
-def get_result(task_id, output_file):
+@click.option('--pointer', default=None, help='只获取结果中的一个节点，如 /output/summary')
+def get_result(task_id, output_file, pointer):
     """获取任务结果"""
     try:
-        response = requests.get(f"{BASE_URL}/tasks/{task_id}/result")
-        response.raise_for_status()
-
-        result = response.json()
+        with TaskClient(BASE_URL) as client:
+            result = client.get_result(task_id, pointer)
         save_json_file(result, output_file)
         click.echo(f"结果已保存到: {output_file}")
 
@@ -125,14 +118,16 @@ def get_result(task_id, output_file):
 @cli.command()
 @click.argument('task_id')
 @click.argument('output_file', type=click.Path())
-def get_log(task_id, output_file):
-    """获取任务日志"""
+@click.option('--format', 'output_format', type=click.Choice(['json', 'ndjson', 'text']),
+              default='json', show_default=True, help='输出格式')
+@click.option('--gzip', 'compressed', is_flag=True, help='保存gzip压缩后的数据')
+def get_log(task_id, output_file, output_format, compressed):
+    """获取任务日志，边下载边写入文件"""
     try:
-        response = requests.get(f"{BASE_URL}/tasks/{task_id}/logs")
-        response.raise_for_status()
-
-        logs = response.json()
-        save_json_file(logs, output_file)
+        with TaskClient(BASE_URL) as client:
+            # 与之前的输出保持相同的字段（timestamp/content/level），避免解析输出的脚本失效
+            client.export_logs(task_id, output_file, output_format, compressed,
+                               fields=None if output_format == "text" else "log")
         click.echo(f"日志已保存到: {output_file}")
 
     except Exception as e:
@@ -140,30 +135,443 @@ def get_log(task_id, output_file):
         sys.exit(1)
 
 
-async def sender_websocket(task_id):
-    """WebSocket发送者"""
-    uri = f"{WS_URL}/ws/sender"
+@cli.command()
+@click.argument('output_file', type=click.Path())
+@click.option('--format', 'output_format', type=click.Choice(['ndjson', 'json']),
+              default='ndjson', show_default=True, help='输出格式')
+@click.option('--status', multiple=True, help='只导出这些状态的任务，可重复指定')
+@click.option('--gzip', 'compressed', is_flag=True, help='保存gzip压缩后的数据')
+def export_tasks(output_file, output_format, status, compressed):
+    """导出任务列表"""
+    try:
+        with TaskClient(BASE_URL) as client:
+            client.export_tasks(output_file, output_format, compressed, list(status))
+        click.echo(f"任务已导出到: {output_file}")
+
+    except Exception as e:
+        click.echo(f"导出任务失败: {str(e)}", err=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('output_file', type=click.Path())
+@click.argument('task_ids', nargs=-1)
+@click.option('--ids-file', type=click.Path(exists=True), help='任务ID文件，每行一个')
+@click.option('--status', multiple=True, help='未指定ID时只导出这些状态的任务，可重复指定')
+@click.option('--compression', type=click.Choice(['gzip', 'zstd', 'none']), default='gzip',
+              show_default=True, help='归档压缩格式')
+def export_bundle(output_file, task_ids, ids_file, status, compression):
+    """把任务（参数、文件、结果、日志）导出为tar归档"""
+    try:
+        ids = list(task_ids)
+        if ids_file:
+            ids = load_ids(task_ids, ids_file)
+        with TaskClient(BASE_URL) as client:
+            client.export_bundle(output_file, ids, list(status), compression)
+        click.echo(f"归档已保存到: {output_file}")
+
+    except Exception as e:
+        click.echo(f"导出归档失败: {str(e)}", err=True)
+        sys.exit(1)
+
+
+@cli.command()
+@click.argument('bundle_file', type=click.Path(exists=True))
+def import_bundle(bundle_file):
+    """导入tar归档，输出原任务ID到新任务ID的映射"""
     try:
-        async with websockets.connect(uri) as websocket:
-            # 发送初始化数据
-            await websocket.send(json.dumps({"task_id": task_id}))
-            click.echo("WebSocket连接已建立，开始发送数据...")
-
-            # 从标准输入读取并发送数据
-            while True:
-                try:
-                    line = await asyncio.get_event_loop().run_in_executor(None, sys.stdin.readline)
-                    if not line:
-                        click.echo("输入流已关闭")
-                        break
-                    await websocket.send(line)
-                except KeyboardInterrupt:
-                    click.echo("\n检测到键盘中断，正在关闭连接...")
-                    break
-                except Exception as e:
-                    click.echo(f"读取输入时发生错误: {str(e)}", err=True)
-                    break
+        with TaskClient(BASE_URL) as client:
+            result = client.import_bundle(bundle_file)
+        for item in result["tasks"]:
+            click.echo(f"{item['source_id']} -> {item['id']}")
+        click.echo(f"已导入 {result['count']} 个任务")
+
+    except Exception as e:
+        click.echo(f"导入归档失败: {str(e)}", err=True)
+        sys.exit(1)
+
+
+def load_ids(task_ids, ids_file):
+    """合并命令行参数和ID文件（每行一个ID）中的任务ID"""
+    ids = list(task_ids)
+    if ids_file:
+        with open(ids_file, 'r', encoding='utf-8') as f:
+            ids.extend(line.strip() for line in f if line.strip())
+    if not ids:
+        raise click.UsageError("至少需要一个任务ID")
+    return ids
+
+
+def load_manifest(manifest_file):
+    """加载清单文件，支持JSON数组或每行一个JSON对象"""
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if content.lstrip().startswith('['):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+def finish_bulk(report, started, report_file):
+    """输出批量操作汇总，有失败时以非零状态退出"""
+    report["elapsed"] = round(time.monotonic() - started, 3)
+    click.echo(f"完成: 共 {report['total']} 个, 成功 {report['succeeded']} 个, "
+               f"失败 {len(report['failed'])} 个, 耗时 {report['elapsed']}s")
+    for failure in report["failed"]:
+        click.echo(f"  {failure['item']}: {failure['error']}", err=True)
+    if report_file:
+        save_json_file(report, report_file)
+    if report["failed"]:
+        sys.exit(1)
+
+
+def new_report(total):
+    return {"total": total, "succeeded": 0, "failed": []}
+
+
+def record_errors(report, errors):
+    report["failed"].extend({"item": item, "error": str(e)} for item, e in errors)
+
+
+async def bulk_fetch_views(task_ids, view, output_dir, suffix, concurrency):
+    """分批获取任务视图并逐个写入输出目录"""
+    os.makedirs(output_dir, exist_ok=True)
+    report = new_report(len(task_ids))
+    # 日志可能很大，减小单批数量
+    chunk_size = 50 if view == "logs" else 500
+    chunks = [task_ids[i:i + chunk_size] for i in range(0, len(task_ids), chunk_size)]
+
+    async with AsyncTaskClient(BASE_URL, WS_URL, max_connections=concurrency) as client:
+        async def fetch(chunk):
+            items, missing = await client.batch_get(chunk, view)
+            for task_id, data in items.items():
+                if data is None:
+                    report["failed"].append({"item": task_id, "error": "任务结果不存在"})
+                    continue
+                save_json_file(data, os.path.join(output_dir, f"task_{task_id}{suffix}"))
+                report["succeeded"] += 1
+            report["failed"].extend({"item": task_id, "error": "任务不存在"} for task_id in missing)
+
+        _, errors = await run_bounded(chunks, fetch, concurrency)
+    for chunk, e in errors:
+        record_errors(report, [(task_id, e) for task_id in chunk])
+    return report
+
+
+async def bulk_download_files(task_ids, output_dir, concurrency):
+    os.makedirs(output_dir, exist_ok=True)
+    report = new_report(len(task_ids))
+    async with AsyncTaskClient(BASE_URL, WS_URL, max_connections=concurrency) as client:
+        results, errors = await run_bounded(
+            task_ids,
+            lambda task_id: client.download_file(
+                task_id, os.path.join(output_dir, f"task_{task_id}_file")),
+            concurrency)
+    report["succeeded"] = len(results)
+    record_errors(report, errors)
+    return report
+
+
+async def bulk_push_results(entries, concurrency):
+    report = new_report(len(entries))
+    async with AsyncTaskClient(BASE_URL, WS_URL, max_connections=concurrency) as client:
+        async def push(entry):
+            result = entry.get("result")
+            if result is None:
+                result = load_json_file(entry["result_file"])
+            await client.submit_result(entry["task_id"], result, entry.get("file"))
+
+        results, errors = await run_bounded(entries, push, concurrency)
+    report["succeeded"] = len(results)
+    record_errors(report, [(entry.get("task_id"), e) for entry, e in errors])
+    return report
+
+
+async def bulk_create_tasks(entries, output_dir, concurrency):
+    """输入文件按内容去重后并发上传，任务全部走批量接口按哈希引用文件创建"""
+    report = new_report(len(entries))
+    report["created"] = []
+    params_of = [entry.get("params") if entry.get("params") is not None
+                 else load_json_file(entry["params_file"]) for entry in entries]
+    file_paths = list(dict.fromkeys(entry["file"] for entry in entries if entry.get("file")))
+    digests = {}
+
+    async with AsyncTaskClient(BASE_URL, WS_URL, max_connections=concurrency) as client:
+        async def upload(file_path):
+            digests[file_path] = await client.ensure_blob(file_path)
+
+        _, errors = await run_bounded(file_paths, upload, concurrency)
+        # 文件上传失败的任务不创建
+        ready = [(params, entry.get("file")) for entry, params in zip(entries, params_of)
+                 if not entry.get("file") or entry["file"] in digests]
+        created = await client.create_tasks(
+            [params for params, _ in ready],
+            [(digests[file_path], os.path.basename(file_path)) if file_path else None
+             for _, file_path in ready]) if ready else []
+
+    for task in created:
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+            save_json_file(task, os.path.join(output_dir, f"task_{task['id']}.json"))
+        report["created"].append(task["id"])
+    report["succeeded"] = len(report["created"])
+    record_errors(report, errors)
+    return report
+
+
+concurrency_option = click.option('--concurrency', default=16, show_default=True,
+                                  help='最大并发请求数')
+report_option = click.option('--report', 'report_file', type=click.Path(),
+                             help='把汇总报告写入JSON文件')
+ids_file_option = click.option('--ids-file', type=click.Path(exists=True),
+                               help='任务ID文件，每行一个ID')
+
+
+@cli.group()
+def bulk():
+    """批量操作：一次处理多个任务"""
+    pass
 
+
+@bulk.command('get-result')
+@click.argument('task_ids', nargs=-1)
+@ids_file_option
+@click.option('--output-dir', type=click.Path(), required=True, help='结果输出目录')
+@concurrency_option
+@report_option
+def bulk_get_result(task_ids, ids_file, output_dir, concurrency, report_file):
+    """批量获取任务结果"""
+    started = time.monotonic()
+    ids = load_ids(task_ids, ids_file)
+    report = asyncio.run(bulk_fetch_views(ids, "result", output_dir, "_result.json", concurrency))
+    finish_bulk(report, started, report_file)
+
+
+@bulk.command('get-log')
+@click.argument('task_ids', nargs=-1)
+@ids_file_option
+@click.option('--output-dir', type=click.Path(), required=True, help='日志输出目录')
+@concurrency_option
+@report_option
+def bulk_get_log(task_ids, ids_file, output_dir, concurrency, report_file):
+    """批量获取任务日志"""
+    started = time.monotonic()
+    ids = load_ids(task_ids, ids_file)
+    report = asyncio.run(bulk_fetch_views(ids, "logs", output_dir, "_log.json", concurrency))
+    finish_bulk(report, started, report_file)
+
+
+@bulk.command('get-file')
+@click.argument('task_ids', nargs=-1)
+@ids_file_option
+@click.option('--output-dir', type=click.Path(), required=True, help='文件输出目录')
+@concurrency_option
+@report_option
+def bulk_get_file(task_ids, ids_file, output_dir, concurrency, report_file):
+    """批量下载任务文件"""
+    started = time.monotonic()
+    ids = load_ids(task_ids, ids_file)
+    report = asyncio.run(bulk_download_files(ids, output_dir, concurrency))
+    finish_bulk(report, started, report_file)
+
+
+@bulk.command('push-result')
+@click.argument('manifest_file', type=click.Path(exists=True))
+@concurrency_option
+@report_option
+def bulk_push_result(manifest_file, concurrency, report_file):
+    """批量提交任务结果
+
+    清单每项为 {"task_id": ..., "result_file" 或 "result": ..., "file": 可选结果文件}
+    """
+    started = time.monotonic()
+    entries = load_manifest(manifest_file)
+    report = asyncio.run(bulk_push_results(entries, concurrency))
+    finish_bulk(report, started, report_file)
+
+
+@bulk.command('create')
+@click.argument('manifest_file', type=click.Path(exists=True))
+@click.option('--output-dir', type=click.Path(), help='保存创建的任务JSON的目录')
+@concurrency_option
+@report_option
+def bulk_create(manifest_file, output_dir, concurrency, report_file):
+    """批量创建任务
+
+    清单每项为 {"params_file" 或 "params": ..., "file": 可选输入文件}
+    """
+    started = time.monotonic()
+    entries = load_manifest(manifest_file)
+    report = asyncio.run(bulk_create_tasks(entries, output_dir, concurrency))
+    finish_bulk(report, started, report_file)
+
+
+@bulk.command('set-status')
+@click.argument('status', type=click.Choice(['pending', 'running', 'completed', 'failed']))
+@click.argument('task_ids', nargs=-1)
+@ids_file_option
+def bulk_set_status(status, task_ids, ids_file):
+    """批量修改任务状态，例如把失败的任务重新排队"""
+    ids = load_ids(task_ids, ids_file)
+    try:
+        with TaskClient(BASE_URL) as client:
+            report = client.bulk_update(status, ids=ids)
+        click.echo(f"命中 {report['matched']} 个任务，更新 {report['updated']} 个")
+    except Exception as e:
+        click.echo(f"批量修改状态失败: {str(e)}", err=True)
+        sys.exit(1)
+
+
+# tail 命令按任务最终状态退出
+TAIL_EXIT_CODES = {"completed": 0, "failed": 1, "deleted": 2}
+
+
+def read_checkpoint(path):
+    """读取上次保存的偏移，不存在时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(path, offset):
+    """原子地保存下一个要读取的偏移"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(str(offset))
+    os.replace(tmp_path, path)
+
+
+def format_entries(entries, levels, output_format):
+    """把一批日志格式化成一次写入的文本"""
+    if levels:
+        entries = [e for e in entries if str(e.get("level", "")).upper() in levels]
+    if output_format == "jsonl":
+        return "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+    return "".join(str(e["content"]).rstrip("\n") + "\n" for e in entries)
+
+
+async def tail_task(task_id, follow, offset, levels, out, checkpoint, output_format,
+                    protocol, log_filter=None, max_reconnects=10):
+    """持续读取任务日志，返回任务最终状态；断线后从最后写出的偏移续读"""
+    import websockets
+
+    failures = 0
+    async with AsyncTaskClient(BASE_URL, WS_URL) as client:
+        while True:
+            try:
+                retry_after = None
+                async for message in client.iter_log_messages(task_id, offset, follow, protocol,
+                                                            log_filter):
+                    if message["type"] == "end":
+                        return message["status"]
+                    if message["type"] == "going_away":
+                        # 服务重启：从服务端给出的偏移续读，不计入失败次数
+                        offset = message["offset"]
+                        retry_after = message.get("retry_after", 0)
+                        if checkpoint:
+                            write_checkpoint(checkpoint, offset)
+                        continue
+                    entries = message.get("entries") or []
+                    if not entries:
+                        continue
+                    out.write(format_entries(entries, levels, output_format))
+                    out.flush()
+                    offset = entries[-1]["offset"] + 1
+                    if checkpoint:
+                        write_checkpoint(checkpoint, offset)
+                    failures = 0
+                if retry_after is not None:
+                    await asyncio.sleep(retry_after)
+                    continue
+                if not follow:
+                    return None
+            except websockets.exceptions.ConnectionClosedError as e:
+                if e.rcvd is not None and e.rcvd.code == 1008:
+                    return "deleted"
+                failures += 1
+            except OSError:
+                failures += 1
+            if failures > max_reconnects:
+                raise ConnectionError("重连次数过多")
+            await asyncio.sleep(min(0.5 * 2 ** failures, 10))
+
+
+@cli.command()
+@click.argument('task_id')
+@click.option('--follow', '-f', is_flag=True, help='持续跟随新日志直到任务结束')
+@click.option('--from-offset', type=int, help='起始偏移，默认从检查点或0开始')
+@click.option('--level', 'levels', multiple=True, help='只输出这些级别，可重复指定')
+@click.option('--min-level', help='服务端过滤：最低日志级别')
+@click.option('--grep', 'pattern', help='服务端过滤：内容匹配的正则表达式')
+@click.option('--rate', type=float, help='服务端采样：每秒最多输出的行数，超出部分汇总为摘要')
+@click.option('--output', '-o', type=click.Path(), help='追加写入文件，默认输出到标准输出')
+@click.option('--checkpoint', type=click.Path(), help='偏移检查点文件，重启后从此处继续')
+@click.option('--format', 'output_format', type=click.Choice(['text', 'jsonl']), default='text',
+              show_default=True, help='输出格式')
+def tail(task_id, follow, from_offset, levels, min_level, pattern, rate, output, checkpoint,
+         output_format):
+    """读取任务日志，任务结束时以其最终状态退出（completed=0, failed=1, 不存在=2）"""
+    offset = from_offset
+    if offset is None and checkpoint:
+        offset = read_checkpoint(checkpoint)
+    protocol = "msgpack" if msgpack is not None else "json"
+    levels = {level.upper() for level in levels}
+    if levels:
+        levels.add("SUMMARY")
+    log_filter = {k: v for k, v in {"level": min_level, "regex": pattern, "rate": rate}.items()
+                  if v is not None}
+    out = open(output, 'a', encoding='utf-8') if output else sys.stdout
+    try:
+        status = asyncio.run(tail_task(task_id, follow, offset or 0, levels, out,
+                                       checkpoint, output_format, protocol, log_filter))
+    except KeyboardInterrupt:
+        sys.exit(130)
+    except Exception as e:
+        click.echo(f"读取日志失败: {str(e)}", err=True)
+        sys.exit(3)
+    finally:
+        if output:
+            out.close()
+    if status == "deleted":
+        click.echo("任务不存在", err=True)
+    sys.exit(TAIL_EXIT_CODES.get(status, 0))
+
+
+async def read_stdin_lines(keepends=False, chunk_size=64 * 1024):
+    """按块读取标准输入并切分成行，每块只切换一次线程"""
+    loop = asyncio.get_running_loop()
+    stream = sys.stdin.buffer
+    read = getattr(stream, "read1", stream.read)
+    pending = b""
+    while True:
+        chunk = await loop.run_in_executor(None, read, chunk_size)
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            text = line.decode("utf-8", errors="replace")
+            yield text + "\n" if keepends else text.rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8", errors="replace")
+    click.echo("输入流已关闭", err=True)
+
+
+async def sender_websocket(task_id, protocol="text", **options):
+    """WebSocket发送者"""
+    import websockets
+
+    try:
+        async with AsyncTaskClient(BASE_URL, WS_URL) as client:
+            click.echo("WebSocket连接建立中，开始发送数据...", err=True)
+            # text协议保持逐行原样发送（含换行符）
+            sent = await client.send_logs(
+                task_id, read_stdin_lines(keepends=protocol == "text"), protocol, **options)
+            click.echo(f"已发送 {sent} 行", err=True)
+
+    except KeyboardInterrupt:
+        click.echo("\n检测到键盘中断，正在关闭连接...")
     except websockets.exceptions.ConnectionClosed:
         click.echo("WebSocket连接已关闭", err=True)
         sys.exit(1)
@@ -174,9 +582,24 @@ async def sender_websocket(task_id):
 
 @cli.command()
 @click.argument('task_id')
-def sender(task_id):
-    """启动WebSocket发送者"""
-    asyncio.run(sender_websocket(task_id))
+@click.option('--protocol', type=click.Choice(['text', 'json', 'msgpack']),
+              default='msgpack' if msgpack is not None else 'json', show_default=True,
+              help='日志帧格式，json/msgpack 批量发送并支持断线续传，text 每行一帧')
+@click.option('--linger-ms', default=50, show_default=True, help='凑批最长等待时间（毫秒）')
+@click.option('--batch-lines', default=1000, show_default=True, help='单批最多行数')
+@click.option('--batch-bytes', default=256 * 1024, show_default=True, help='单批最多字节数')
+@click.option('--buffer-bytes', default=8 * 1024 * 1024, show_default=True,
+              help='未确认数据上限，超过后暂停读取输入')
+def sender(task_id, protocol, linger_ms, batch_lines, batch_bytes, buffer_bytes):
+    """启动WebSocket发送者，从标准输入读取日志"""
+    if protocol == "msgpack" and msgpack is None:
+        click.echo("msgpack 帧格式需要安装 msgpack", err=True)
+        sys.exit(1)
+    options = {}
+    if protocol != "text":
+        options = {"linger": linger_ms / 1000, "batch_max_lines": batch_lines,
+                   "batch_max_bytes": batch_bytes, "max_buffer_bytes": buffer_bytes}
+    asyncio.run(sender_websocket(task_id, protocol, **options))
 
 
 if __name__ == '__main__':
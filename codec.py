@@ -0,0 +1,85 @@
+"""
+JSON 编解码工具
+
+优先使用 orjson（可选依赖），未安装时回退到标准库 json。
+任务模型的序列化直接走 pydantic-core 的 dump_json，跳过响应模型的二次校验。
+"""
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, List
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, TypeAdapter
+
+from schemas import Task, TaskLog
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+# orjson.JSONDecodeError 是 json.JSONDecodeError 的子类，调用方只需捕获后者
+JSONDecodeError = json.JSONDecodeError
+
+_task_adapter = TypeAdapter(Task)
+_task_list_adapter = TypeAdapter(List[Task])
+_log_list_adapter = TypeAdapter(List[TaskLog])
+
+
+def encode_default(obj: Any) -> Any:
+    """处理编码器不支持的类型"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8编码的JSON字节串"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=encode_default)
+    return json.dumps(obj, default=encode_default, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def dumps_text(obj: Any) -> str:
+    """序列化为JSON字符串，用于WebSocket文本帧"""
+    return dumps(obj).decode("utf-8")
+
+
+def loads(data: str | bytes) -> Any:
+    """解析JSON，失败时抛出 json.JSONDecodeError"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def encode_task(task: Task) -> bytes:
+    return _task_adapter.dump_json(task)
+
+
+def encode_tasks(tasks: List[Task]) -> bytes:
+    return _task_list_adapter.dump_json(tasks)
+
+
+def encode_logs(logs: List[TaskLog]) -> bytes:
+    return _log_list_adapter.dump_json(logs)
+
+
+def json_response(content: bytes, status_code: int = 200, headers: dict = None) -> Response:
+    """用已编码的JSON字节构造响应，不再经过FastAPI的默认编码器"""
+    return Response(content=content, status_code=status_code,
+                    headers=headers, media_type="application/json")
+
+
+class FastJSONResponse(JSONResponse):
+    """使用快速编码器的JSON响应类，作为应用的默认响应类"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
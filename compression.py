@@ -0,0 +1,185 @@
+"""
+传输压缩
+
+- CompressionMiddleware: 对超过阈值的JSON响应做 br/gzip 压缩
+- PrecompressedFile: 预压缩并缓存静态文件，支持ETag协商
+- websocket_protocol: 构造可调压缩级别和窗口大小的 permessage-deflate WebSocket 协议类
+"""
+import gzip
+import hashlib
+import os
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - 可选依赖
+    brotli = None
+
+# 小于该字节数的响应不压缩
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+# WebSocket permessage-deflate 参数，WS_DEFLATE_LEVEL=0 时关闭
+WS_DEFLATE_LEVEL = int(os.environ.get("WS_DEFLATE_LEVEL", 6))
+WS_DEFLATE_WINDOW_BITS = int(os.environ.get("WS_DEFLATE_WINDOW_BITS", 12))
+WS_DEFLATE_MEM_LEVEL = int(os.environ.get("WS_DEFLATE_MEM_LEVEL", 5))
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """解析Accept-Encoding，忽略q=0的编码"""
+    encodings = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    encodings = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in encodings:
+        return "br"
+    if "gzip" in encodings:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """压缩一次性返回的JSON响应
+
+    流式响应、已编码的响应和非JSON响应（如文件下载）原样透传。
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(
+            headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            response_headers = [(k.lower(), v) for k, v in start["headers"]]
+            content_type = dict(response_headers).get(b"content-type", b"")
+            body = message.get("body", b"")
+            if (message.get("more_body", False)
+                    or not content_type.startswith(b"application/json")
+                    or b"content-encoding" in dict(response_headers)
+                    or len(body) < self.minimum_size):
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            response_headers = [(k, v) for k, v in response_headers
+                                if k != b"content-length"]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedFile:
+    """预压缩的静态文件，文件修改后自动重新加载"""
+
+    def __init__(self, path: str, media_type: str, max_age: int = 60):
+        self.path = path
+        self.media_type = media_type
+        self.max_age = max_age
+        self._mtime = None
+        self._variants = {}
+        self._etag = None
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        variants = {None: raw, "gzip": gzip.compress(raw, compresslevel=9)}
+        if brotli is not None:
+            variants["br"] = brotli.compress(raw, quality=11)
+        self._variants = variants
+        self._etag = '"' + hashlib.sha1(raw).hexdigest() + '"'
+        self._mtime = mtime
+
+    def response(self, request: Request) -> Response:
+        self._load()
+        headers = {
+            "ETag": self._etag,
+            "Cache-Control": f"public, max-age={self.max_age}",
+            "Vary": "Accept-Encoding",
+        }
+        if request.headers.get("if-none-match") == self._etag:
+            return Response(status_code=304, headers=headers)
+
+        encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+        if encoding is not None:
+            headers["Content-Encoding"] = encoding
+        return Response(content=self._variants[encoding], headers=headers,
+                        media_type=self.media_type)
+
+
+def websocket_protocol(level: int = WS_DEFLATE_LEVEL,
+                       window_bits: int = WS_DEFLATE_WINDOW_BITS,
+                       mem_level: int = WS_DEFLATE_MEM_LEVEL):
+    """返回给 uvicorn 的 ws 参数
+
+    uvicorn 自带的 permessage-deflate 不能调整压缩参数，这里替换为自定义的扩展工厂。
+    websockets 不可用时返回 "auto"，level 为0时返回关闭压缩的协议。
+    """
+    try:
+        from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol
+        from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+    except ImportError:
+        return "auto"
+
+    class DeflateWebSocketProtocol(WebSocketProtocol):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if level <= 0:
+                self.available_extensions = []
+                return
+            self.available_extensions = [ServerPerMessageDeflateFactory(
+                server_max_window_bits=window_bits,
+                client_max_window_bits=window_bits,
+                compress_settings={"level": level, "memLevel": mem_level},
+            )]
+
+    return DeflateWebSocketProtocol
@@ -0,0 +1,98 @@
+"""
+停机排空
+
+收到 SIGTERM（或 Ctrl+C）后，先于 uvicorn 的默认关闭流程执行：
+1. 关闭监听端口，不再接受新连接；
+2. 进入排空状态，由应用通知各日志流连接：发送端处理完当前批次后、接收者在下一次轮询时
+   收到 going_away 帧（带续传位置和建议的重连等待时间），随后以1012（服务重启）关闭；
+3. 等待日志流连接结束，最长 DRAIN_TIMEOUT 秒；剩余时间交给 uvicorn 等待进行中的HTTP请求（如上传）完成，
+   之后才执行应用的 lifespan 关闭（保存快照等）。
+建议的重连等待时间在 [DRAIN_RETRY_MIN, DRAIN_RETRY_MAX] 秒内随机分散，避免所有客户端同时重连。
+"""
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional, Set
+
+import uvicorn
+
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", 30))
+DRAIN_RETRY_MIN = float(os.environ.get("DRAIN_RETRY_MIN", 1))
+DRAIN_RETRY_MAX = float(os.environ.get("DRAIN_RETRY_MAX", 10))
+# WebSocket 关闭码：服务重启，客户端应稍后重连
+GOING_AWAY_CODE = 1012
+# 等待日志流结束时的轮询间隔
+POLL_INTERVAL = 0.05
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class DrainState:
+    def __init__(self):
+        self.draining = False
+        # 活动的日志流连接数
+        self.active = 0
+        self._waiters: Set[asyncio.Future] = set()
+
+    @contextmanager
+    def stream(self):
+        """在日志流连接的处理期间计数，排空时等待计数归零"""
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+
+    def subscribe(self) -> asyncio.Future:
+        """返回在进入排空状态时完成的future，用于打断空闲连接上的等待"""
+        future = asyncio.get_running_loop().create_future()
+        if self.draining:
+            future.set_result(None)
+        else:
+            self._waiters.add(future)
+        return future
+
+    def unsubscribe(self, future: asyncio.Future):
+        self._waiters.discard(future)
+        future.cancel()
+
+    def begin(self):
+        self.draining = True
+        for future in self._waiters:
+            future.get_loop().call_soon_threadsafe(_wake, future)
+        self._waiters.clear()
+
+    def retry_after(self) -> float:
+        return round(random.uniform(DRAIN_RETRY_MIN, DRAIN_RETRY_MAX), 1)
+
+    async def wait_streams(self, timeout: float) -> int:
+        """等待日志流连接全部结束，返回超时后仍未结束的连接数"""
+        deadline = time.monotonic() + timeout
+        while self.active and time.monotonic() < deadline:
+            await asyncio.sleep(POLL_INTERVAL)
+        return self.active
+
+
+class DrainingServer(uvicorn.Server):
+    """在 uvicorn 关闭连接之前执行 on_drain，之后的等待共用同一个期限"""
+
+    def __init__(self, config: uvicorn.Config, on_drain: Callable[[float], Awaitable[None]],
+                 timeout: float = DRAIN_TIMEOUT):
+        super().__init__(config)
+        self.on_drain = on_drain
+        self.timeout = timeout
+
+    async def shutdown(self, sockets: Optional[list] = None):
+        deadline = time.monotonic() + self.timeout
+        for server in self.servers:
+            server.close()
+        for sock in sockets or []:
+            sock.close()
+        await self.on_drain(self.timeout)
+        self.config.timeout_graceful_shutdown = max(deadline - time.monotonic(), POLL_INTERVAL)
+        await super().shutdown(sockets)
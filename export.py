@@ -0,0 +1,86 @@
+"""
+流式导出
+
+日志和任务列表按块生成响应体，内存占用与数据总量无关：
+- ndjson: 每行一个JSON对象
+- json: 逐块输出的JSON数组
+- text: 每行一条日志内容
+客户端接受gzip时在生成过程中逐块压缩。
+"""
+import asyncio
+import zlib
+from typing import AsyncIterator, Callable, Iterable, List, Sequence
+
+import codec
+import framing
+from schemas import TaskLog
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "json": "application/json",
+    "text": "text/plain; charset=utf-8",
+}
+# 单个输出块的目标大小
+EXPORT_CHUNK_BYTES = 64 * 1024
+GZIP_LEVEL = 6
+
+
+async def _chunked(lines: Iterable[bytes], fmt: str) -> AsyncIterator[bytes]:
+    """把逐行的字节合并成块；json格式加上数组的括号和分隔符"""
+    buffer: List[bytes] = []
+    size = 0
+    first = True
+    if fmt == "json":
+        buffer.append(b"[")
+    for line in lines:
+        if fmt == "json":
+            if not first:
+                buffer.append(b",")
+            buffer.append(line)
+        else:
+            buffer.append(line)
+            buffer.append(b"\n")
+        first = False
+        size += len(line) + 1
+        if size >= EXPORT_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+            # 让出事件循环，避免大导出阻塞其他请求
+            await asyncio.sleep(0)
+    if fmt == "json":
+        buffer.append(b"]")
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_logs(logs: List[TaskLog], offsets: Sequence[int], fmt: str,
+              fields: str = "entry") -> AsyncIterator[bytes]:
+    """导出指定偏移的日志
+
+    ndjson/json 的每条记录默认为带 offset 的帧条目 {offset, ts, level, content}；
+    fields 为 "log" 时为任务日志原有的字段 {timestamp, content, level}。
+    """
+    if fmt == "text":
+        lines = (logs[offset].content.encode("utf-8") for offset in offsets)
+    elif fields == "log":
+        lines = (codec.dumps(logs[offset].model_dump()) for offset in offsets)
+    else:
+        lines = (codec.dumps(framing.log_entry(offset, logs[offset])) for offset in offsets)
+    return _chunked(lines, fmt)
+
+
+def iter_tasks(task_ids: Iterable[str], encode: Callable[[str], bytes],
+               fmt: str) -> AsyncIterator[bytes]:
+    """导出任务，encode 返回单个任务的JSON字节，任务在导出过程中被删除时返回None"""
+    lines = (body for body in (encode(task_id) for task_id in task_ids) if body is not None)
+    return _chunked(lines, fmt)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes], level: int = GZIP_LEVEL) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
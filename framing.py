@@ -0,0 +1,114 @@
+"""
+WebSocket 日志帧格式
+
+- text: 旧协议，每个文本帧就是一行日志内容
+- json: 文本帧，内容为JSON编码的消息对象
+- msgpack: 二进制帧，内容为MessagePack编码的消息对象（可选依赖 msgpack）
+
+json/msgpack 下日志以批的形式传输：
+    {"type": "logs", "entries": [{"offset", "ts", "level", "content"}, ...]}
+"""
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+import codec
+from schemas import TaskLog
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+TEXT = "text"
+JSON = "json"
+MSGPACK = "msgpack"
+
+# WebSocket子协议名到帧格式的映射
+SUBPROTOCOLS = {
+    "logs.msgpack": MSGPACK,
+    "logs.json": JSON,
+}
+
+
+class FramingError(ValueError):
+    """帧格式不支持或帧内容无法解析"""
+
+
+def available() -> List[str]:
+    """当前环境支持的帧格式"""
+    framings = [TEXT, JSON]
+    if msgpack is not None:
+        framings.append(MSGPACK)
+    return framings
+
+
+def pick_subprotocol(offered: List[str]) -> Optional[str]:
+    """从客户端提供的子协议中选出第一个可用的"""
+    for subprotocol in offered:
+        if SUBPROTOCOLS.get(subprotocol) in available():
+            return subprotocol
+    return None
+
+
+def resolve(subprotocol: Optional[str], requested: Optional[str] = None) -> str:
+    """确定连接使用的帧格式，子协议优先于初始化消息中的protocol字段"""
+    if subprotocol:
+        return SUBPROTOCOLS[subprotocol]
+    framing = requested or TEXT
+    if framing not in available():
+        raise FramingError(f"不支持的帧格式: {framing}")
+    return framing
+
+
+def encode(framing: str, message: Any) -> str | bytes:
+    """编码一条消息，json返回文本，msgpack返回字节"""
+    if framing == MSGPACK:
+        return msgpack.packb(message, use_bin_type=True, default=codec.encode_default)
+    if framing == JSON:
+        return codec.dumps_text(message)
+    raise FramingError(f"文本协议不支持结构化消息: {framing}")
+
+
+def decode(framing: str, frame: dict) -> Any:
+    """解码 websocket.receive() 得到的原始帧"""
+    try:
+        if framing == MSGPACK and frame.get("bytes") is not None:
+            return msgpack.unpackb(frame["bytes"], raw=False)
+        if framing == JSON and frame.get("text") is not None:
+            return codec.loads(frame["text"])
+    except Exception as e:
+        raise FramingError(f"无法解析的帧: {e}") from e
+    raise FramingError(f"帧类型与协议不匹配: {framing}")
+
+
+def read_batch(message: Any) -> Tuple[List[TaskLog], Optional[int]]:
+    """校验发送端的日志批次，返回其中的日志和第一行的序号（没有 seq 时为None）"""
+    if not isinstance(message, dict):
+        raise FramingError("日志批次不是对象")
+    entries = message.get("entries", [])
+    seq = message.get("seq")
+    if not isinstance(entries, list):
+        raise FramingError("entries 不是数组")
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int) or seq < 0):
+        raise FramingError(f"无效的日志序号: {seq!r}")
+    now = datetime.now().isoformat()
+    logs = []
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("content"), str):
+            raise FramingError("日志条目缺少 content")
+        level = entry.get("level") or "INFO"
+        timestamp = entry.get("ts") or now
+        if not isinstance(level, str) or not isinstance(timestamp, str):
+            raise FramingError("日志条目的 level 和 ts 须为字符串")
+        logs.append(TaskLog(level=level, content=entry["content"], timestamp=timestamp))
+    return logs, seq
+
+
+def log_entry(offset: int, log: TaskLog) -> dict:
+    """日志在帧中的表示"""
+    return {
+        "offset": offset,
+        "ts": log.timestamp,
+        "level": log.level,
+        "content": log.content,
+    }
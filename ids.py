@@ -0,0 +1,109 @@
+"""
+任务ID
+
+ID 采用 ULID 格式：26 个 Crockford Base32 字符，前 10 个字符是 48 位毫秒时间戳，
+后 16 个字符是 80 位随机数。定长编码使字符串顺序与生成时间一致，
+多个工作进程各自生成也不会冲突（随机部分碰撞概率可以忽略）。
+同一进程同一毫秒内生成的ID在随机部分上递增，时钟回拨时沿用上一个时间戳，保证单调。
+
+TaskOrder 按ID顺序维护全部任务ID，"最新N个任务" 和游标分页都是有序列表上的切片。
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterator, List, Optional
+
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ID_LENGTH = 26
+TIME_LENGTH = 10
+RANDOM_BITS = 80
+_DECODE = {char: value for value, char in enumerate(ALPHABET)}
+
+
+def _encode(value: int, length: int) -> str:
+    chars = []
+    for _ in range(length):
+        chars.append(ALPHABET[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def id_time(task_id: str) -> Optional[float]:
+    """从ID中取出生成时间（epoch秒），不是本格式的ID返回None"""
+    if len(task_id) != ID_LENGTH:
+        return None
+    value = 0
+    for char in task_id[:TIME_LENGTH]:
+        digit = _DECODE.get(char)
+        if digit is None:
+            return None
+        value = value * 32 + digit
+    return value / 1000
+
+
+class IdGenerator:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._last_random = int.from_bytes(os.urandom(RANDOM_BITS // 8), "big")
+            else:
+                self._last_random += 1
+                if self._last_random >> RANDOM_BITS:
+                    # 同一毫秒内随机部分用尽，借用下一毫秒
+                    self._last_ms += 1
+                    self._last_random = 0
+            return _encode(self._last_ms, TIME_LENGTH) + _encode(self._last_random, ID_LENGTH - TIME_LENGTH)
+
+
+class TaskOrder:
+    """按ID排序的任务ID列表；新ID总是最大的，添加通常是追加"""
+
+    def __init__(self):
+        self._ids: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __contains__(self, task_id: str) -> bool:
+        position = bisect_left(self._ids, task_id)
+        return position < len(self._ids) and self._ids[position] == task_id
+
+    def add(self, task_id: str):
+        if not self._ids or task_id > self._ids[-1]:
+            self._ids.append(task_id)
+        else:
+            insort(self._ids, task_id)
+
+    def remove(self, task_id: str):
+        position = bisect_left(self._ids, task_id)
+        if position < len(self._ids) and self._ids[position] == task_id:
+            del self._ids[position]
+
+    def page(self, limit: Optional[int] = None, after: Optional[str] = None,
+             descending: bool = False) -> List[str]:
+        """从游标之后（不含）取最多 limit 个ID；descending 为True时从新到旧"""
+        ids = self._ids
+        if descending:
+            end = bisect_left(ids, after) if after is not None else len(ids)
+            start = 0 if limit is None else max(0, end - limit)
+            return ids[start:end][::-1]
+        start = bisect_right(ids, after) if after is not None else 0
+        end = len(ids) if limit is None else start + limit
+        return ids[start:end]
+
+    def newest(self, count: int) -> List[str]:
+        return self.page(count, descending=True)
+
+    def stats(self) -> dict:
+        return {"tasks": len(self._ids)}
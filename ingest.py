@@ -0,0 +1,270 @@
+"""
+日志写入的准入控制
+
+- 速率：令牌桶限制每个任务、每个发送连接和全局的 行/秒 与 字节/秒。
+  WebSocket 发送端超出速率时暂停读取该连接（TCP 反压传递到客户端，不丢日志）；
+  REST 写入超出时返回429和 Retry-After。全局桶由所有发送端共享，整体过载时所有发送端一起放慢。
+- 容量：每个任务的日志总字节数上限，超出后按 TASK_LOG_OVERFLOW 处理：
+  truncate  保留开头，之后的日志丢弃，并插入一行说明；
+  head_tail 保留开头和最近的一段，中间丢弃。最近的一段先暂存，任务结束
+            （收到结束信号或状态变为已结束）时连同省略说明一起追加，已有日志的偏移不变。
+  结束信号等控制行不受容量限制。
+限流和截断的次数以计数器形式在 /metrics 中给出。
+"""
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from logfilter import CONTROL_CONTENTS
+from schemas import TaskLog
+
+OVERFLOW_MODES = ("truncate", "head_tail")
+# head_tail 模式下为最近日志保留的容量比例
+TAIL_FRACTION = 0.5
+# REST 写入最多等待的时间，超过则返回429
+MAX_REST_DELAY = 1.0
+
+
+def _env_float(name: str) -> float:
+    return float(os.environ.get(name, 0))
+
+
+def log_size(log: TaskLog) -> int:
+    return len(log.content.encode("utf-8"))
+
+
+def notice(content: str) -> TaskLog:
+    return TaskLog(timestamp=datetime.now().isoformat(), content=content, level="WARNING")
+
+
+class TokenBucket:
+    """按 rate/秒 补充、容量为 burst 的令牌桶；rate 为0表示不限制
+
+    reserve 总是扣除令牌（可以为负），返回需要等待多久才能补足，
+    调用方等待后再继续，等价于按速率排队。
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: Optional[float] = None) -> float:
+        if not self.rate:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self, amount: float):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + amount)
+
+
+class RateLimit:
+    """一组 行/秒 和 字节/秒 令牌桶"""
+
+    def __init__(self, lines_per_sec: float, bytes_per_sec: float):
+        self.lines = TokenBucket(lines_per_sec)
+        self.bytes = TokenBucket(bytes_per_sec)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.lines.rate or self.bytes.rate)
+
+    def reserve(self, lines: int, nbytes: int, now: Optional[float] = None) -> Tuple[float, Optional[str]]:
+        """返回 (需要等待的秒数, 触发限制的维度 "lines"/"bytes")"""
+        line_delay = self.lines.reserve(lines, now)
+        byte_delay = self.bytes.reserve(nbytes, now)
+        if not line_delay and not byte_delay:
+            return 0.0, None
+        return (line_delay, "lines") if line_delay >= byte_delay else (byte_delay, "bytes")
+
+    def refund(self, lines: int, nbytes: int):
+        self.lines.refund(lines)
+        self.bytes.refund(nbytes)
+
+
+class LogBudget:
+    """单个任务的日志容量"""
+
+    def __init__(self, max_bytes: int, mode: str):
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.head_bytes = int(max_bytes * (1 - TAIL_FRACTION)) if mode == "head_tail" else max_bytes
+        self.tail_bytes = max_bytes - self.head_bytes
+        self.used = 0
+        self.tail: Deque[Tuple[TaskLog, int]] = deque()
+        self.tail_used = 0
+        self.dropped_lines = 0
+        self.dropped_bytes = 0
+        # 已在说明行中报告过的丢弃行数
+        self.reported_lines = 0
+        self.noticed = False
+
+    def admit(self, logs: List[TaskLog]) -> List[TaskLog]:
+        """返回现在应追加的日志；超出容量的日志被丢弃或暂存到尾部"""
+        accepted = []
+        for log in logs:
+            if log.content in CONTROL_CONTENTS:
+                accepted.extend(self.flush())
+                accepted.append(log)
+                continue
+            size = log_size(log)
+            if self.used + size <= self.head_bytes and not self.dropped_lines and not self.tail:
+                self.used += size
+                accepted.append(log)
+            elif self.mode == "head_tail":
+                self._push_tail(log, size)
+            else:
+                self._drop(size)
+                if not self.noticed:
+                    self.noticed = True
+                    accepted.append(notice(f"日志超过上限 {self.max_bytes} 字节，之后的日志将被丢弃"))
+        return accepted
+
+    def _drop(self, size: int):
+        self.dropped_lines += 1
+        self.dropped_bytes += size
+
+    def _push_tail(self, log: TaskLog, size: int):
+        self.tail.append((log, size))
+        self.tail_used += size
+        while self.tail_used > self.tail_bytes and self.tail:
+            _, dropped = self.tail.popleft()
+            self.tail_used -= dropped
+            self._drop(dropped)
+
+    def flush(self) -> List[TaskLog]:
+        """任务结束时输出省略说明和暂存的最近日志"""
+        flushed = []
+        if self.dropped_lines > self.reported_lines:
+            if self.mode == "head_tail":
+                flushed.append(notice(f"日志超过上限，省略了中间 {self.dropped_lines} 行（{self.dropped_bytes} 字节）"))
+            else:
+                flushed.append(notice(f"日志超过上限，共丢弃 {self.dropped_lines} 行（{self.dropped_bytes} 字节）"))
+            self.reported_lines = self.dropped_lines
+        flushed.extend(log for log, _ in self.tail)
+        self.used += self.tail_used
+        self.tail.clear()
+        self.tail_used = 0
+        return flushed
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.tail or self.dropped_lines > self.reported_lines)
+
+
+class IngestController:
+    def __init__(self):
+        self.task_lines_per_sec = _env_float("TASK_LOG_LINES_PER_SEC")
+        self.task_bytes_per_sec = _env_float("TASK_LOG_BYTES_PER_SEC")
+        self.conn_lines_per_sec = _env_float("CONN_LOG_LINES_PER_SEC")
+        self.conn_bytes_per_sec = _env_float("CONN_LOG_BYTES_PER_SEC")
+        self.max_task_log_bytes = int(_env_float("MAX_TASK_LOG_BYTES"))
+        self.overflow = os.environ.get("TASK_LOG_OVERFLOW", "truncate")
+        if self.overflow not in OVERFLOW_MODES:
+            raise ValueError(f"TASK_LOG_OVERFLOW 只能是 {', '.join(OVERFLOW_MODES)}")
+        self.global_limit = RateLimit(_env_float("GLOBAL_LOG_LINES_PER_SEC"),
+                                      _env_float("GLOBAL_LOG_BYTES_PER_SEC"))
+        self._task_limits: Dict[str, RateLimit] = {}
+        self._budgets: Dict[str, LogBudget] = {}
+        self.counters = {
+            "task_limit_hits": 0,
+            "connection_limit_hits": 0,
+            "global_limit_hits": 0,
+            "throttled_seconds": 0.0,
+            "rejected_requests": 0,
+            "dropped_lines": 0,
+            "dropped_bytes": 0,
+        }
+
+    def connection_limit(self) -> RateLimit:
+        return RateLimit(self.conn_lines_per_sec, self.conn_bytes_per_sec)
+
+    def _task_limit(self, task_id: str) -> RateLimit:
+        limit = self._task_limits.get(task_id)
+        if limit is None:
+            limit = self._task_limits[task_id] = RateLimit(
+                self.task_lines_per_sec, self.task_bytes_per_sec)
+        return limit
+
+    def reserve(self, task_id: str, logs: List[TaskLog],
+                connection: Optional[RateLimit] = None) -> float:
+        """按任务、连接和全局速率预留额度，返回需要等待的秒数"""
+        scopes = [("global_limit_hits", self.global_limit)]
+        if self.task_lines_per_sec or self.task_bytes_per_sec:
+            scopes.append(("task_limit_hits", self._task_limit(task_id)))
+        if connection is not None:
+            scopes.append(("connection_limit_hits", connection))
+        if not any(limit.enabled for _, limit in scopes):
+            return 0.0
+        lines, nbytes = len(logs), sum(log_size(log) for log in logs)
+        now = time.monotonic()
+        delay = 0.0
+        for counter, limit in scopes:
+            scope_delay, hit = limit.reserve(lines, nbytes, now)
+            if hit:
+                self.counters[counter] += 1
+                delay = max(delay, scope_delay)
+        if delay:
+            self.counters["throttled_seconds"] += delay
+        return delay
+
+    def try_reserve(self, task_id: str, logs: List[TaskLog]) -> Tuple[bool, float]:
+        """REST 写入只等待较短时间：返回 (是否接受, 等待或建议重试的秒数)，不接受时退还额度"""
+        delay = self.reserve(task_id, logs)
+        if delay <= MAX_REST_DELAY:
+            return True, delay
+        lines, nbytes = len(logs), sum(log_size(log) for log in logs)
+        if task_id in self._task_limits:
+            self._task_limits[task_id].refund(lines, nbytes)
+        self.global_limit.refund(lines, nbytes)
+        self.counters["throttled_seconds"] -= delay
+        self.counters["rejected_requests"] += 1
+        return False, delay
+
+    def admit(self, task_id: str, logs: List[TaskLog]) -> List[TaskLog]:
+        """按任务日志容量筛选，返回实际追加的日志"""
+        if not self.max_task_log_bytes:
+            return logs
+        budget = self._budgets.get(task_id)
+        if budget is None:
+            budget = self._budgets[task_id] = LogBudget(self.max_task_log_bytes, self.overflow)
+        lines, nbytes = budget.dropped_lines, budget.dropped_bytes
+        accepted = budget.admit(logs)
+        self.counters["dropped_lines"] += budget.dropped_lines - lines
+        self.counters["dropped_bytes"] += budget.dropped_bytes - nbytes
+        return accepted
+
+    def finish(self, task_id: str) -> List[TaskLog]:
+        """任务结束时取出 head_tail 模式暂存的日志"""
+        budget = self._budgets.get(task_id)
+        return budget.flush() if budget is not None and budget.pending else []
+
+    def pending_bytes(self, task_id: str) -> int:
+        """head_tail 模式下暂存、尚未追加的日志字节数"""
+        budget = self._budgets.get(task_id)
+        return budget.tail_used if budget is not None else 0
+
+    def pending_tasks(self) -> List[str]:
+        """有暂存日志或未报告丢弃的任务"""
+        return [task_id for task_id, budget in self._budgets.items() if budget.pending]
+
+    def drop_task(self, task_id: str):
+        self._task_limits.pop(task_id, None)
+        self._budgets.pop(task_id, None)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "throttled_seconds": round(self.counters["throttled_seconds"], 3),
+            "limited_tasks": len(self._task_limits),
+            "budgeted_tasks": len(self._budgets),
+            "pending_tail_lines": sum(len(budget.tail) for budget in self._budgets.values()),
+        }
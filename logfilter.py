@@ -0,0 +1,351 @@
+"""
+日志过滤与采样
+
+LogFilter 描述一组过滤条件（最低级别、子串、正则、时间范围、限速采样）。
+正则优先用 RE2 编译（可选依赖 google-re2），保证匹配时间是线性的。
+同一任务上条件相同的接收者共享一个 FilteredFeed：每行日志只被过滤一次，
+各接收者只在共享结果上维护自己的读取位置。
+"""
+import re
+from bisect import bisect_left
+from datetime import datetime
+from re import _constants as sre_constants, _parser as sre_parse
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from schemas import TaskLog
+
+try:
+    import re2
+except ImportError:  # pragma: no cover - 可选依赖
+    re2 = None
+
+LEVEL_RANKS = {
+    "DEBUG": 10,
+    "INFO": 20,
+    "WARN": 30,
+    "WARNING": 30,
+    "ERROR": 40,
+    "CRITICAL": 50,
+    "FATAL": 50,
+}
+# 无法识别的级别按INFO处理
+DEFAULT_LEVEL_RANK = 20
+SUMMARY_LEVEL = "SUMMARY"
+MAX_PATTERN_LENGTH = 256
+_REPEATS = {sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, sre_constants.POSSESSIVE_REPEAT}
+# 控制行总是通过过滤，保证接收者能看到结束信号
+CONTROL_CONTENTS = {"END_SIGNAL"}
+
+
+def level_rank(level: str) -> int:
+    return LEVEL_RANKS.get(str(level).upper(), DEFAULT_LEVEL_RANK)
+
+
+def parse_time(value: Any) -> Optional[float]:
+    """把epoch数字或ISO时间字符串转换为epoch秒，无法解析时返回None"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(text.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def _check_backtracking(items, repeated: bool = False):
+    """拒绝在标准库 re 中可能灾难性回溯的写法：嵌套量词、量词作用于分支、反向引用"""
+    for op, av in items:
+        if op in _REPEATS:
+            if repeated:
+                raise ValueError("正则表达式不支持嵌套的量词")
+            _check_backtracking(av[2], repeated=av[1] > 1)
+        elif op is sre_constants.BRANCH:
+            if repeated:
+                raise ValueError("正则表达式不支持对分支使用量词")
+            for branch in av[1]:
+                _check_backtracking(branch, repeated)
+        elif op is sre_constants.SUBPATTERN:
+            _check_backtracking(av[3], repeated)
+        elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            _check_backtracking(av[1], repeated)
+        elif op is sre_constants.ATOMIC_GROUP:
+            _check_backtracking(av, repeated)
+        elif op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            raise ValueError("正则表达式不支持反向引用")
+
+
+def compile_pattern(regex: str):
+    """编译客户端提供的正则
+
+    匹配在事件循环中逐行执行。优先使用 RE2，匹配时间与行长度成线性，不会回溯；
+    未安装时使用标准库 re，并拒绝可能灾难性回溯的写法。
+    """
+    if len(regex) > MAX_PATTERN_LENGTH:
+        raise ValueError("正则表达式过长")
+    if re2 is not None:
+        options = re2.Options()
+        options.log_errors = False
+        try:
+            return re2.compile(regex, options=options)
+        except re2.error as e:
+            message = e.args[0].decode("utf-8", "replace") if e.args and isinstance(e.args[0], bytes) else e
+            raise ValueError(f"无效的正则表达式: {message}") from e
+    try:
+        _check_backtracking(sre_parse.parse(regex))
+        return re.compile(regex)
+    except re.error as e:
+        raise ValueError(f"无效的正则表达式: {e}") from e
+
+
+class LogFilter:
+    """不可变的过滤条件，key 相同的过滤器可以共享结果"""
+
+    def __init__(self, level: Optional[str] = None, contains: Optional[str] = None,
+                 regex: Optional[str] = None, since: Any = None, until: Any = None,
+                 rate: Optional[float] = None):
+        self.min_rank = level_rank(level) if level else None
+        self.contains = contains or None
+        self.pattern = compile_pattern(regex) if regex else None
+        self.since = parse_time(since)
+        self.until = parse_time(until)
+        if since not in (None, "") and self.since is None:
+            raise ValueError(f"无效的起始时间: {since}")
+        if until not in (None, "") and self.until is None:
+            raise ValueError(f"无效的结束时间: {until}")
+        self.rate = float(rate) if rate else None
+        if self.rate is not None and self.rate <= 0:
+            raise ValueError("采样速率必须大于0")
+        self.key = (self.min_rank, self.contains,
+                    self.pattern.pattern if self.pattern else None,
+                    self.since, self.until, self.rate)
+
+    @classmethod
+    def from_params(cls, params: Optional[Dict[str, Any]]) -> Optional["LogFilter"]:
+        """从初始化消息或查询参数构造过滤器，没有任何条件时返回None"""
+        if not params:
+            return None
+        params = {k: params.get(k) for k in ("level", "contains", "regex", "since", "until", "rate")}
+        if all(v in (None, "") for v in params.values()):
+            return None
+        return cls(**params)
+
+    @property
+    def has_time_range(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    @property
+    def time_only(self) -> bool:
+        """只有时间范围条件，结果就是时间索引圈定的区间"""
+        return (self.has_time_range and self.min_rank is None and self.contains is None
+                and self.pattern is None and self.rate is None)
+
+    def matches(self, log: TaskLog, epoch: Optional[float]) -> bool:
+        if self.min_rank is not None and level_rank(log.level) < self.min_rank:
+            return False
+        if self.contains is not None and self.contains not in log.content:
+            return False
+        if self.pattern is not None and self.pattern.search(log.content) is None:
+            return False
+        if self.has_time_range:
+            if epoch is None:
+                return False
+            if self.since is not None and epoch < self.since:
+                return False
+            if self.until is not None and epoch > self.until:
+                return False
+        return True
+
+
+# 过滤结果中的一项：匹配的日志偏移，或 (最后一行被丢弃日志的偏移, 丢弃行数) 采样摘要
+FeedItem = Union[int, Tuple[int, int]]
+
+
+class FilteredFeed:
+    """一个任务在某个过滤条件下的增量结果"""
+
+    def __init__(self, log_filter: LogFilter):
+        self.filter = log_filter
+        self.items: List[FeedItem] = []
+        # 与items一一对应的偏移，用于按偏移定位
+        self.offsets: List[int] = []
+        # 已过滤的偏移区间 [start, scanned)，start 为None表示还没有开始过滤
+        self.start: Optional[int] = None
+        self.scanned = 0
+        self.subscribers = 0
+        # 每次重置加一，读取位置只在同一代结果中有效
+        self.generation = 0
+        # 采样状态：当前秒、该秒已放行行数、待汇报的丢弃行数
+        self._bucket = None
+        self._bucket_count = 0
+        self._dropped = 0
+        self._last_dropped = None
+
+    def reset(self):
+        """丢弃已有结果，下次 advance 时重新过滤"""
+        self.generation += 1
+        self.start = None
+        self.scanned = 0
+        self._reset_sampling()
+        self.items = []
+        self.offsets = []
+
+    def _reset_sampling(self):
+        self._bucket = None
+        self._bucket_count = 0
+        self._dropped = 0
+        self._last_dropped = None
+
+    def advance(self, logs: List[TaskLog], epochs: Optional[Sequence[float]] = None,
+                from_offset: int = 0, limit: Optional[int] = None) -> int:
+        """过滤尚未处理的日志，返回新增的结果数
+
+        新建或重置后从 from_offset 开始过滤，之前的日志不处理；之后需要更早的偏移时向前补扫。
+        limit 限制本次最多过滤的行数，用 covers() 判断是否已处理完。
+        """
+        if len(logs) < self.scanned:
+            # 日志被整体替换，重新计算
+            self.reset()
+        if self.start is None:
+            self.start = self.scanned = min(from_offset, len(logs))
+        budget = len(logs) if limit is None else limit
+        before = len(self.items)
+        if from_offset < self.start:
+            begin = max(from_offset, self.start - budget)
+            self._prepend(logs, range(begin, self.start), epochs)
+            budget -= self.start - begin
+            self.start = begin
+        stop = min(len(logs), self.scanned + budget)
+        self._consume(logs, range(self.scanned, stop), epochs)
+        self.scanned = stop
+        self._flush_dropped()
+        return len(self.items) - before
+
+    def covers(self, from_offset: int, length: int) -> bool:
+        """结果是否已覆盖 [from_offset, length) 内的全部日志"""
+        return (self.start is not None and self.start <= min(from_offset, length)
+                and self.scanned >= length)
+
+    def _prepend(self, logs: List[TaskLog], offsets: Iterable[int],
+                 epochs: Optional[Sequence[float]]):
+        """向前补扫更早的日志，结果放在已有结果之前，补扫不影响之后日志的采样状态"""
+        items, positions = self.items, self.offsets
+        state = (self._bucket, self._bucket_count, self._dropped, self._last_dropped)
+        self.items, self.offsets = [], []
+        self._reset_sampling()
+        self._consume(logs, offsets, epochs)
+        self._flush_dropped()
+        self.items.extend(items)
+        self.offsets.extend(positions)
+        self._bucket, self._bucket_count, self._dropped, self._last_dropped = state
+
+    def scan(self, logs: List[TaskLog], offsets: Iterable[int],
+             epochs: Optional[Sequence[float]] = None):
+        """一次性过滤指定的日志偏移（递增），用于时间索引已经圈定范围的查询"""
+        self._consume(logs, offsets, epochs)
+        self.start = 0
+        self.scanned = len(logs)
+        self._flush_dropped()
+
+    def _consume(self, logs: List[TaskLog], offsets: Iterable[int],
+                 epochs: Optional[Sequence[float]]):
+        flt = self.filter
+        need_epoch = flt.has_time_range or flt.rate is not None
+        for offset in offsets:
+            log = logs[offset]
+            if log.content in CONTROL_CONTENTS:
+                self._flush_dropped()
+                self._append(offset)
+                continue
+            epoch = None
+            if need_epoch:
+                if epochs is not None and offset < len(epochs):
+                    epoch = epochs[offset]
+                else:
+                    epoch = parse_time(log.timestamp)
+            if not flt.matches(log, epoch):
+                continue
+            if flt.rate is not None and not self._admit(offset, epoch):
+                continue
+            self._append(offset)
+
+    def _admit(self, offset: int, epoch: Optional[float]) -> bool:
+        """按日志时间所在的秒限速，超出的行计入丢弃数"""
+        bucket = int(epoch) if epoch is not None else None
+        if bucket != self._bucket:
+            self._flush_dropped()
+            self._bucket = bucket
+            self._bucket_count = 0
+        if self._bucket_count < self.filter.rate:
+            self._bucket_count += 1
+            return True
+        self._dropped += 1
+        self._last_dropped = offset
+        return False
+
+    def _flush_dropped(self):
+        if self._dropped:
+            self.items.append((self._last_dropped, self._dropped))
+            self.offsets.append(self._last_dropped)
+            self._dropped = 0
+
+    def _append(self, offset: int):
+        self.items.append(offset)
+        self.offsets.append(offset)
+
+    def position(self, from_offset: int) -> int:
+        """第一个偏移不小于from_offset的结果位置"""
+        return bisect_left(self.offsets, from_offset)
+
+
+def summary_entry(item: Tuple[int, int], logs: List[TaskLog]) -> dict:
+    offset, dropped = item
+    return {
+        "offset": offset,
+        "ts": logs[offset].timestamp if offset < len(logs) else None,
+        "level": SUMMARY_LEVEL,
+        "content": f"采样丢弃 {dropped} 行",
+        "dropped": dropped,
+    }
+
+
+class FeedRegistry:
+    """按 (task_id, 过滤条件) 共享过滤结果"""
+
+    def __init__(self):
+        self._feeds: Dict[tuple, FilteredFeed] = {}
+
+    def subscribe(self, task_id: str, log_filter: LogFilter) -> FilteredFeed:
+        key = (task_id, log_filter.key)
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = self._feeds[key] = FilteredFeed(log_filter)
+        feed.subscribers += 1
+        return feed
+
+    def unsubscribe(self, task_id: str, feed: FilteredFeed):
+        feed.subscribers -= 1
+        key = (task_id, feed.filter.key)
+        if feed.subscribers <= 0 and self._feeds.get(key) is feed:
+            del self._feeds[key]
+
+    def reset_task(self, task_id: str):
+        """任务日志被整体替换后，重置该任务的全部过滤结果"""
+        for key, feed in self._feeds.items():
+            if key[0] == task_id:
+                feed.reset()
+
+    def drop_task(self, task_id: str):
+        for key in [k for k in self._feeds if k[0] == task_id]:
+            del self._feeds[key]
+
+    def stats(self) -> dict:
+        return {
+            "feeds": len(self._feeds),
+            "subscribers": sum(feed.subscribers for feed in self._feeds.values()),
+        }
@@ -1,20 +1,48 @@
-from schemas import Task, TaskCreate, TaskUpdate, TaskStatus, TaskLog
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form
+from schemas import Task, TaskCreate, TaskUpdate, TaskStatus, TaskLog, TaskBatchCreate, TaskBatchGet, TaskBulkUpdate, TaskQuery, TaskIndexCreate
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, UploadFile, File, Form, Request, Query
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from typing import List, Dict, Set, Optional
-import json
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from typing import List, Dict, Set, Optional, Literal
+import codec
+import compression
+from cache import ResponseCache
+import framing
+import logfilter
+from logfilter import FeedItem, LogFilter, FeedRegistry
+import search
+from search import LogIndex
+from timeindex import TimeIndex
+import paramindex
+from paramindex import TaskIndexes
+import export
+import bundle
+import resultpointer
+from blobstore import BlobStore, valid_digest
+from ids import IdGenerator, TaskOrder
+import retention
+from ingest import IngestController
+from stats import TaskStats
+import memory
+from memory import MemoryAccounting
+import drain
+from drain import DrainState
+from retention import ExpiryQueue, RetentionPolicy
+from codec import FastJSONResponse
 from datetime import datetime
 import os
 import logging
 from logging.handlers import RotatingFileHandler
 import asyncio
+import heapq
+import math
+import time
+from contextlib import asynccontextmanager
 # 配置日志
 
 
 def setup_logger():
     # 创建日志目录
-    log_dir = "logs"
+    log_dir = os.environ.get("LOG_DIR", "logs")
     os.makedirs(log_dir, exist_ok=True)
 
     # 创建logger对象
@@ -52,14 +80,52 @@ def setup_logger():
 logger = setup_logger()
 
 
-app = FastAPI(title="任务管理器API")
+def warn_missing_dependencies():
+    """可选的加速依赖缺失时服务仍能运行，但会降级，启动时提示"""
+    fallbacks = {
+        "orjson": (codec.orjson, "JSON 编解码回退到标准库 json"),
+        "msgpack": (framing.msgpack, "WebSocket 日志流不支持 MessagePack 帧格式"),
+        "brotli": (compression.brotli, "响应压缩只支持 gzip"),
+        "zstandard": (bundle.zstandard, "归档不支持 zstd 压缩"),
+        "google-re2": (logfilter.re2, "日志正则过滤使用标准库 re，并拒绝嵌套量词等写法"),
+    }
+    for name, (module, effect) in fallbacks.items():
+        if module is None:
+            logger.warning(f"未安装 {name}，{effect}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warn_missing_dependencies()
+    if DRAIN_SNAPSHOT and os.path.exists(DRAIN_SNAPSHOT):
+        restored = await asyncio.get_running_loop().run_in_executor(
+            None, read_snapshot, DRAIN_SNAPSHOT)
+        restore_snapshot(restored)
+        os.remove(DRAIN_SNAPSHOT)
+        logger.info(f"已从快照恢复 {len(restored)} 个任务: {DRAIN_SNAPSHOT}")
+    sweeper = asyncio.create_task(retention_sweeper())
+    try:
+        yield
+    finally:
+        sweeper.cancel()
+        flush_pending_logs()
+        if DRAIN_SNAPSHOT:
+            await save_snapshot(DRAIN_SNAPSHOT)
+            logger.info(f"已保存 {len(tasks)} 个任务的快照: {DRAIN_SNAPSHOT}")
+
+
+app = FastAPI(title="任务管理器API", default_response_class=FastJSONResponse, lifespan=lifespan)
+# 压缩超过阈值的JSON响应
+app.add_middleware(compression.CompressionMiddleware)
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # 创建上传文件存储目录
-UPLOAD_DIR = "uploads"
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+# 按内容哈希存储的上传文件
+blobs = BlobStore(os.path.join(UPLOAD_DIR, "sha256"))
 
 # 存储所有活动的WebSocket连接
 
@@ -68,16 +134,16 @@ class ConnectionManager:
     def __init__(self):
         # 按task_id分组的连接
         self.task_connections: Dict[str, Dict[str, Set[WebSocket]]] = {}
-        # 存储每个连接的task_id和角色
+        # 存储每个连接的task_id、角色和帧格式
         self.connection_info: Dict[WebSocket, Dict[str, str]] = {}
 
-    async def connect(self, websocket: WebSocket, task_id: str, role: str):
+    async def connect(self, websocket: WebSocket, task_id: str, role: str, fmt: str = framing.JSON):
         if task_id not in self.task_connections:
             self.task_connections[task_id] = {
                 "sender": set(), "receiver": set()}
 
         self.task_connections[task_id][role].add(websocket)
-        self.connection_info[websocket] = {"task_id": task_id, "role": role}
+        self.connection_info[websocket] = {"task_id": task_id, "role": role, "fmt": fmt}
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.connection_info:
@@ -92,32 +158,27 @@ class ConnectionManager:
 
             del self.connection_info[websocket]
 
-    def _serialize_datetime(self, obj):
-        """递归处理datetime对象的序列化"""
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        elif isinstance(obj, dict):
-            return {k: self._serialize_datetime(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self._serialize_datetime(item) for item in obj]
-        return obj
-
     async def broadcast_to_task(self, task_id: str, message: dict):
         if task_id in self.task_connections:
-            # 序列化消息中的所有datetime对象
-            serialized_message = {
+            # 日志已经通过日志流发送，任务事件只带日志行数
+            task = message["task"]
+            event = {
                 "type": message["type"],
-                "task": self._serialize_datetime(message["task"])
+                "task": {**{k: v for k, v in task.items() if k != "logs"},
+                         "log_count": len(task.get("logs") or [])}
             }
             # 获取所有接收者
             receivers = self.task_connections[task_id]["receiver"]
             logger.debug(f"准备向 {len(receivers)} 个接收者广播消息")
 
-            # 并发发送消息给所有接收者
-            for receiver in receivers:
+            # 每种帧格式只序列化一次，同格式的接收者共用
+            encoded = {}
+            for receiver in list(receivers):
                 try:
-                    await receiver.send_json(serialized_message)
-                    await receiver.receive_json()
+                    fmt = self.connection_info[receiver]["fmt"]
+                    if fmt not in encoded:
+                        encoded[fmt] = framing.encode(fmt, event)
+                    await send_payload(receiver, encoded[fmt])
                     logger.debug(f"消息已发送到接收者: {receiver}")
                 except Exception as e:
                     logger.error(f"发送消息到接收者时出错: {str(e)}")
@@ -129,41 +190,398 @@ manager = ConnectionManager()
 
 # 内存中存储任务
 tasks: Dict[str, Task] = {}
+# 按ID（即创建时间）排序的任务ID
+task_order = TaskOrder()
+# 已结束任务的ID，同样按创建时间排序，容量淘汰时从最早的开始
+finished_order = TaskOrder()
+id_generator = IdGenerator()
+# 保留策略和按过期时间排列的任务
+retention_policy = RetentionPolicy.from_env()
+expiry_queue = ExpiryQueue()
+# 日志写入的限流和容量控制
+ingest = IngestController()
+# 看板统计，随任务状态变化增量更新
+task_stats = TaskStats()
+# 按任务估算的内存占用，随写入增量更新
+task_memory = MemoryAccounting()
+# 后台清理的累计结果
+retention_totals = {"sweeps": 0, "expired": 0, "evicted": 0, "orphan_blobs": 0, "bytes_freed": 0}
+# 已序列化的任务视图缓存
+response_cache = ResponseCache()
+# 可续传的日志发送流: task_id -> {stream_id: 已接收的行数}
+sender_streams: Dict[str, Dict[str, int]] = {}
+# 接收者共享的过滤结果: (task_id, 过滤条件) -> FilteredFeed
+log_feeds = FeedRegistry()
+# 跨任务的日志全文索引
+log_index = LogIndex()
+# 每个任务按偏移顺序的日志时间（epoch秒）
+time_index = TimeIndex()
+# 任务状态和参数的二级索引
+task_indexes = TaskIndexes(paramindex.DEFAULT_INDEXES)
+# 停机排空状态
+drain_state = DrainState()
+# 停机时保存任务快照的路径，启动时从中恢复；不设置时不保存
+DRAIN_SNAPSHOT = os.environ.get("DRAIN_SNAPSHOT")
+
+
+# 首页预压缩后常驻内存
+index_page = compression.PrecompressedFile("static/index.html", "text/html; charset=utf-8")
 
 
 @app.get("/")
-async def read_root():
-    return FileResponse("static/index.html")
+async def read_root(request: Request):
+    return index_page.response(request)
+
+
+END_SIGNAL = "END_SIGNAL"
+# 任务进入这些状态后不会再产生新日志
+TERMINAL_STATUSES = {TaskStatus.COMPLETED, TaskStatus.FAILED}
+# 看板统计的最短推送间隔（秒）
+STATS_PUSH_INTERVAL = 1.0
+# GET /tasks 单页最多返回的任务数
+MAX_PAGE_SIZE = 1000
+# 分页读取任务结果中的数组时单页最多返回的元素数
+MAX_RESULT_PAGE_SIZE = 10000
+# 结构化帧格式下，接收者单帧最多携带的日志条数
+RECEIVER_BATCH_SIZE = 500
+# 接收者的过滤结果每次最多过滤的日志行数，积压较多时分块处理，块之间让出事件循环
+FEED_SCAN_CHUNK = 10000
+
+
+def touch_task(task: Task):
+    """标记任务已变更：递增版本号并刷新更新时间"""
+    task.version += 1
+    task.updated_at = datetime.now()
+    response_cache.invalidate(task.id)
+    task_indexes.add(task)
+    schedule_expiry(task)
+    task_stats.transition(task.id, task.status.value)
+    track_finished(task)
+    if task.status in TERMINAL_STATUSES:
+        # head_tail 模式暂存的最近日志在任务结束时追加
+        tail = ingest.finish(task.id)
+        if tail:
+            append_logs(task, tail)
+        task_memory.set(task.id, "pending", ingest.pending_bytes(task.id))
+        # 结束的任务不再接收日志，不需要保留续传位置
+        sender_streams.pop(task.id, None)
+    task_memory.measure_documents(task.id, task.params, task.result)
+
+
+def track_finished(task: Task):
+    """按任务当前状态维护已结束任务的顺序（任务可能被改回未结束状态）"""
+    if task.status in TERMINAL_STATUSES:
+        if task.id not in finished_order:
+            finished_order.add(task.id)
+    else:
+        finished_order.remove(task.id)
+
+
+def schedule_expiry(task: Task):
+    expiry_queue.schedule(task.id, retention_policy.deadline(
+        task.status.value, task.updated_at.timestamp()))
+
+
+def append_logs(task: Task, logs: List[TaskLog]):
+    """追加任务日志，所有日志写入路径都经过这里"""
+    log_index.add(task.id, len(task.logs), logs)
+    time_index.add(task.id, logs)
+    task.logs.extend(logs)
+    task_memory.add(task.id, "logs", memory.log_bytes(logs))
+    task.version += 1
+    response_cache.invalidate(task.id)
+
+
+def ingest_logs(task: Task, logs: List[TaskLog]):
+    """发送端和REST写入的日志先经过任务日志容量控制"""
+    accepted = ingest.admit(task.id, logs)
+    if accepted:
+        append_logs(task, accepted)
+    task_memory.set(task.id, "pending", ingest.pending_bytes(task.id))
+
+
+def replace_logs(task: Task, logs: List[TaskLog]):
+    """整体替换任务日志，重建依赖日志偏移的索引"""
+    task.logs = [TaskLog.model_validate(log) for log in logs]
+    log_index.rebuild(task.id, task.logs)
+    time_index.rebuild(task.id, task.logs)
+    # 替换后的日志即使不比原来短，原有的过滤结果也已失效
+    log_feeds.reset_task(task.id)
+    task_memory.set(task.id, "logs", memory.log_bytes(task.logs))
+
+
+def task_etag(task: Task) -> str:
+    return f'"{task.id}.{task.version}"'
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match / If-Match 头是否命中当前ETag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def file_refs(task: Task) -> List[str]:
+    """任务参数和结果引用的文件哈希"""
+    refs = []
+    for owner in (task.params, task.result or {}):
+        digest = owner.get("file_sha256")
+        if isinstance(digest, str) and valid_digest(digest):
+            refs.append(digest)
+    return refs
+
+
+def releasable_bytes(task: Task) -> int:
+    """删除任务后实际能释放的字节数：只统计没有被其他任务共享的文件"""
+    refs = file_refs(task)
+    freed = 0
+    for digest in set(refs):
+        if blobs.refcount(digest) <= refs.count(digest):
+            freed += blobs.size(digest) or 0
+    return freed
+
+
+def attach_file(target: dict, digest: str, filename: str):
+    """在参数或结果中记录文件的内容地址和原始文件名"""
+    target["file_path"] = blobs.path(digest)
+    target["file_sha256"] = digest
+    target["original_filename"] = filename
+
+
+def remove_task(task_id: str) -> Task:
+    """删除任务及其所有派生状态（缓存、索引、发送流、文件引用）"""
+    task = tasks.pop(task_id)
+    task_order.remove(task_id)
+    finished_order.remove(task_id)
+    expiry_queue.cancel(task_id)
+    ingest.drop_task(task_id)
+    task_stats.remove(task_id)
+    task_memory.remove(task_id)
+    response_cache.invalidate(task_id)
+    sender_streams.pop(task_id, None)
+    log_feeds.drop_task(task_id)
+    log_index.remove(task_id)
+    time_index.remove(task_id)
+    task_indexes.remove(task_id)
+    blobs.retarget(file_refs(task), [])
+    return task
+
+
+def register_task(params: dict, record: bool = True) -> Task:
+    """创建任务并写入存储；record 为False时不计入吞吐（用于导入）"""
+    new_task = Task(
+        id=id_generator.new(),
+        params=params,
+        status=TaskStatus.PENDING,
+        created_at=datetime.now(),
+        updated_at=datetime.now()
+    )
+    add_task(new_task, record=record)
+    return new_task
+
+
+def add_task(task: Task, record: bool = True):
+    """把任务写入存储并建立派生状态；record 为False时不计入吞吐（用于恢复快照）"""
+    tasks[task.id] = task
+    task_order.add(task.id)
+    task_indexes.add(task)
+    schedule_expiry(task)
+    task_stats.transition(task.id, task.status.value, record=record)
+    track_finished(task)
+    task_memory.measure_documents(task.id, task.params, task.result)
+    blobs.retarget([], file_refs(task))
+
+
+# 任务各个视图的编码方式
+VIEW_ENCODERS = {
+    "task": codec.encode_task,
+    "result": lambda task: codec.dumps(task.result),
+    "logs": lambda task: codec.encode_logs(task.logs),
+    "params": lambda task: codec.dumps({
+        "params": task.params,
+        "file_path": task.params.get("file_path")
+    }),
+    # 列表页使用：不含日志，只给出日志行数
+    "summary": lambda task: codec.dumps({
+        **task.model_dump(mode="json", exclude={"logs"}), "log_count": len(task.logs)}),
+}
+
+
+def encode_view(task: Task, view: str) -> bytes:
+    """编码任务视图，优先使用缓存"""
+    return response_cache.get_or_encode(
+        task.id, task.version, view, lambda: VIEW_ENCODERS[view](task))
+
+
+def get_task_or_404(task_id: str) -> Task:
+    if task_id not in tasks:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return tasks[task_id]
+
+
+def not_modified(request: Request, task: Task) -> Optional[Response]:
+    """客户端缓存的版本仍然有效时直接返回304，不做任何序列化"""
+    etag = task_etag(task)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+async def receive_frame(websocket: WebSocket) -> dict:
+    """读取一个原始帧（文本或二进制），断开时抛出WebSocketDisconnect"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    return message
+
+
+async def send_payload(websocket: WebSocket, payload: str | bytes):
+    """发送已编码的帧：msgpack为二进制帧，json为文本帧"""
+    if isinstance(payload, bytes):
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
+
+
+async def send_frame(websocket: WebSocket, fmt: str, message: dict):
+    await send_payload(websocket, framing.encode(fmt, message))
+
+
+async def accept_log_stream(websocket: WebSocket) -> Optional[tuple[str, str, dict]]:
+    """接受日志流连接并完成初始化握手
+
+    返回 (task_id, 帧格式, 初始化数据)，任务不存在或帧格式不支持时关闭连接并返回None。
+    """
+    logger.debug("收到新的WebSocket连接请求")
+    if drain_state.draining:
+        # 排空期间不再接受新的日志流，客户端应稍后重连到重启后的服务
+        await websocket.close(code=drain.GOING_AWAY_CODE)
+        return None
+    # 先协商子协议再接受WebSocket连接
+    subprotocol = framing.pick_subprotocol(
+        websocket.scope.get("subprotocols", []))
+    await websocket.accept(subprotocol=subprotocol)
+    logger.debug(f"WebSocket连接已接受, 子协议: {subprotocol}")
+
+    # 等待客户端发送初始化数据
+    logger.debug("等待客户端发送初始化数据...")
+    data = await websocket.receive_text()
+    logger.debug(f"收到初始化数据: {data}")
+    init_data = codec.loads(data)
+
+    task_id = init_data.get("task_id")
+    # 检查任务是否存在
+    if task_id not in tasks:
+        logger.warning(f"尝试连接不存在的任务: task_id={task_id}")
+        await websocket.close(code=1008, reason="任务不存在")
+        return None
+
+    try:
+        fmt = framing.resolve(subprotocol, init_data.get("protocol"))
+    except framing.FramingError as e:
+        logger.warning(f"帧格式协商失败: {str(e)}")
+        await websocket.close(code=1003, reason=str(e))
+        return None
+    return task_id, fmt, init_data
+
+
+async def send_going_away(websocket: WebSocket, fmt: str, position: dict):
+    """排空时通知客户端续传位置和建议的重连等待时间，然后以1012关闭"""
+    if fmt != framing.TEXT:
+        await send_frame(websocket, fmt, {
+            "type": "going_away", **position, "retry_after": drain_state.retry_after()})
+    await websocket.close(code=drain.GOING_AWAY_CODE, reason="服务正在重启")
+
+
+async def receive_or_drain(websocket: WebSocket, stop: asyncio.Future) -> Optional[dict]:
+    """等待下一帧；进入排空状态时返回None，已到达的帧仍然优先处理"""
+    if stop.done():
+        return None
+    receive = asyncio.ensure_future(receive_frame(websocket))
+    await asyncio.wait([receive, stop], return_when=asyncio.FIRST_COMPLETED)
+    if receive.done():
+        return receive.result()
+    receive.cancel()
+    return None
 
 
 @app.websocket("/ws/sender")
-async def websocket_endpoint(websocket: WebSocket):
+async def sender_endpoint(websocket: WebSocket):
+    with drain_state.stream():
+        await handle_sender(websocket)
+
+
+async def handle_sender(websocket: WebSocket):
+    stop = drain_state.subscribe()
     try:
-        logger.debug("收到新的WebSocket连接请求")
-        # 先接受WebSocket连接
-        await websocket.accept()
-        logger.debug("WebSocket连接已接受")
-
-        # 等待客户端发送初始化数据
-        logger.debug("等待客户端发送初始化数据...")
-        data = await websocket.receive_text()
-        logger.debug(f"收到初始化数据: {data}")
-        init_data = json.loads(data)
-
-        task_id = init_data.get("task_id")
-        # 检查任务是否存在
-        if task_id not in tasks:
-            logger.warning(f"尝试连接不存在的任务: task_id={task_id}")
-            await websocket.close(code=1008, reason="任务不存在")
+        accepted = await accept_log_stream(websocket)
+        if accepted is None:
             return
+        task_id, fmt, init_data = accepted
+
+        # 带stream_id的结构化发送流支持确认和断线续传
+        stream_id = init_data.get("stream_id")
+        streams = None
+        if stream_id is not None and fmt != framing.TEXT:
+            stream_id = str(stream_id)
+            streams = sender_streams.setdefault(task_id, {})
+            streams.setdefault(stream_id, 0)
+            await send_frame(websocket, fmt, {"type": "ready", "seq": streams[stream_id]})
+            logger.debug(f"发送流就绪: task_id={task_id}, stream_id={stream_id}, seq={streams[stream_id]}")
+        connection_limit = ingest.connection_limit()
 
         while True:
-            data = await websocket.receive_text()
-            logger.debug(f"收到消息: {data}")
-            task = tasks[task_id]
-            task.logs.append(
-                TaskLog(level="INFO", content=data, timestamp=datetime.now().isoformat()))
-            if data == "END_SIGNAL":
+            frame = await receive_or_drain(websocket, stop)
+            if frame is None:
+                # 当前批次已经写入并确认，告知客户端已接收的位置
+                logger.info(f"服务排空，关闭发送流: task_id={task_id}")
+                position = {"seq": streams[stream_id]} if streams is not None else {}
+                await send_going_away(websocket, fmt, position)
+                return
+            if fmt == framing.TEXT:
+                data = frame["text"]
+                logger.debug(f"收到消息: {data}")
+                logs = [TaskLog(level="INFO", content=data,
+                                timestamp=datetime.now().isoformat())]
+            else:
+                try:
+                    logs, seq = framing.read_batch(framing.decode(fmt, frame))
+                except framing.FramingError as e:
+                    logger.warning(f"收到无效的日志帧: {str(e)}")
+                    await websocket.close(code=1003, reason=str(e))
+                    return
+                if streams is not None and seq is not None:
+                    expected = streams[stream_id]
+                    if seq > expected:
+                        logger.warning(f"日志序号不连续: 期望 {expected}, 收到 {seq}")
+                        await websocket.close(code=1008, reason="日志序号不连续")
+                        return
+                    # 丢弃重连后重复发送的部分
+                    logs = logs[expected - seq:]
+                logger.debug(f"收到日志批次: {len(logs)} 条")
+
+            # 先确认任务仍然存在，避免为已删除的任务建立限速状态
+            if task_id not in tasks:
+                logger.warning(f"任务已删除，关闭发送流: task_id={task_id}")
+                await websocket.close(code=1008, reason="任务不存在")
+                return
+            # 超过速率时暂停读取该连接，反压传递给发送端
+            delay = ingest.reserve(task_id, logs, connection_limit)
+            if delay:
+                await asyncio.sleep(delay)
+                if task_id not in tasks:
+                    # 等待期间任务被删除，释放预留额度时建立的限速状态
+                    ingest.drop_task(task_id)
+                    logger.warning(f"任务已删除，关闭发送流: task_id={task_id}")
+                    await websocket.close(code=1008, reason="任务不存在")
+                    return
+            ingest_logs(tasks[task_id], logs)
+            if streams is not None:
+                streams[stream_id] += len(logs)
+                await send_frame(websocket, fmt, {"type": "ack", "seq": streams[stream_id]})
+            if any(log.content == END_SIGNAL for log in logs):
                 break
 
     except WebSocketDisconnect:
@@ -173,40 +591,133 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket处理过程中发生错误: {str(e)}", exc_info=True)
         manager.disconnect(websocket)
         raise e
+    finally:
+        drain_state.unsubscribe(stop)
+
+
+def feed_floor(task_id: str, log_filter: LogFilter, from_offset: int, logs: List[TaskLog]) -> int:
+    """过滤结果需要覆盖的第一个偏移
+
+    有时间范围时，时间索引圈定的第一行之前的日志都不会匹配，不必过滤，
+    但最后一行的结束信号总是通过过滤，不能跳过；
+    限速采样的结果依赖之前的日志，不按读取位置截断，保证共享结果的接收者看到相同的采样。
+    """
+    length = len(logs)
+    floor = 0 if log_filter.rate is not None else min(from_offset, length)
+    if log_filter.has_time_range:
+        window = time_index.window(task_id, log_filter.since, log_filter.until)
+        first = window[0] if len(window) else length
+        if logs and logs[-1].content in logfilter.CONTROL_CONTENTS:
+            first = min(first, length - 1)
+        floor = max(floor, first)
+    return floor
+
+
+def feed_entry(item: FeedItem, logs: List[TaskLog]) -> dict:
+    """把过滤结果中的一项转换为日志帧条目"""
+    if isinstance(item, tuple):
+        return logfilter.summary_entry(item, logs)
+    return framing.log_entry(item, logs[item])
 
 
 @app.websocket("/ws/receiver")
-async def websocket_endpoint(websocket: WebSocket):
+async def receiver_endpoint(websocket: WebSocket):
+    with drain_state.stream():
+        await handle_receiver(websocket)
+
+
+async def handle_receiver(websocket: WebSocket):
+    feed = None
+    task_id = None
     try:
-        logger.debug("收到新的WebSocket连接请求")
-        # 先接受WebSocket连接
-        await websocket.accept()
-        logger.debug("WebSocket连接已接受")
-
-        # 等待客户端发送初始化数据
-        logger.debug("等待客户端发送初始化数据...")
-        data = await websocket.receive_text()
-        logger.debug(f"收到初始化数据: {data}")
-        init_data = json.loads(data)
-
-        task_id = init_data.get("task_id")
-        # 检查任务是否存在
-        if task_id not in tasks:
-            logger.warning(f"尝试连接不存在的任务: task_id={task_id}")
-            await websocket.close(code=1008, reason="任务不存在")
+        accepted = await accept_log_stream(websocket)
+        if accepted is None:
             return
+        task_id, fmt, init_data = accepted
 
-        log_index = 0
+        try:
+            log_filter = LogFilter.from_params(init_data.get("filter"))
+        except ValueError as e:
+            logger.warning(f"无效的日志过滤条件: {str(e)}")
+            await websocket.close(code=1003, reason=str(e))
+            return
+        # 结构化帧格式支持从指定偏移开始，以及只读取现有日志不跟随
+        from_offset = init_data.get("from_offset") or 0
+        if isinstance(from_offset, bool) or not isinstance(from_offset, (int, str)) \
+                or not str(from_offset).lstrip("-").isdigit():
+            logger.warning(f"无效的起始偏移: {from_offset!r}")
+            await websocket.close(code=1003, reason=f"无效的起始偏移: {from_offset}")
+            return
+        log_index = max(int(from_offset), 0)
+        # 相同过滤条件的接收者共享同一份过滤结果
+        if log_filter is not None:
+            feed = log_feeds.subscribe(task_id, log_filter)
+        # 结构化帧格式的接收者同时接收任务变更事件；文本协议每帧都是日志行，不登记
+        if fmt != framing.TEXT:
+            await manager.connect(websocket, task_id, "receiver", fmt)
+
+        follow = init_data.get("follow", True)
+        # 过滤模式下需要覆盖的第一个偏移，以及它所属的结果代数
+        floor = 0
+        feed_generation = None
         while True:
-            if log_index < len(tasks[task_id].logs):
-                content = tasks[task_id].logs[log_index].content
-                await websocket.send_text(content)
-                logger.debug(f"index: {log_index} 发送消息: {content}")
-                if content == "END_SIGNAL":
-                    break
-                log_index += 1
+            if drain_state.draining:
+                # 告知接收者下一个要读取的偏移，重启后从这里续读
+                await send_going_away(websocket, fmt, {"offset": log_index})
+                break
+            task = tasks.get(task_id)
+            if task is None:
+                if fmt != framing.TEXT:
+                    await send_frame(websocket, fmt, {
+                        "type": "end", "status": "deleted", "offset": log_index})
+                await websocket.close(code=1000)
+                break
+            logs = task.logs
+            if feed is None:
+                items = range(log_index, min(len(logs), log_index + RECEIVER_BATCH_SIZE))
             else:
+                if feed_generation != feed.generation:
+                    # 新订阅或日志被整体替换后，按当前读取位置和时间范围重新确定起点
+                    floor = feed_floor(task_id, log_filter, log_index, logs)
+                    feed_generation = feed.generation
+                feed.advance(logs, time_index.epochs(task_id), floor, FEED_SCAN_CHUNK)
+                if not feed.covers(floor, len(logs)):
+                    # 积压的日志分块过滤，每块之间让出事件循环
+                    await asyncio.sleep(0)
+                    continue
+                position = feed.position(log_index)
+                items = feed.items[position:position + RECEIVER_BATCH_SIZE]
+
+            if not items:
+                if feed is not None:
+                    log_index = max(log_index, len(logs))
+                # 日志已全部发出且任务已结束（或不跟随）时通知接收者最终状态
+                if fmt != framing.TEXT and (not follow or task.status in TERMINAL_STATUSES):
+                    await send_frame(websocket, fmt, {
+                        "type": "end", "status": task.status.value, "offset": log_index})
+                    break
                 await asyncio.sleep(0.5)
+                continue
+
+            entries = [feed_entry(item, logs) for item in items]
+            log_index = entries[-1]["offset"] + 1
+            ended = any(entry["content"] == END_SIGNAL for entry in entries)
+            if fmt == framing.TEXT:
+                for entry in entries:
+                    await websocket.send_text(entry["content"])
+                    logger.debug(f"index: {entry['offset']} 发送消息: {entry['content']}")
+                    if entry["content"] == END_SIGNAL:
+                        break
+                if ended:
+                    break
+            else:
+                # 结构化帧格式下把积压的日志合并成一批发送
+                await send_frame(websocket, fmt, {"type": "logs", "entries": entries})
+                logger.debug(f"index: {entries[0]['offset']} 发送日志批次: {len(entries)} 条")
+                if ended:
+                    await send_frame(websocket, fmt, {
+                        "type": "end", "status": task.status.value, "offset": log_index})
+                    break
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket连接断开: {websocket}")
@@ -215,52 +726,63 @@ async def websocket_endpoint(websocket: WebSocket):
         logger.error(f"WebSocket处理过程中发生错误: {str(e)}", exc_info=True)
         manager.disconnect(websocket)
         raise e
+    finally:
+        manager.disconnect(websocket)
+        if feed is not None:
+            log_feeds.unsubscribe(task_id, feed)
 
 
 # REST API endpoints
 @app.get("/tasks", response_model=List[Task])
-async def get_tasks():
-    return list(tasks.values())
+async def get_tasks(
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: Literal["asc", "desc"] = "asc",
+    view: Literal["task", "summary"] = "task"
+):
+    """按ID（创建）顺序列出任务
+
+    不带参数时返回全部任务；带 limit 时返回一页，还有更多时在 X-Next-Cursor 头中返回下一页的游标。
+    order=desc&limit=N 即最新的N个任务。view=summary 时不含日志，只给出 log_count。
+    """
+    selected = task_order.page(limit, cursor, order == "desc")
+    headers = None
+    if limit is not None and len(selected) == limit and task_order.page(1, selected[-1], order == "desc"):
+        headers = {"X-Next-Cursor": selected[-1]}
+    if view == "summary":
+        body = b"[" + b",".join(encode_view(tasks[task_id], "summary") for task_id in selected) + b"]"
+    else:
+        body = codec.encode_tasks([tasks[task_id] for task_id in selected])
+    return codec.json_response(body, headers=headers)
 
 
 @app.post("/tasks", response_model=Task)
 async def create_task(
     file: Optional[UploadFile] = File(None),
-    params: str = Form(...)
+    params: str = Form(...),
+    file_sha256: Optional[str] = Form(None),
+    file_name: Optional[str] = Form(None)
 ):
     try:
         # 解析参数
-        params_dict = json.loads(params)
+        params_dict = codec.loads(params)
         logger.debug(f"创建新任务，参数: {params_dict}")
 
-        # 处理文件上传
-        file_path = None
+        # 处理文件上传：相同内容的文件只保存一份
         if file:
-            # 生成唯一的文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{timestamp}_{file.filename}"
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-            # 保存文件
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-
-            # 将文件路径添加到参数中
-            params_dict["file_path"] = file_path
-            logger.debug(f"文件已上传: {file_path}")
+            digest, size = await blobs.save_upload(file)
+            attach_file(params_dict, digest, file.filename)
+            logger.debug(f"文件已上传: {digest}, {size} 字节")
+        elif file_sha256:
+            # 服务端已有该文件时直接按哈希引用，不需要重新上传
+            if not blobs.exists(file_sha256):
+                raise HTTPException(status_code=404, detail="文件不存在")
+            attach_file(params_dict, file_sha256, file_name or file_sha256)
+            logger.debug(f"按哈希引用已有文件: {file_sha256}")
 
         # 创建任务
-        task_id = str(len(tasks) + 1)
-        new_task = Task(
-            id=task_id,
-            params=params_dict,
-            status=TaskStatus.PENDING,
-            created_at=datetime.now(),
-            updated_at=datetime.now()
-        )
-        tasks[task_id] = new_task
+        new_task = register_task(params_dict)
+        task_id = new_task.id
         logger.info(f"任务创建成功: {task_id}")
 
         await manager.broadcast_to_task(task_id, {
@@ -268,7 +790,9 @@ async def create_task(
             "task": new_task.model_dump()
         })
         return new_task
-    except json.JSONDecodeError:
+    except HTTPException:
+        raise
+    except codec.JSONDecodeError:
         logger.error(f"创建任务失败: 无效的参数格式")
         raise HTTPException(status_code=400, detail="无效的参数格式")
     except Exception as e:
@@ -276,22 +800,344 @@ async def create_task(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def broadcast_tasks(event_type: str, changed: List[Task]):
+    """批量变更后的通知：只向有接收者的任务广播，没有连接的任务不做序列化"""
+    for task in changed:
+        if task.id in manager.task_connections:
+            await manager.broadcast_to_task(task.id, {
+                "type": event_type,
+                "task": task.model_dump()
+            })
+
+
+@app.post("/tasks:batch")
+async def create_tasks_batch(batch: TaskBatchCreate):
+    """批量创建任务，一次请求完成；任务可按哈希引用已上传的文件
+
+    先检查全部引用的文件，任一不存在时返回404且不创建任何任务。
+    """
+    missing = sorted({item.file_sha256 for item in batch.tasks
+                      if item.file_sha256 and not blobs.exists(item.file_sha256)})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"文件不存在: {', '.join(missing)}")
+
+    created = []
+    for item in batch.tasks:
+        params = dict(item.params)
+        if item.file_sha256:
+            attach_file(params, item.file_sha256, item.file_name or item.file_sha256)
+        created.append(register_task(params))
+    logger.info(f"批量创建任务成功: {len(created)} 个")
+
+    await broadcast_tasks("task_created", created)
+    return codec.json_response(b'{"tasks":' + codec.encode_tasks(created) + b'}')
+
+
+@app.post("/tasks:bulkUpdate")
+async def bulk_update_tasks(update: TaskBulkUpdate):
+    """按ID列表或索引条件批量修改任务状态
+
+    先确定全部目标任务，任一ID不存在时返回404且不修改任何任务；
+    修改在一次同步调用内完成，期间不会穿插其他请求。已是目标状态的任务不计入更新。
+    返回 {"matched": 命中数, "updated": 更新数, "ids": 更新的任务ID}。
+    """
+    if (update.ids is None) == (update.where is None):
+        raise HTTPException(status_code=400, detail="ids 和 where 必须且只能指定一个")
+    if update.ids is not None:
+        missing = [task_id for task_id in update.ids if task_id not in tasks]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"任务不存在: {', '.join(missing)}")
+        selected = list(dict.fromkeys(update.ids))
+    else:
+        try:
+            selected = sorted(task_indexes.query(
+                [(p.field, p.op, p.value) for p in update.where], task_order))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    changed = []
+    for task_id in selected:
+        task = tasks[task_id]
+        if task.status == update.status:
+            continue
+        task.status = update.status
+        touch_task(task)
+        changed.append(task)
+    logger.info(f"批量更新任务状态为 {update.status.value}: 命中 {len(selected)} 个, 更新 {len(changed)} 个")
+
+    await broadcast_tasks("task_updated", changed)
+    return FastJSONResponse({"matched": len(selected), "updated": len(changed),
+                             "ids": [task.id for task in changed]})
+
+
+@app.post("/tasks:batchGet")
+async def get_tasks_batch(batch: TaskBatchGet):
+    """按ID批量获取任务视图，返回 {"items": {id: 视图}, "missing": [不存在的ID]}"""
+    items = []
+    missing = []
+    for task_id in batch.ids:
+        task = tasks.get(task_id)
+        if task is None:
+            missing.append(task_id)
+            continue
+        # 直接拼接各任务已缓存的视图字节
+        items.append(codec.dumps(task_id) + b":" + encode_view(task, batch.view))
+    body = (b'{"items":{' + b",".join(items) + b'},"missing":'
+            + codec.dumps(missing) + b'}')
+    return codec.json_response(body)
+
+
+def export_response(request: Request, chunks, fmt: str, filename: str) -> StreamingResponse:
+    """流式导出响应，客户端接受gzip时边生成边压缩"""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    accepted = compression.accepted_encodings(request.headers.get("accept-encoding", ""))
+    if "gzip" in accepted:
+        chunks = export.gzip_stream(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=export.EXPORT_FORMATS[fmt], headers=headers)
+
+
+def encode_task_for_export(task_id: str) -> Optional[bytes]:
+    """导出时复用已缓存的任务编码，但不把导出的任务写入缓存，避免挤掉热点数据"""
+    task = tasks.get(task_id)
+    if task is None:
+        return None
+    body = response_cache.get(task.id, task.version, "task")
+    return body if body is not None else codec.encode_task(task)
+
+
+@app.get("/tasks:export")
+async def export_tasks(
+    request: Request,
+    format: Literal["ndjson", "json"] = "ndjson",
+    status: List[TaskStatus] = Query(default=[])
+):
+    """按ID（创建）顺序流式导出任务，可按状态过滤"""
+    if status:
+        matched = task_indexes.query([("status", "in", [s.value for s in status])], ())
+        task_ids = sorted(matched)
+    else:
+        task_ids = list(task_order)
+    chunks = export.iter_tasks(task_ids, encode_task_for_export, format)
+    return export_response(request, chunks, format, f"tasks.{format}")
+
+
+@app.get("/tasks:bundle")
+async def export_bundle(
+    ids: List[str] = Query(default=[]),
+    status: List[TaskStatus] = Query(default=[]),
+    compression: Literal["none", "gzip", "zstd"] = "gzip"
+):
+    """把任务的参数、输入文件、结果、结果文件和日志流式打包为tar
+
+    指定 ids 时导出这些任务，否则按状态（默认全部）导出。
+    """
+    if compression not in bundle.available_compressions():
+        raise HTTPException(status_code=400, detail=f"服务端不支持的压缩格式: {compression}")
+    if ids:
+        task_ids = [task_id for task_id in dict.fromkeys(ids) if task_id in tasks]
+    elif status:
+        matched = task_indexes.query([("status", "in", [s.value for s in status])], ())
+        task_ids = sorted(matched)
+    else:
+        task_ids = list(task_order)
+    media_type, extension = bundle.BUNDLE_MEDIA_TYPES[compression]
+    chunks = bundle.compress_stream(bundle.iter_bundle(task_ids, tasks.get), compression)
+    logger.info(f"开始导出归档: {len(task_ids)} 个任务, 压缩: {compression}")
+    return StreamingResponse(chunks, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="tasks.{extension}"'})
+
+
+@app.post("/tasks:import")
+async def import_bundle(request: Request):
+    """导入 /tasks:bundle 生成的归档，任务分配新的ID，返回原ID到新ID的映射"""
+    loop = asyncio.get_running_loop()
+    reader = bundle.AsyncStreamReader(request.stream(), loop)
+    try:
+        # tar解析和文件写入在线程中进行，请求体边接收边解析
+        records = await loop.run_in_executor(
+            None, bundle.read_bundle, reader, blobs.save_stream, blobs.discard)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # 先校验全部元数据，避免只导入一部分
+        states = {source_id: (TaskStatus(record["meta"].get("status", TaskStatus.PENDING)),
+                              datetime.fromisoformat(record["meta"]["created_at"])
+                              if record["meta"].get("created_at") else None)
+                  for source_id, record in records.items()}
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"无效的任务元数据: {e}")
+
+    imported = []
+    for source_id, record in records.items():
+        meta = record["meta"]
+        params = dict(meta.get("params") or {})
+        for key in ("file_path", "file_sha256", "original_filename"):
+            params.pop(key, None)
+        if record["file"]:
+            attach_file(params, *record["file"])
+        task = register_task(params, record=False)
+        result = meta.get("result")
+        if result is not None:
+            result = dict(result)
+            for key in ("file_path", "file_sha256", "original_filename"):
+                result.pop(key, None)
+            if record["result_file"]:
+                attach_file(result, *record["result_file"])
+        old_refs = file_refs(task)
+        task.result = result
+        task.status, created_at = states[source_id]
+        if created_at is not None:
+            task.created_at = created_at
+        if record["logs"]:
+            append_logs(task, record["logs"])
+        # 导入的任务只计入状态计数，不计入吞吐和时长
+        task_stats.transition(task.id, task.status.value, record=False)
+        touch_task(task)
+        blobs.retarget(old_refs, file_refs(task))
+        imported.append({"source_id": source_id, "id": task.id})
+    logger.info(f"归档导入完成: {len(imported)} 个任务")
+    return FastJSONResponse({"count": len(imported), "tasks": imported})
+
+
+def flush_pending_logs():
+    """把容量控制暂存的最近日志追加到任务日志，停机前调用，避免日志只留在内存缓冲中"""
+    for task_id in ingest.pending_tasks():
+        tail = ingest.finish(task_id)
+        task = tasks.get(task_id)
+        if task is not None and tail:
+            append_logs(task, tail)
+        task_memory.set(task_id, "pending", 0)
+
+
+async def save_snapshot(path: str):
+    """把全部任务写入停机快照，先写临时文件，完成后原子替换
+
+    快照是不含文件内容的归档（文件存储在重启后仍然存在），附带各发送流已接收的行数。
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        async for chunk in bundle.iter_bundle(list(task_order), tasks.get, include_files=False,
+                                              get_streams=sender_streams.get):
+            f.write(chunk)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Dict[str, dict]:
+    with open(path, "rb", buffering=0) as raw:
+        return bundle.read_bundle(raw, blobs.save_stream, blobs.discard)
+
+
+def restore_snapshot(records: Dict[str, dict]):
+    """按原ID恢复快照中的任务，日志偏移和发送流的接收位置与停机前一致"""
+    for task_id, record in records.items():
+        task = Task.model_validate({**record["meta"], "logs": []})
+        for owner in (task.params, task.result):
+            digest = (owner or {}).get("file_sha256")
+            if not digest:
+                continue
+            if blobs.exists(digest):
+                attach_file(owner, digest, owner.get("original_filename") or digest)
+            else:
+                logger.warning(f"快照中的任务引用的文件已不存在: {task_id}, {digest}")
+                for key in ("file_path", "file_sha256", "original_filename"):
+                    owner.pop(key, None)
+        add_task(task, record=False)
+        if record["logs"]:
+            append_logs(task, record["logs"])
+        if record["streams"]:
+            sender_streams[task_id] = record["streams"]
+
+
+@app.post("/tasks:query")
+async def query_tasks(query: TaskQuery):
+    """按已建立索引的字段查询任务，返回命中数、按ID（创建）顺序的前 limit 个任务和可选的分组计数"""
+    try:
+        matched = task_indexes.query(
+            [(p.field, p.op, p.value) for p in query.where], task_order)
+        groups = None
+        if query.group_by:
+            groups = task_indexes.group_counts(
+                query.group_by, matched if query.where else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    selected = heapq.nsmallest(query.limit, matched)
+    if query.view == "id":
+        items = codec.dumps(selected)
+    else:
+        items = b"[" + b",".join(encode_view(tasks[task_id], "task") for task_id in selected) + b"]"
+    body = b'{"count":' + str(len(matched)).encode() + b',"items":' + items
+    if groups is not None:
+        body += b',"groups":' + codec.dumps(groups)
+    return codec.json_response(body + b"}")
+
+
+@app.get("/indexes")
+async def list_indexes():
+    return FastJSONResponse({"indexes": task_indexes.stats()})
+
+
+@app.post("/indexes")
+async def create_index(index: TaskIndexCreate):
+    """声明二级索引，用现有任务填充后随任务变更增量维护"""
+    try:
+        created = task_indexes.declare(index.field, tasks.values())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if created:
+        logger.info(f"已建立索引: {index.field}")
+    return FastJSONResponse({"field": index.field, "created": created,
+                             "indexes": task_indexes.stats()})
+
+
+@app.get("/logs:search")
+async def search_logs(
+    q: str,
+    status: List[TaskStatus] = Query(default=[]),
+    level: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = Query(default=search.DEFAULT_LIMIT, ge=1, le=search.MAX_LIMIT)
+):
+    """跨任务检索日志内容，返回命中的任务ID、偏移和片段"""
+    since_epoch = logfilter.parse_time(since)
+    until_epoch = logfilter.parse_time(until)
+    if (since and since_epoch is None) or (until and until_epoch is None):
+        raise HTTPException(status_code=400, detail="无效的时间范围")
+    result = log_index.search(
+        q, tasks, statuses={s.value for s in status}, level=level,
+        since=since_epoch, until=until_epoch, limit=limit, epochs=time_index.epochs)
+    return FastJSONResponse(result)
+
+
 @app.get("/tasks/{task_id}", response_model=Task)
-async def get_task(task_id: str):
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="任务不存在")
-    return tasks[task_id]
+async def get_task(task_id: str, request: Request):
+    task = get_task_or_404(task_id)
+    cached = not_modified(request, task)
+    if cached is not None:
+        return cached
+    body = encode_view(task, "task")
+    return codec.json_response(body, headers={"ETag": task_etag(task)})
 
 
 @app.put("/tasks/{task_id}", response_model=Task)
-async def update_task(task_id: str, task_update: TaskUpdate):
+async def update_task(task_id: str, task_update: TaskUpdate, request: Request):
     if task_id not in tasks:
         logger.warning(f"更新任务失败: 任务不存在 {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
 
     task = tasks[task_id]
+    # 乐观并发控制：If-Match 与当前版本不一致时拒绝更新
+    if_match = request.headers.get("if-match")
+    if if_match and not etag_matches(if_match, task_etag(task)):
+        logger.warning(f"更新任务失败: 版本冲突 {task_id}, If-Match: {if_match}")
+        raise HTTPException(status_code=412, detail="任务版本已变更")
+
     update_data = task_update.model_dump()
     logger.debug(f"更新任务 {task_id}: {update_data}")
+    old_refs = file_refs(task)
 
     # 更新任务字段
     for field, value in update_data.items():
@@ -300,18 +1146,23 @@ async def update_task(task_id: str, task_update: TaskUpdate):
                 # 对于params字段，直接更新整个字典
                 task.params = value
                 logger.debug(f"更新任务参数: {value}")
+            elif field == "logs":
+                replace_logs(task, value)
+                logger.debug(f"替换任务日志: {len(value)} 条")
             else:
                 setattr(task, field, value)
                 logger.debug(f"更新任务字段 {field}: {value}")
 
-    task.updated_at = datetime.now()
+    touch_task(task)
+    blobs.retarget(old_refs, file_refs(task))
     logger.info(f"任务更新成功: {task_id}")
 
     await manager.broadcast_to_task(task_id, {
         "type": "task_updated",
         "task": task.model_dump()
     })
-    return task
+    body = encode_view(task, "task")
+    return codec.json_response(body, headers={"ETag": task_etag(task)})
 
 
 @app.post("/tasks/{task_id}/result")
@@ -326,40 +1177,29 @@ async def submit_task_result(
 
     try:
         # 解析结果参数
-        result_dict = json.loads(result_params)
+        result_dict = codec.loads(result_params)
         logger.debug(f"提交任务结果 {task_id}: {result_dict}")
 
         # 处理结果文件上传
-        file_path = None
         if file:
-            # 生成唯一的文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            file_extension = os.path.splitext(file.filename)[1]
-            unique_filename = f"{timestamp}_{file.filename}"
-            file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-            # 保存文件
-            with open(file_path, "wb") as buffer:
-                content = await file.read()
-                buffer.write(content)
-
-            # 将文件路径和原始文件名添加到结果中
-            result_dict["file_path"] = file_path
-            result_dict["original_filename"] = file.filename  # 保存原始文件名
-            logger.debug(f"结果文件已上传: {file_path}")
+            digest, size = await blobs.save_upload(file)
+            attach_file(result_dict, digest, file.filename)
+            logger.debug(f"结果文件已上传: {digest}, {size} 字节")
 
         task = tasks[task_id]
+        old_refs = file_refs(task)
         task.result = result_dict
         task.status = TaskStatus.COMPLETED
-        task.updated_at = datetime.now()
+        touch_task(task)
+        blobs.retarget(old_refs, file_refs(task))
         logger.info(f"任务结果提交成功: {task_id}")
 
         await manager.broadcast_to_task(task_id, {
             "type": "task_updated",
             "task": task.model_dump()
         })
-        return {"message": "任务结果已提交", "task": task.model_dump()}
-    except json.JSONDecodeError:
+        return FastJSONResponse({"message": "任务结果已提交", "task": task.model_dump()})
+    except codec.JSONDecodeError:
         logger.error(f"提交任务结果失败: 无效的结果参数格式")
         raise HTTPException(status_code=400, detail="无效的结果参数格式")
     except Exception as e:
@@ -368,15 +1208,49 @@ async def submit_task_result(
 
 
 @app.get("/tasks/{task_id}/result")
-async def get_task_result(task_id: str):
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="任务不存在")
+async def get_task_result(
+    task_id: str,
+    request: Request,
+    pointer: str = "",
+    offset: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_RESULT_PAGE_SIZE)
+):
+    """获取任务结果
 
-    task = tasks[task_id]
+    pointer 为 JSON Pointer（如 /output/summary）时只返回该节点；
+    带 offset/limit 时 pointer 须指向数组，返回其中一段（limit 默认为单页上限），
+    响应头 X-Total-Count 为数组长度，还有更多时 X-Next-Offset 为下一页的 offset。
+    """
+    task = get_task_or_404(task_id)
     if task.result is None:
         raise HTTPException(status_code=404, detail="任务结果不存在")
 
-    return task.result
+    cached = not_modified(request, task)
+    if cached is not None:
+        return cached
+    headers = {"ETag": task_etag(task)}
+    try:
+        if offset is None and limit is None:
+            if not pointer:
+                body = encode_view(task, "result")
+            else:
+                # 同一节点的重复读取使用缓存，结果更新后版本变化自动失效
+                body = response_cache.get_or_encode(
+                    task.id, task.version, f"result:{pointer}",
+                    lambda: codec.dumps(resultpointer.resolve(task.result, pointer)))
+        else:
+            offset = offset or 0
+            items, total = resultpointer.page(
+                resultpointer.resolve(task.result, pointer), offset, limit or MAX_RESULT_PAGE_SIZE)
+            body = codec.dumps(items)
+            headers["X-Total-Count"] = str(total)
+            if offset + len(items) < total:
+                headers["X-Next-Offset"] = str(offset + len(items))
+    except resultpointer.PointerError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"结果中不存在路径: {pointer}")
+    return codec.json_response(body, headers=headers)
 
 
 @app.get("/tasks/{task_id}/result/file")
@@ -412,25 +1286,118 @@ async def add_task_log(task_id: str, log: TaskLog):
         logger.warning(f"添加任务日志失败: 任务不存在 {task_id}")
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    task = tasks[task_id]
-    task.logs.append(log)
+    admitted, delay = ingest.try_reserve(task_id, [log])
+    if not admitted:
+        raise HTTPException(status_code=429, detail="日志写入过快，请稍后重试",
+                            headers={"Retry-After": str(math.ceil(delay))})
+    if delay:
+        await asyncio.sleep(delay)
+        if task_id not in tasks:
+            # 等待期间任务被删除，释放预留额度时建立的限速状态
+            ingest.drop_task(task_id)
+    task = get_task_or_404(task_id)
+    ingest_logs(task, [log])
     task.updated_at = datetime.now()
+    # 仍在写入日志的任务从最后一次写入开始重新计算过期时间
+    schedule_expiry(task)
     logger.info(f"任务日志添加成功: {task_id}, 级别: {log.level}, 内容: {log.content}")
 
     await manager.broadcast_to_task(task_id, {
         "type": "task_updated",
         "task": task.model_dump()
     })
-    return {"message": "日志已添加", "task": task.model_dump()}
+    return FastJSONResponse({"message": "日志已添加", "task": task.model_dump()})
+
+
+def encode_filtered_logs(task: Task, log_filter: LogFilter) -> bytes:
+    """按过滤条件编码日志，采样丢弃的行以 SUMMARY 级别的摘要代替
+
+    有时间范围时先用时间索引二分得到候选区间，只过滤区间内的日志。
+    """
+    if log_filter.has_time_range:
+        offsets = time_index.window(task.id, log_filter.since, log_filter.until)
+        if log_filter.time_only and isinstance(offsets, range):
+            return codec.encode_logs(task.logs[offsets.start:offsets.stop])
+    else:
+        offsets = range(len(task.logs))
+    feed = logfilter.FilteredFeed(log_filter)
+    feed.scan(task.logs, offsets, time_index.epochs(task.id))
+    logs = []
+    for item in feed.items:
+        if isinstance(item, tuple):
+            entry = logfilter.summary_entry(item, task.logs)
+            logs.append({"timestamp": entry["ts"], "content": entry["content"],
+                         "level": entry["level"], "dropped": entry["dropped"]})
+        else:
+            logs.append(task.logs[item])
+    return codec.dumps(logs)
 
 
 @app.get("/tasks/{task_id}/logs")
-async def get_task_logs(task_id: str):
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="任务不存在")
-
-    task = tasks[task_id]
-    return task.logs
+async def get_task_logs(
+    task_id: str,
+    request: Request,
+    level: Optional[str] = None,
+    contains: Optional[str] = None,
+    regex: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    rate: Optional[float] = None
+):
+    task = get_task_or_404(task_id)
+    try:
+        log_filter = LogFilter.from_params({
+            "level": level, "contains": contains, "regex": regex,
+            "since": since, "until": until, "rate": rate})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    cached = not_modified(request, task)
+    if cached is not None:
+        return cached
+    if log_filter is None:
+        body = encode_view(task, "logs")
+    else:
+        # 过滤结果按条件缓存，相同条件的轮询共享同一份编码
+        body = response_cache.get_or_encode(
+            task.id, task.version, f"logs:{log_filter.key!r}",
+            lambda: encode_filtered_logs(task, log_filter))
+    return codec.json_response(body, headers={"ETag": task_etag(task)})
+
+
+@app.get("/tasks/{task_id}/logs:export")
+async def export_task_logs(
+    task_id: str,
+    request: Request,
+    format: Literal["ndjson", "json", "text"] = "ndjson",
+    from_offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1),
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Literal["entry", "log"] = "entry"
+):
+    """流式导出任务日志，只导出请求时已有的日志；limit 限制最多导出的行数，用于按偏移分页读取
+
+    fields=log 时每条记录使用 GET /tasks/{id}/logs 的字段（timestamp/content/level），不带 offset。
+    """
+    task = get_task_or_404(task_id)
+    since_epoch = logfilter.parse_time(since)
+    until_epoch = logfilter.parse_time(until)
+    if (since and since_epoch is None) or (until and until_epoch is None):
+        raise HTTPException(status_code=400, detail="无效的时间范围")
+    if since_epoch is not None or until_epoch is not None:
+        offsets = time_index.window(task.id, since_epoch, until_epoch)
+        if isinstance(offsets, range):
+            offsets = range(max(offsets.start, from_offset), offsets.stop)
+        else:
+            offsets = [offset for offset in offsets if offset >= from_offset]
+    else:
+        offsets = range(from_offset, len(task.logs))
+    if limit is not None:
+        offsets = offsets[:limit]
+    chunks = export.iter_logs(task.logs, offsets, format, fields)
+    extension = "log" if format == "text" else format
+    return export_response(request, chunks, format, f"task_{task_id}_logs.{extension}")
 
 
 @app.delete("/tasks/{task_id}")
@@ -438,24 +1405,96 @@ async def delete_task(task_id: str):
     if task_id not in tasks:
         raise HTTPException(status_code=404, detail="任务不存在")
 
-    task = tasks.pop(task_id)
+    task = await delete_and_notify(task_id)
+    return FastJSONResponse({"message": "任务已删除", "task": task.model_dump()})
+
+
+async def delete_and_notify(task_id: str) -> Task:
+    task = remove_task(task_id)
     await manager.broadcast_to_task(task_id, {
         "type": "task_deleted",
         "task": task.model_dump()
     })
-    return {"message": "任务已删除", "task": task.model_dump()}
+    return task
+
+
+async def sweep_retention(now: Optional[float] = None) -> dict:
+    """执行一次清理：删除到期任务，按上限淘汰最早的已结束任务，回收超过宽限期的无引用文件"""
+    now = time.time() if now is None else now
+    freed_before = blobs.bytes_freed
+    expired = []
+    for task_id in expiry_queue.pop_expired(now):
+        # 通知接收者期间任务可能已被删除
+        if task_id in tasks:
+            await delete_and_notify(task_id)
+            expired.append(task_id)
+
+    evicted = []
+    policy = retention_policy
+    orphans = blobs.reclaim_orphans(policy.orphan_grace, now)
+    over_tasks = len(tasks) - policy.max_tasks if policy.max_tasks else 0
+    while over_tasks > 0:
+        # 超出数量上限时从最早的已结束任务开始删除
+        task_id = next(iter(finished_order), None)
+        if task_id is None:
+            break
+        await delete_and_notify(task_id)
+        evicted.append(task_id)
+        over_tasks -= 1
+    while policy.max_upload_bytes and blobs.total_bytes > policy.max_upload_bytes:
+        # 超出磁盘上限时只淘汰删除后确实能释放文件的已结束任务，没有这样的任务就停止
+        task_id = next((task_id for task_id in finished_order
+                        if releasable_bytes(tasks[task_id]) > 0), None)
+        if task_id is None:
+            break
+        await delete_and_notify(task_id)
+        evicted.append(task_id)
+
+    report = {"expired": len(expired), "evicted": len(evicted), "orphan_blobs": orphans,
+              "bytes_freed": blobs.bytes_freed - freed_before}
+    retention_totals["sweeps"] += 1
+    for key, value in report.items():
+        retention_totals[key] += value
+    if expired or evicted or orphans:
+        logger.info(f"清理完成: 过期 {len(expired)} 个任务, 淘汰 {len(evicted)} 个任务, "
+                    f"回收 {orphans} 个无引用文件, 释放 {report['bytes_freed']} 字节")
+    return report
+
+
+async def retention_sweeper():
+    """后台清理：在最近的过期时间（最长 sweep_interval）醒来执行一次清理"""
+    while True:
+        await asyncio.sleep(retention.next_wakeup(retention_policy, expiry_queue))
+        try:
+            await sweep_retention()
+        except Exception as e:
+            logger.error(f"清理任务出错: {str(e)}")
+
+
+@app.get("/retention")
+async def get_retention():
+    return FastJSONResponse({
+        "policy": retention_policy.describe(),
+        "scheduled": len(expiry_queue),
+        "next_deadline": expiry_queue.next_deadline(),
+        "totals": retention_totals,
+    })
 
 
-@app.get("/tasks/{task_id}/params")
-async def get_task_params(task_id: str):
-    if task_id not in tasks:
-        raise HTTPException(status_code=404, detail="任务不存在")
+@app.post("/retention:sweep")
+async def run_retention_sweep():
+    """立即执行一次清理，返回本次删除的任务数、回收的文件数和释放的字节数"""
+    return FastJSONResponse(await sweep_retention())
 
-    task = tasks[task_id]
-    return {
-        "params": task.params,
-        "file_path": task.params.get("file_path")
-    }
+
+@app.get("/tasks/{task_id}/params")
+async def get_task_params(task_id: str, request: Request):
+    task = get_task_or_404(task_id)
+    cached = not_modified(request, task)
+    if cached is not None:
+        return cached
+    body = encode_view(task, "params")
+    return codec.json_response(body, headers={"ETag": task_etag(task)})
 
 
 @app.get("/tasks/{task_id}/file")
@@ -474,11 +1513,106 @@ async def get_task_file(task_id: str):
 
     return FileResponse(
         path=file_path,
-        filename=os.path.basename(file_path),
+        filename=task.params.get("original_filename", os.path.basename(file_path)),
         media_type='application/octet-stream'
     )
 
 
+@app.get("/blobs/{digest}")
+async def get_blob(digest: str):
+    """查询服务端是否已有该内容的文件，客户端据此决定是否跳过上传"""
+    if not blobs.exists(digest):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return {"sha256": digest, "size": blobs.size(digest), "refs": blobs.refcount(digest)}
+
+
+@app.post("/blobs")
+async def upload_blob(file: UploadFile = File(...)):
+    """只上传文件不创建任务，之后可以在创建任务时按哈希引用"""
+    digest, size = await blobs.save_upload(file)
+    logger.debug(f"文件已上传: {digest}, {size} 字节")
+    return {"sha256": digest, "size": size}
+
+
+@app.get("/stats")
+async def get_stats():
+    """看板统计：各状态任务数、最近一小时吞吐、排队时长和运行时长分位数"""
+    return FastJSONResponse(task_stats.snapshot())
+
+
+@app.get("/memory")
+async def get_memory(top: int = Query(default=20, ge=0, le=MAX_PAGE_SIZE)):
+    """按任务估算的内存占用：总量、各部分合计和占用最多的 top 个任务"""
+    heavy = []
+    for task_id, nbytes in task_memory.top(top):
+        task = tasks[task_id]
+        heavy.append({
+            "task_id": task_id,
+            "status": task.status.value,
+            "bytes": nbytes,
+            **task_memory.usage(task_id),
+            "log_count": len(task.logs),
+            "response_cache": response_cache.task_bytes(task_id),
+        })
+    return FastJSONResponse({
+        **task_memory.stats(),
+        "response_cache_bytes": response_cache.size,
+        "top": heavy
+    })
+
+
+@app.websocket("/ws/stats")
+async def stats_endpoint(websocket: WebSocket):
+    """推送看板统计：连接后立即发送一次，之后统计变化时最多每 STATS_PUSH_INTERVAL 秒发送一次"""
+    await websocket.accept()
+    version = None
+    try:
+        while True:
+            if drain_state.draining:
+                await websocket.close(code=drain.GOING_AWAY_CODE, reason="服务正在重启")
+                break
+            if task_stats.version != version:
+                version = task_stats.version
+                await websocket.send_text(codec.dumps_text({"type": "stats", "stats": task_stats.snapshot()}))
+            try:
+                message = await asyncio.wait_for(websocket.receive(), STATS_PUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                continue
+            if message["type"] == "websocket.disconnect":
+                break
+    except WebSocketDisconnect:
+        pass
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return FastJSONResponse({
+        "tasks": task_order.stats(),
+        "retention": retention_totals,
+        "ingest": ingest.stats(),
+        "response_cache": response_cache.stats(),
+        "log_feeds": log_feeds.stats(),
+        "log_index": log_index.stats(),
+        "time_index": time_index.stats(),
+        "task_indexes": task_indexes.stats(),
+        "blobs": blobs.stats(),
+        "memory": task_memory.stats()
+    })
+
+
+async def drain_connections(timeout: float):
+    """停机排空：通知日志流连接续传位置并等待它们结束"""
+    logger.info(f"开始排空: {drain_state.active} 个日志流连接")
+    drain_state.begin()
+    remaining = await drain_state.wait_streams(timeout)
+    if remaining:
+        logger.warning(f"排空超时，仍有 {remaining} 个日志流连接")
+    else:
+        logger.info("日志流连接已全部结束")
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    config = uvicorn.Config(app, host="0.0.0.0", port=8000,
+                            ws=compression.websocket_protocol())
+    drain.DrainingServer(config, drain_connections).run()
@@ -0,0 +1,87 @@
+"""
+按任务估算的内存占用
+
+各部分在写入时增量更新，查询总量是O(1)，取占用最多的K个任务是O(n log K)：
+- logs    追加日志时累加：每行内容和时间字符串的大小加上固定开销（TaskLog对象、列表槽位和日志索引条目）
+- params/result  对象被替换时按JSON编码长度乘以系数估算；只改状态等字段时不重新计算
+- pending 按容量模式（head_tail）暂存、尚未写入日志的最近日志
+估算值用于比较任务之间的相对占用，不是精确的进程内存。
+"""
+import heapq
+import sys
+from typing import Any, Dict, Iterable, List, Tuple
+
+import codec
+
+COMPONENTS = ("logs", "params", "result", "pending")
+# 每行日志除字符串外的开销（字节），按 tracemalloc 实测取整
+LOG_OVERHEAD = 500
+# 解析后的Python对象约为JSON编码长度的倍数
+DOCUMENT_FACTOR = 4
+
+
+def log_bytes(logs: Iterable) -> int:
+    return sum(sys.getsizeof(log.content) + sys.getsizeof(log.timestamp) + LOG_OVERHEAD
+               for log in logs)
+
+
+def document_bytes(value: Any) -> int:
+    return 0 if value is None else len(codec.dumps(value)) * DOCUMENT_FACTOR
+
+
+class MemoryAccounting:
+    def __init__(self):
+        # task_id -> 各部分字节数
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._task_totals: Dict[str, int] = {}
+        self.totals: Dict[str, int] = dict.fromkeys(COMPONENTS, 0)
+        # 上次估算时的 params/result 对象，对象没有替换时跳过重新估算
+        self._documents: Dict[str, Tuple[Any, Any]] = {}
+
+    def add(self, task_id: str, component: str, delta: int):
+        if not delta:
+            return
+        usage = self._usage.get(task_id)
+        if usage is None:
+            usage = self._usage[task_id] = dict.fromkeys(COMPONENTS, 0)
+            self._task_totals[task_id] = 0
+        usage[component] += delta
+        self._task_totals[task_id] += delta
+        self.totals[component] += delta
+
+    def set(self, task_id: str, component: str, nbytes: int):
+        current = self._usage.get(task_id)
+        self.add(task_id, component, nbytes - (current[component] if current else 0))
+
+    def measure_documents(self, task_id: str, params: Any, result: Any):
+        previous = self._documents.get(task_id)
+        if previous is None or previous[0] is not params:
+            self.set(task_id, "params", document_bytes(params))
+        if previous is None or previous[1] is not result:
+            self.set(task_id, "result", document_bytes(result))
+        self._documents[task_id] = (params, result)
+
+    def remove(self, task_id: str):
+        usage = self._usage.pop(task_id, None)
+        self._task_totals.pop(task_id, None)
+        self._documents.pop(task_id, None)
+        if usage is not None:
+            for component, nbytes in usage.items():
+                self.totals[component] -= nbytes
+
+    def task_bytes(self, task_id: str) -> int:
+        return self._task_totals.get(task_id, 0)
+
+    def usage(self, task_id: str) -> Dict[str, int]:
+        return dict(self._usage.get(task_id) or dict.fromkeys(COMPONENTS, 0))
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        """占用最多的K个任务，返回 [(task_id, 字节数)]"""
+        return heapq.nlargest(k, self._task_totals.items(), key=lambda item: item[1])
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self.totals.values())
+
+    def stats(self) -> dict:
+        return {"tasks": len(self._usage), "total_bytes": self.total_bytes, **self.totals}
@@ -0,0 +1,209 @@
+"""
+任务字段二级索引
+
+每个索引对应一个字段：任务状态 "status"，或参数路径如 "params.type"、"params.parameters.batch_size"。
+索引同时维护 值 -> task_id集合 的哈希表（等值查询）和按值排序的列表（范围查询），
+任务创建、变更和删除时增量更新，查询时按候选集从小到大求交，不扫描全部任务。
+只有标量值（字符串、数字、布尔）进入索引。
+"""
+import os
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from schemas import Task
+
+# 默认建立索引的字段，逗号分隔
+DEFAULT_INDEXES = [field.strip() for field in os.environ.get(
+    "TASK_INDEXES", "status,params.type,params.priority").split(",") if field.strip()]
+
+_MISSING = object()
+SortKey = Tuple[int, Any]
+
+
+def field_value(task: Task, field: str) -> Any:
+    """读取任务的字段值，路径不存在时返回 _MISSING"""
+    if field == "status":
+        return task.status.value
+    if not field.startswith("params."):
+        return _MISSING
+    value: Any = task.params
+    for part in field[len("params."):].split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def sort_key(value: Any) -> Optional[SortKey]:
+    """把标量值映射为可比较的键，不同类型之间互不比较；非标量返回None"""
+    if isinstance(value, bool):
+        return (0, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    return None
+
+
+def valid_field(field: str) -> bool:
+    return field == "status" or (field.startswith("params.") and len(field) > len("params."))
+
+
+class FieldIndex:
+    def __init__(self, field: str):
+        self.field = field
+        self._by_value: Dict[SortKey, Set[str]] = {}
+        self._sorted: List[Tuple[SortKey, str]] = []
+        # task_id -> 当前索引的键，用于更新时删除旧值
+        self._keys: Dict[str, SortKey] = {}
+
+    def add(self, task: Task):
+        key = sort_key(field_value(task, self.field))
+        old = self._keys.get(task.id)
+        if old == key:
+            return
+        if old is not None:
+            self.remove(task.id)
+        if key is None:
+            return
+        self._keys[task.id] = key
+        self._by_value.setdefault(key, set()).add(task.id)
+        insort(self._sorted, (key, task.id))
+
+    def remove(self, task_id: str):
+        key = self._keys.pop(task_id, None)
+        if key is None:
+            return
+        ids = self._by_value[key]
+        ids.discard(task_id)
+        if not ids:
+            del self._by_value[key]
+        position = bisect_left(self._sorted, (key, task_id))
+        if position < len(self._sorted) and self._sorted[position] == (key, task_id):
+            del self._sorted[position]
+
+    def key_of(self, task_id: str) -> Optional[SortKey]:
+        return self._keys.get(task_id)
+
+    def equal(self, value: Any) -> Set[str]:
+        key = sort_key(value)
+        return set(self._by_value.get(key, ())) if key is not None else set()
+
+    def range(self, low: Optional[SortKey], high: Optional[SortKey],
+              include_low: bool = True, include_high: bool = True) -> Set[str]:
+        """范围查询，low/high 必须是同一类型的键"""
+        rank = (low or high)[0]
+        position = bisect_left(self._sorted, (low,) if low is not None else ((rank,),))
+        result = set()
+        entries = self._sorted
+        for position in range(position, len(entries)):
+            key, task_id = entries[position]
+            if key[0] != rank:
+                break
+            if low is not None and key == low and not include_low:
+                continue
+            if high is not None and (key > high or (key == high and not include_high)):
+                break
+            result.add(task_id)
+        return result
+
+    def counts(self) -> List[Tuple[Any, int]]:
+        return [(key[1], len(ids)) for key, ids in self._by_value.items()]
+
+    def stats(self) -> dict:
+        return {"values": len(self._by_value), "tasks": len(self._keys)}
+
+
+class TaskIndexes:
+    """按字段管理的二级索引集合"""
+
+    def __init__(self, fields: Iterable[str] = ()):
+        self._indexes: Dict[str, FieldIndex] = {}
+        for field in fields:
+            self._indexes[field] = FieldIndex(field)
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self._indexes)
+
+    def declare(self, field: str, tasks: Iterable[Task]) -> bool:
+        """新建索引并用现有任务填充，已存在时返回False"""
+        if not valid_field(field):
+            raise ValueError(f"不支持的索引字段: {field}")
+        if field in self._indexes:
+            return False
+        index = FieldIndex(field)
+        for task in tasks:
+            index.add(task)
+        self._indexes[field] = index
+        return True
+
+    def add(self, task: Task):
+        """任务创建或变更后更新所有索引"""
+        for index in self._indexes.values():
+            index.add(task)
+
+    def remove(self, task_id: str):
+        for index in self._indexes.values():
+            index.remove(task_id)
+
+    def _index(self, field: str) -> FieldIndex:
+        index = self._indexes.get(field)
+        if index is None:
+            raise ValueError(f"字段未建立索引: {field}")
+        return index
+
+    def match(self, field: str, op: str, value: Any) -> Set[str]:
+        index = self._index(field)
+        if op == "eq":
+            return index.equal(value)
+        if op == "in":
+            if not isinstance(value, list):
+                raise ValueError("in 条件的值必须是数组")
+            result = set()
+            for item in value:
+                result |= index.equal(item)
+            return result
+        key = sort_key(value)
+        if key is None:
+            raise ValueError(f"范围条件的值必须是标量: {field}")
+        if op == "gt":
+            return index.range(key, None, include_low=False)
+        if op == "gte":
+            return index.range(key, None)
+        if op == "lt":
+            return index.range(None, key, include_high=False)
+        if op == "lte":
+            return index.range(None, key)
+        raise ValueError(f"不支持的条件: {op}")
+
+    def query(self, predicates: List[Tuple[str, str, Any]],
+              all_ids: Iterable[str]) -> Set[str]:
+        """返回满足全部条件的task_id；没有条件时返回全部任务"""
+        if not predicates:
+            return set(all_ids)
+        matches = sorted((self.match(*predicate) for predicate in predicates), key=len)
+        result = matches[0]
+        for ids in matches[1:]:
+            if not result:
+                break
+            result = result & ids
+        return result
+
+    def group_counts(self, field: str, task_ids: Optional[Set[str]] = None) -> List[dict]:
+        """按字段值统计任务数，task_ids 为None时直接使用索引中的计数"""
+        index = self._index(field)
+        if task_ids is None:
+            counts = index.counts()
+        else:
+            grouped: Dict[SortKey, int] = {}
+            for task_id in task_ids:
+                key = index.key_of(task_id)
+                if key is not None:
+                    grouped[key] = grouped.get(key, 0) + 1
+            counts = [(key[1], count) for key, count in grouped.items()]
+        counts.sort(key=lambda item: -item[1])
+        return [{"value": value, "count": count} for value, count in counts]
+
+    def stats(self) -> dict:
+        return {field: index.stats() for field, index in self._indexes.items()}
@@ -0,0 +1,53 @@
+"""
+任务结果的局部读取
+
+按 JSON Pointer（RFC 6901，如 /output/summary）定位结果中的一个节点，数组节点可按 offset/limit 分页。
+结果提交时已解析为对象保存，读取时沿路径逐层查找，只序列化选中的节点或数组切片，
+耗时与返回内容的大小有关，与整个结果的大小无关。
+"""
+from typing import Any, List, Optional, Tuple
+
+
+class PointerError(ValueError):
+    """路径格式错误，或分页的目标不是数组"""
+
+
+def parse(pointer: str) -> List[str]:
+    """把路径拆成各级的键，"" 表示整个文档"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PointerError(f"路径必须以 / 开头: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _array_index(token: str, size: int) -> int:
+    if not token.isdigit() or (len(token) > 1 and token[0] == "0"):
+        raise PointerError(f"无效的数组下标: {token}")
+    index = int(token)
+    if index >= size:
+        raise KeyError(token)
+    return index
+
+
+def resolve(document: Any, pointer: str) -> Any:
+    """返回路径指向的节点，路径不存在时抛出KeyError"""
+    node = document
+    for token in parse(pointer):
+        if isinstance(node, dict):
+            if token not in node:
+                raise KeyError(token)
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_array_index(token, len(node))]
+        else:
+            raise KeyError(token)
+    return node
+
+
+def page(node: Any, offset: int, limit: Optional[int]) -> Tuple[list, int]:
+    """返回数组节点从 offset 开始的至多 limit 个元素和数组总长度"""
+    if not isinstance(node, list):
+        raise PointerError("只能对数组分页")
+    end = len(node) if limit is None else offset + limit
+    return node[offset:end], len(node)
@@ -0,0 +1,141 @@
+"""
+任务保留策略
+
+- TASK_TTL: 各状态的最长保留时间，如 "completed=7d,failed=30d"，从任务最后一次变更开始计算，未配置的状态永久保留
+- MAX_TASKS: 任务总数上限，超出时从最早的已结束任务开始删除
+- MAX_UPLOAD_BYTES: 上传文件总字节数上限，超出时从最早的、删除后能释放文件的已结束任务开始删除
+- ORPHAN_BLOB_GRACE: 没有任务引用的文件（如只上传未创建任务、导入失败）保留多久后删除
+- SWEEP_INTERVAL: 后台清理的最长间隔
+
+过期时间放在最小堆中，清理时只弹出已到期的条目，不扫描全部任务；
+任务变更后旧条目留在堆里，弹出时与当前过期时间比对后丢弃。
+"""
+import heapq
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from schemas import TaskStatus
+
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> float:
+    """解析 "90"、"30m"、"7d" 形式的时长（秒）"""
+    value = value.strip().lower()
+    if not value:
+        raise ValueError("时长为空")
+    unit = DURATION_UNITS.get(value[-1])
+    number = value[:-1] if unit else value
+    seconds = float(number) * (unit or 1)
+    if seconds < 0:
+        raise ValueError(f"时长不能为负数: {value}")
+    return seconds
+
+
+def parse_ttl(spec: str) -> Dict[str, float]:
+    """解析 "completed=7d,failed=30d"，时长为0表示永久保留，状态名须为已有的任务状态"""
+    statuses = {status.value for status in TaskStatus}
+    ttl = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        status, _, duration = item.partition("=")
+        status = status.strip().lower()
+        if status not in statuses:
+            raise ValueError(f"未知的任务状态: {status}")
+        seconds = parse_duration(duration)
+        if seconds > 0:
+            ttl[status] = seconds
+    return ttl
+
+
+class RetentionPolicy:
+    def __init__(self, ttl: Optional[Dict[str, float]] = None, max_tasks: int = 0,
+                 max_upload_bytes: int = 0, orphan_grace: float = 3600,
+                 sweep_interval: float = 30):
+        self.ttl = ttl or {}
+        self.max_tasks = max_tasks
+        self.max_upload_bytes = max_upload_bytes
+        self.orphan_grace = orphan_grace
+        self.sweep_interval = sweep_interval
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            ttl=parse_ttl(os.environ.get("TASK_TTL", "")),
+            max_tasks=int(os.environ.get("MAX_TASKS", 0)),
+            max_upload_bytes=int(os.environ.get("MAX_UPLOAD_BYTES", 0)),
+            orphan_grace=parse_duration(os.environ.get("ORPHAN_BLOB_GRACE", "1h")),
+            sweep_interval=parse_duration(os.environ.get("SWEEP_INTERVAL", "30s")),
+        )
+
+    def deadline(self, status: str, updated_at: float) -> Optional[float]:
+        ttl = self.ttl.get(status)
+        return updated_at + ttl if ttl else None
+
+    def describe(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "max_tasks": self.max_tasks,
+            "max_upload_bytes": self.max_upload_bytes,
+            "orphan_grace": self.orphan_grace,
+            "sweep_interval": self.sweep_interval,
+        }
+
+
+class ExpiryQueue:
+    """task_id 按过期时间排列的最小堆，支持重新设置和取消"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def schedule(self, task_id: str, deadline: Optional[float]):
+        if deadline is None:
+            self.cancel(task_id)
+            return
+        if self._deadlines.get(task_id) == deadline:
+            return
+        self._deadlines[task_id] = deadline
+        heapq.heappush(self._heap, (deadline, task_id))
+        # 失效条目过多时重建，堆的大小与任务数同阶
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, t) for t, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def deadline(self, task_id: str) -> Optional[float]:
+        return self._deadlines.get(task_id)
+
+    def cancel(self, task_id: str):
+        self._deadlines.pop(task_id, None)
+
+    def _drop_stale(self):
+        heap = self._heap
+        while heap and self._deadlines.get(heap[0][1]) != heap[0][0]:
+            heapq.heappop(heap)
+
+    def next_deadline(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_expired(self, now: float) -> List[str]:
+        expired = []
+        while True:
+            self._drop_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return expired
+            _, task_id = heapq.heappop(self._heap)
+            del self._deadlines[task_id]
+            expired.append(task_id)
+
+
+def next_wakeup(policy: RetentionPolicy, queue: ExpiryQueue, now: Optional[float] = None) -> float:
+    """距离下次清理的秒数：最近的过期时间，但不超过 sweep_interval"""
+    now = time.time() if now is None else now
+    deadline = queue.next_deadline()
+    delay = policy.sweep_interval if deadline is None else min(policy.sweep_interval, deadline - now)
+    return max(delay, 0.0)
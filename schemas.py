@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
 from datetime import datetime
-from typing import Optional, Any, List, Dict
+from typing import Optional, Any, List, Dict, Literal
 from enum import Enum
 
 
@@ -73,6 +73,7 @@ class TaskUpdate(BaseModel):
 class Task(TaskBase):
     """任务模型"""
     id: str = Field(..., description="任务ID")
+    version: int = Field(default=1, description="任务版本号，参数、状态、日志或结果变更时递增")
     created_at: datetime = Field(
         default_factory=datetime.now, description="创建时间")
     updated_at: datetime = Field(
@@ -82,6 +83,7 @@ class Task(TaskBase):
         json_schema_extra={
             "example": {
                 "id": "1",
+                "version": 1,
                 "params": {
                     "name": "测试任务",
                     "description": "这是一个测试任务",
@@ -101,3 +103,91 @@ class Task(TaskBase):
             }
         }
     )
+
+
+# 单个批量请求最多包含的任务数
+MAX_BATCH_SIZE = 1000
+
+
+class TaskBatchItem(BaseModel):
+    """批量创建中的单个任务"""
+    params: Dict = Field(default_factory=dict, description="任务参数")
+    file_sha256: Optional[str] = Field(default=None, description="引用已上传文件的SHA-256")
+    file_name: Optional[str] = Field(default=None, description="引用文件时使用的原始文件名")
+
+
+class TaskBatchCreate(BaseModel):
+    """批量创建任务请求"""
+    tasks: List[TaskBatchItem] = Field(..., max_length=MAX_BATCH_SIZE,
+                                       description="待创建的任务列表")
+
+
+class TaskBatchGet(BaseModel):
+    """按ID批量获取任务请求"""
+    ids: List[str] = Field(..., max_length=MAX_BATCH_SIZE, description="任务ID列表")
+    view: Literal["task", "result", "logs", "params"] = Field(
+        default="task", description="返回的视图：完整任务、结果、日志或参数")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "ids": ["1", "2", "3"],
+                "view": "result"
+            }
+        }
+    )
+
+
+class TaskQueryPredicate(BaseModel):
+    """任务查询条件，field 必须是已建立索引的字段"""
+    field: str = Field(..., description="字段：status 或 params.<路径>")
+    op: Literal["eq", "in", "lt", "lte", "gt", "gte"] = Field(default="eq", description="比较方式")
+    value: Any = Field(..., description="比较值，in 条件为数组")
+
+
+class TaskQuery(BaseModel):
+    """基于二级索引的任务查询请求"""
+    where: List[TaskQueryPredicate] = Field(default_factory=list, description="全部满足的条件")
+    limit: int = Field(default=100, ge=0, le=MAX_BATCH_SIZE, description="最多返回的任务数")
+    view: Literal["task", "id"] = Field(default="task", description="返回完整任务或只返回ID")
+    group_by: Optional[str] = Field(default=None, description="按该索引字段统计命中任务数")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "where": [
+                    {"field": "status", "value": "running"},
+                    {"field": "params.type", "value": "data_processing"},
+                    {"field": "params.priority", "op": "in", "value": ["high", "urgent"]}
+                ],
+                "limit": 100,
+                "group_by": "params.priority"
+            }
+        }
+    )
+
+
+class TaskBulkUpdate(BaseModel):
+    """批量更新任务状态请求，ids 和 where 二选一"""
+    ids: Optional[List[str]] = Field(default=None, max_length=MAX_BATCH_SIZE, description="任务ID列表")
+    where: Optional[List[TaskQueryPredicate]] = Field(
+        default=None, min_length=1,
+        description="按索引字段选择任务，条件与 /tasks:query 相同；不能为空，避免误改全部任务")
+    status: TaskStatus = Field(..., description="新状态")
+
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "where": [
+                    {"field": "status", "value": "failed"},
+                    {"field": "params.type", "value": "data_processing"}
+                ],
+                "status": "pending"
+            }
+        }
+    )
+
+
+class TaskIndexCreate(BaseModel):
+    """声明二级索引"""
+    field: str = Field(..., description="字段：status 或 params.<路径>，如 params.parameters.batch_size")
@@ -0,0 +1,769 @@
+"""
+任务管理器 Python SDK
+
+AsyncTaskClient 基于 httpx.AsyncClient，所有请求复用同一个连接池（keep-alive），
+覆盖 main.py 中的全部 REST 和 WebSocket 接口；TaskClient 是它的同步外观。
+
+    async with AsyncTaskClient("http://localhost:8000") as client:
+        task = await client.create_task({"name": "demo"}, file_path="input.csv")
+        await client.download_result_file(task["id"], "result.bin")
+
+    with TaskClient("http://localhost:8000") as client:
+        client.get_result("1")
+"""
+import asyncio
+import hashlib
+import inspect
+import json
+import os
+import random
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional
+
+import httpx
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+DEFAULT_BASE_URL = "http://localhost:8000"
+# 可重试的限流和网关类错误
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# 幂等的方法在任何传输错误和网关错误后都可以重发
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE"}
+# 请求尚未发出的连接阶段错误，非幂等请求也可以安全重发
+CONNECT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+CHUNK_SIZE = 64 * 1024
+# 服务端主动拒绝（策略违规、不支持的数据）时不再重连
+FATAL_CLOSE_CODES = {1003, 1008}
+# 与服务端 schemas.MAX_BATCH_SIZE 保持一致
+BATCH_SIZE = 1000
+# 分页列出任务时每页的数量
+PAGE_SIZE = 500
+
+
+class TaskClientError(Exception):
+    """服务端返回错误状态码"""
+
+    def __init__(self, status_code: int, detail: Any):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+def _ws_url(base_url: str) -> str:
+    if base_url.startswith("https://"):
+        return "wss://" + base_url[len("https://"):]
+    if base_url.startswith("http://"):
+        return "ws://" + base_url[len("http://"):]
+    return base_url
+
+
+def _raise_for_status(response: httpx.Response):
+    if response.status_code < 400:
+        return
+    try:
+        detail = response.json().get("detail")
+    except Exception:
+        detail = response.text
+    raise TaskClientError(response.status_code, detail)
+
+
+class AsyncTaskClient:
+    def __init__(
+        self,
+        base_url: str = DEFAULT_BASE_URL,
+        ws_url: Optional[str] = None,
+        *,
+        timeout: float = 30.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        retries: int = 3,
+        backoff: float = 0.5,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.ws_url = (ws_url or _ws_url(self.base_url)).rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_keepalive_connections),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str,
+                       make_kwargs: Optional[Callable[[], dict]] = None,
+                       idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """发送请求，连接错误和网关错误按指数退避重试，限流时按 Retry-After 等待
+
+        非幂等请求（POST）可能已被服务端处理，只在连接阶段失败和限流时重试，
+        避免读超时或网关错误后重复创建任务；idempotent 可覆盖按方法的判断。
+        上传文件时通过 make_kwargs 在每次尝试中重新打开文件，保证重试时从头发送。
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_statuses = RETRY_STATUS_CODES if idempotent else {429}
+        retry_errors = httpx.TransportError if idempotent else CONNECT_ERRORS
+        for attempt in range(self.retries + 1):
+            files = []
+            retry_after = None
+            try:
+                request_kwargs = dict(kwargs)
+                if make_kwargs is not None:
+                    extra = make_kwargs()
+                    files = [f for _, (_, f) in extra.get("files", {}).items()]
+                    request_kwargs.update(extra)
+                response = await self._http.request(method, path, **request_kwargs)
+                if response.status_code not in retry_statuses or attempt == self.retries:
+                    _raise_for_status(response)
+                    return response
+                retry_after = response.headers.get("Retry-After")
+            except retry_errors:
+                if attempt == self.retries:
+                    raise
+            finally:
+                for f in files:
+                    f.close()
+            delay = self.backoff * (2 ** attempt)
+            if retry_after is not None and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            await asyncio.sleep(delay + random.uniform(0, delay / 10))
+
+    async def _download(self, path: str, output_path: str, params: Optional[dict] = None,
+                        compressed: bool = False) -> str:
+        """流式下载到文件，不在内存中缓存整个响应
+
+        compressed 为True时要求服务端gzip压缩并原样保存压缩后的字节。
+        """
+        headers = {"Accept-Encoding": "gzip"} if compressed else None
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._http.stream("GET", path, params=params, headers=headers) as response:
+                    if response.status_code >= 400:
+                        await response.aread()
+                        _raise_for_status(response)
+                    chunks = response.aiter_raw(CHUNK_SIZE) if compressed \
+                        else response.aiter_bytes(CHUNK_SIZE)
+                    with open(output_path, "wb") as f:
+                        async for chunk in chunks:
+                            f.write(chunk)
+                return output_path
+            except httpx.TransportError:
+                if attempt == self.retries:
+                    raise
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    @staticmethod
+    def _file_kwargs(file_path: Optional[str]) -> Callable[[], dict]:
+        def make_kwargs():
+            if not file_path:
+                return {}
+            return {"files": {"file": (os.path.basename(file_path), open(file_path, "rb"))}}
+        return make_kwargs
+
+    # 任务
+
+    async def list_tasks(self, limit: Optional[int] = None, order: str = "asc") -> List[dict]:
+        """列出任务；order="desc" 配合 limit 取最新的任务"""
+        params = {"order": order}
+        if limit is not None:
+            params["limit"] = limit
+        return (await self._request("GET", "/tasks", params=params)).json()
+
+    async def iter_tasks(self, order: str = "asc", page_size: int = PAGE_SIZE) -> AsyncIterator[dict]:
+        """按游标分页遍历全部任务，遍历期间新建或删除的任务不会导致重复或遗漏已有任务"""
+        params = {"order": order, "limit": page_size}
+        while True:
+            response = await self._request("GET", "/tasks", params=params)
+            for task in response.json():
+                yield task
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return
+            params["cursor"] = cursor
+
+    async def create_task(self, params: dict, file_path: Optional[str] = None,
+                          dedupe: bool = True) -> dict:
+        """创建任务；dedupe 为True时先按文件哈希查询，服务端已有相同内容则不再上传"""
+        data = {"params": json.dumps(params, ensure_ascii=False)}
+        if file_path and dedupe:
+            digest = await asyncio.to_thread(_file_sha256, file_path)
+            if await self.get_blob(digest) is not None:
+                try:
+                    response = await self._request("POST", "/tasks", data={
+                        **data, "file_sha256": digest, "file_name": os.path.basename(file_path)})
+                    return response.json()
+                except TaskClientError as e:
+                    # 查询之后文件被清理，退回到正常上传
+                    if e.status_code != 404:
+                        raise
+        response = await self._request("POST", "/tasks", self._file_kwargs(file_path), data=data)
+        return response.json()
+
+    async def create_tasks(self, params_list: List[dict],
+                           file_refs: Optional[List[Optional[tuple[str, str]]]] = None) -> List[dict]:
+        """批量创建任务，超过单批上限时自动分批
+
+        file_refs 与 params_list 一一对应，元素为 (文件SHA-256, 文件名) 或None，
+        引用的文件须已上传（见 ensure_blob）。
+        """
+        items = []
+        for i, params in enumerate(params_list):
+            item = {"params": params}
+            ref = file_refs[i] if file_refs else None
+            if ref:
+                item["file_sha256"], item["file_name"] = ref
+            items.append(item)
+        created = []
+        for chunk in _chunks(items, BATCH_SIZE):
+            response = await self._request("POST", "/tasks:batch", json={"tasks": chunk})
+            created.extend(response.json()["tasks"])
+        return created
+
+    async def bulk_update(self, status: str, ids: Optional[List[str]] = None,
+                          where: Optional[List[dict]] = None) -> dict:
+        """批量修改任务状态，ids 超过单批上限时自动分批，返回合并后的 {"matched", "updated", "ids"}"""
+        if where is not None:
+            return (await self._request("POST", "/tasks:bulkUpdate", json={
+                "where": where, "status": status})).json()
+        report = {"matched": 0, "updated": 0, "ids": []}
+        for chunk in _chunks(ids or [], BATCH_SIZE):
+            data = (await self._request("POST", "/tasks:bulkUpdate", json={
+                "ids": chunk, "status": status})).json()
+            report["matched"] += data["matched"]
+            report["updated"] += data["updated"]
+            report["ids"].extend(data["ids"])
+        return report
+
+    async def batch_get(self, task_ids: List[str], view: str = "task") -> tuple[Dict[str, Any], List[str]]:
+        """按ID批量获取任务视图，返回 (id到视图的映射, 不存在的ID)"""
+        items, missing = {}, []
+        for chunk in _chunks(task_ids, BATCH_SIZE):
+            data = (await self._request(
+                "POST", "/tasks:batchGet", json={"ids": chunk, "view": view})).json()
+            items.update(data["items"])
+            missing.extend(data["missing"])
+        return items, missing
+
+    async def get_task(self, task_id: str) -> dict:
+        return (await self._request("GET", f"/tasks/{task_id}")).json()
+
+    async def update_task(self, task_id: str, *, status: Optional[str] = None,
+                          params: Optional[dict] = None, result: Optional[dict] = None,
+                          if_match: Optional[str] = None) -> dict:
+        body = {k: v for k, v in {"status": status, "params": params,
+                                  "result": result}.items() if v is not None}
+        headers = {"If-Match": if_match} if if_match else None
+        response = await self._request("PUT", f"/tasks/{task_id}", json=body, headers=headers)
+        return response.json()
+
+    async def delete_task(self, task_id: str) -> dict:
+        return (await self._request("DELETE", f"/tasks/{task_id}")).json()
+
+    async def get_params(self, task_id: str) -> dict:
+        return (await self._request("GET", f"/tasks/{task_id}/params")).json()
+
+    async def download_file(self, task_id: str, output_path: str) -> str:
+        return await self._download(f"/tasks/{task_id}/file", output_path)
+
+    # 文件存储
+
+    async def get_blob(self, digest: str) -> Optional[dict]:
+        """查询服务端是否已有该SHA-256的文件，没有时返回None"""
+        try:
+            return (await self._request("GET", f"/blobs/{digest}")).json()
+        except TaskClientError as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    async def upload_blob(self, file_path: str) -> dict:
+        """只上传文件，返回 {"sha256", "size"}，之后可按哈希创建任务"""
+        # 文件按内容寻址去重，重复上传不会产生副作用
+        return (await self._request("POST", "/blobs", self._file_kwargs(file_path),
+                                    idempotent=True)).json()
+
+    async def ensure_blob(self, file_path: str) -> str:
+        """确保服务端有该文件，已有相同内容时不再上传，返回SHA-256"""
+        digest = await asyncio.to_thread(_file_sha256, file_path)
+        if await self.get_blob(digest) is None:
+            digest = (await self.upload_blob(file_path))["sha256"]
+        return digest
+
+    # 结果
+
+    async def submit_result(self, task_id: str, result: dict,
+                            file_path: Optional[str] = None) -> dict:
+        response = await self._request(
+            "POST", f"/tasks/{task_id}/result", self._file_kwargs(file_path),
+            data={"result_params": json.dumps(result, ensure_ascii=False)})
+        return response.json()
+
+    async def get_result(self, task_id: str, pointer: Optional[str] = None) -> Any:
+        """获取任务结果；pointer 为 JSON Pointer（如 "/output/summary"）时只取该节点"""
+        params = {"pointer": pointer} if pointer else None
+        return (await self._request("GET", f"/tasks/{task_id}/result", params=params)).json()
+
+    async def iter_result_items(self, task_id: str, pointer: str,
+                                page_size: int = PAGE_SIZE) -> AsyncIterator[Any]:
+        """分页遍历结果中 pointer 指向的数组，不一次加载整个结果"""
+        params = {"pointer": pointer, "offset": 0, "limit": page_size}
+        while True:
+            response = await self._request("GET", f"/tasks/{task_id}/result", params=params)
+            for item in response.json():
+                yield item
+            next_offset = response.headers.get("X-Next-Offset")
+            if not next_offset:
+                return
+            params["offset"] = int(next_offset)
+
+    async def download_result_file(self, task_id: str, output_path: str) -> str:
+        return await self._download(f"/tasks/{task_id}/result/file", output_path)
+
+    # 日志
+
+    async def add_log(self, task_id: str, content: str, level: str = "info",
+                      timestamp: Optional[str] = None) -> dict:
+        log = {"content": content, "level": level,
+               "timestamp": timestamp or datetime.now().isoformat()}
+        return (await self._request("POST", f"/tasks/{task_id}/log", json=log)).json()
+
+    async def get_logs(self, task_id: str, **filters) -> List[dict]:
+        """获取任务日志，filters 为服务端过滤条件（level/contains/regex/since/until/rate）"""
+        params = {k: v for k, v in filters.items() if v is not None}
+        return (await self._request("GET", f"/tasks/{task_id}/logs", params=params)).json()
+
+    async def export_logs(self, task_id: str, output_path: str, format: str = "ndjson",
+                          compressed: bool = False, **params) -> str:
+        """把任务日志流式导出到文件，format 为 ndjson/json/text，params 可带 from_offset/since/until"""
+        params = {k: v for k, v in params.items() if v is not None}
+        params["format"] = format
+        return await self._download(f"/tasks/{task_id}/logs:export", output_path,
+                                    params, compressed)
+
+    async def export_tasks(self, output_path: str, format: str = "ndjson",
+                           compressed: bool = False, status: Optional[List[str]] = None) -> str:
+        """把任务列表流式导出到文件，可按状态过滤"""
+        params = {"format": format}
+        if status:
+            params["status"] = status
+        return await self._download("/tasks:export", output_path, params, compressed)
+
+    async def export_bundle(self, output_path: str, ids: Optional[List[str]] = None,
+                            status: Optional[List[str]] = None, compression: str = "gzip") -> str:
+        """把任务打包导出为tar归档（含参数、文件、结果和日志）"""
+        params: Dict[str, Any] = {"compression": compression}
+        if ids:
+            params["ids"] = ids
+        if status:
+            params["status"] = status
+        return await self._download("/tasks:bundle", output_path, params)
+
+    async def import_bundle(self, bundle_path: str) -> dict:
+        """流式上传归档并导入，返回 {"count", "tasks": [{"source_id", "id"}]}"""
+        def make_kwargs():
+            return {"content": _read_file_chunks(bundle_path)}
+        response = await self._request(
+            "POST", "/tasks:import", make_kwargs,
+            headers={"Content-Type": "application/octet-stream"})
+        return response.json()
+
+    async def metrics(self) -> dict:
+        return (await self._request("GET", "/metrics")).json()
+
+    async def memory(self, top: int = 20) -> dict:
+        """按任务估算的内存占用和占用最多的 top 个任务"""
+        return (await self._request("GET", "/memory", params={"top": top})).json()
+
+    # WebSocket
+
+    async def send_logs(self, task_id: str, lines: AsyncIterable[str] | Iterable[str],
+                        protocol: str = "text", **options) -> int:
+        """通过 /ws/sender 推送日志行，返回发送的行数
+
+        json/msgpack 协议使用 LogStreamSender 批量发送并支持断线续传，
+        options 透传给 LogStreamSender；text 协议每行一帧，断线即失败。
+        """
+        if protocol != "text":
+            return await LogStreamSender(self, task_id, protocol, **options).run(lines)
+
+        import websockets
+
+        sent = 0
+        async with websockets.connect(f"{self.ws_url}/ws/sender") as websocket:
+            await websocket.send(json.dumps({"task_id": task_id, "protocol": protocol}))
+            async for line in _aiter(lines):
+                await websocket.send(line)
+                sent += 1
+        return sent
+
+    async def iter_log_messages(self, task_id: str, from_offset: int = 0,
+                                follow: bool = True, protocol: str = "json",
+                                log_filter: Optional[dict] = None) -> AsyncIterator[dict]:
+        """通过 /ws/receiver 订阅日志，逐帧产出服务端消息
+
+        {"type": "logs", "entries": [...]} 为日志批次，最后一条为
+        {"type": "end", "status": 任务状态, "offset": 下一个偏移}，
+        或服务端重启前的 {"type": "going_away", "offset": 下一个偏移, "retry_after": 建议等待的秒数}。
+        任务变更时还会收到 {"type": "task_updated"/"task_deleted", "task": {...}}，任务不含日志，只给出 log_count。
+        log_filter 为服务端过滤条件，采样丢弃的行以 level 为 SUMMARY 的条目汇报。
+        """
+        import websockets
+
+        async with websockets.connect(f"{self.ws_url}/ws/receiver",
+                                      subprotocols=[f"logs.{protocol}"]) as websocket:
+            init = {"task_id": task_id, "protocol": protocol,
+                    "from_offset": from_offset, "follow": follow}
+            if log_filter:
+                init["filter"] = log_filter
+            await websocket.send(json.dumps(init))
+            try:
+                async for frame in websocket:
+                    message = decode_frame(protocol, frame)
+                    yield message
+                    if message.get("type") in ("end", "going_away"):
+                        return
+            except websockets.exceptions.ConnectionClosedOK:
+                return
+
+    async def stream_logs(self, task_id: str, from_offset: int = 0, follow: bool = True,
+                          protocol: str = "json",
+                          log_filter: Optional[dict] = None) -> AsyncIterator[dict]:
+        """逐条产出日志 {offset, ts, level, content}，服务端重启时等待后从续传位置继续"""
+        while True:
+            going_away = None
+            async for message in self.iter_log_messages(task_id, from_offset, follow, protocol,
+                                                        log_filter):
+                if message.get("type") == "logs":
+                    for entry in message["entries"]:
+                        yield entry
+                elif message.get("type") == "going_away":
+                    going_away = message
+            if going_away is None:
+                return
+            from_offset = going_away["offset"]
+            await asyncio.sleep(going_away.get("retry_after", 0))
+
+
+def encode_frame(protocol: str, message: dict) -> str | bytes:
+    if protocol == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, ensure_ascii=False)
+
+
+class LogStreamSender:
+    """高吞吐日志发送器
+
+    - 日志行按条数、字节数或等待时间（linger）合并成批量帧；
+    - 已读取但未被服务端确认的数据超过 max_buffer_bytes 时暂停读取输入（背压）；
+    - 每行分配递增序号，断线后重连并从服务端确认的序号继续发送，不丢不重。
+    """
+
+    def __init__(self, client: AsyncTaskClient, task_id: str, protocol: str = "msgpack", *,
+                 batch_max_lines: int = 1000, batch_max_bytes: int = 256 * 1024,
+                 linger: float = 0.05, max_buffer_bytes: int = 8 * 1024 * 1024,
+                 max_reconnects: int = 10, reconnect_backoff: float = 0.5,
+                 level: str = "INFO"):
+        if protocol == "msgpack" and msgpack is None:
+            raise RuntimeError("msgpack 帧格式需要安装 msgpack")
+        self.client = client
+        self.task_id = task_id
+        self.protocol = protocol
+        self.batch_max_lines = batch_max_lines
+        self.batch_max_bytes = batch_max_bytes
+        self.linger = linger
+        self.max_buffer_bytes = max_buffer_bytes
+        self.max_reconnects = max_reconnects
+        self.reconnect_backoff = reconnect_backoff
+        self.level = level
+        self.stream_id = uuid.uuid4().hex
+
+        # (seq, 日志条目) ，未发送和已发送待确认分开存放
+        self._unsent: Deque[tuple[int, dict]] = deque()
+        self._unacked: Deque[tuple[int, dict]] = deque()
+        self._buffered_bytes = 0
+        self._unsent_bytes = 0
+        self._next_seq = 0
+        self._acked_seq = 0
+        self._input_done = False
+        self._data_event = asyncio.Event()
+        self._ack_event = asyncio.Event()
+        # 服务端排空时建议的重连等待时间
+        self._retry_after: Optional[float] = None
+
+    async def run(self, lines: AsyncIterable[str] | Iterable[str]) -> int:
+        """发送全部输入并等待服务端确认，返回发送的行数"""
+        import websockets
+
+        producer = asyncio.create_task(self._produce(lines))
+        failures = 0
+        try:
+            while True:
+                try:
+                    await self._session()
+                    break
+                except (OSError, asyncio.TimeoutError,
+                        websockets.exceptions.ConnectionClosed,
+                        websockets.exceptions.InvalidHandshake) as e:
+                    if producer.done() and producer.exception() is not None:
+                        raise producer.exception()
+                    # 任务不存在、帧格式错误等由服务端主动拒绝的情况不重连
+                    if (isinstance(e, websockets.exceptions.ConnectionClosed)
+                            and e.rcvd is not None and e.rcvd.code in FATAL_CLOSE_CODES):
+                        raise
+                    if self._retry_after is not None:
+                        # 服务重启不计入失败次数，按服务端给出的时间重连
+                        delay, self._retry_after = self._retry_after, None
+                        await asyncio.sleep(delay)
+                        continue
+                    failures += 1
+                    if failures > self.max_reconnects:
+                        raise
+                    await asyncio.sleep(self.reconnect_backoff * (2 ** min(failures - 1, 6)))
+            await producer
+        finally:
+            producer.cancel()
+        return self._acked_seq
+
+    async def _produce(self, lines):
+        async for line in _aiter(lines):
+            while self._buffered_bytes >= self.max_buffer_bytes:
+                self._ack_event.clear()
+                await self._ack_event.wait()
+            entry = {"content": line, "level": self.level, "ts": datetime.now().isoformat()}
+            self._unsent.append((self._next_seq, entry))
+            self._next_seq += 1
+            self._buffered_bytes += len(line)
+            self._unsent_bytes += len(line)
+            # 只在有数据可发或凑满一批时唤醒发送循环
+            if len(self._unsent) == 1 or self._batch_full():
+                self._data_event.set()
+        self._input_done = True
+        self._data_event.set()
+
+    async def _session(self):
+        import websockets
+
+        async with websockets.connect(f"{self.client.ws_url}/ws/sender",
+                                      subprotocols=[f"logs.{self.protocol}"]) as websocket:
+            await websocket.send(json.dumps({
+                "task_id": self.task_id, "protocol": self.protocol, "stream_id": self.stream_id}))
+            ready = decode_frame(self.protocol, await websocket.recv())
+            self._resume_from(ready["seq"])
+
+            acks = asyncio.create_task(self._read_acks(websocket))
+            try:
+                while True:
+                    batch = await self._next_batch(acks)
+                    if batch is None:
+                        break
+                    await websocket.send(encode_frame(self.protocol, batch))
+                # 输入结束，等待所有数据被确认
+                while self._acked_seq < self._next_seq:
+                    if acks.done():
+                        await acks
+                        raise websockets.exceptions.ConnectionClosedError(None, None)
+                    self._ack_event.clear()
+                    waiter = asyncio.ensure_future(self._ack_event.wait())
+                    await asyncio.wait([acks, waiter], return_when=asyncio.FIRST_COMPLETED)
+                    waiter.cancel()
+            finally:
+                acks.cancel()
+
+    def _resume_from(self, seq: int):
+        """按服务端已接收的序号丢弃已确认数据，未确认的放回待发送队列"""
+        self._on_ack(seq)
+        while self._unacked:
+            item = self._unacked.pop()
+            self._unsent.appendleft(item)
+            self._unsent_bytes += len(item[1]["content"])
+
+    def _on_ack(self, seq: int):
+        while self._unacked and self._unacked[0][0] < seq:
+            _, entry = self._unacked.popleft()
+            self._buffered_bytes -= len(entry["content"])
+        while self._unsent and self._unsent[0][0] < seq:
+            _, entry = self._unsent.popleft()
+            self._buffered_bytes -= len(entry["content"])
+            self._unsent_bytes -= len(entry["content"])
+        self._acked_seq = max(self._acked_seq, seq)
+        self._ack_event.set()
+
+    async def _read_acks(self, websocket):
+        async for frame in websocket:
+            message = decode_frame(self.protocol, frame)
+            if message.get("type") == "ack":
+                self._on_ack(message["seq"])
+            elif message.get("type") == "going_away":
+                self._on_ack(message["seq"])
+                self._retry_after = message.get("retry_after", 0)
+
+    async def _next_batch(self, acks: asyncio.Task) -> Optional[dict]:
+        """等待下一批数据，凑满或等待超过linger后返回；输入结束且全部发出时返回None"""
+        while not self._unsent:
+            if self._input_done:
+                return None
+            if acks.done():
+                await acks
+                raise ConnectionError("WebSocket连接已关闭")
+            # 空闲时同时等待连接关闭（包括服务排空），以便尽快重连
+            self._data_event.clear()
+            waiter = asyncio.ensure_future(self._data_event.wait())
+            await asyncio.wait([acks, waiter], return_when=asyncio.FIRST_COMPLETED)
+            waiter.cancel()
+
+        deadline = asyncio.get_running_loop().time() + self.linger
+        while not self._input_done and not self._batch_full():
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            self._data_event.clear()
+            try:
+                await asyncio.wait_for(self._data_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
+
+        entries = []
+        size = 0
+        first_seq = self._unsent[0][0]
+        while self._unsent and len(entries) < self.batch_max_lines and size < self.batch_max_bytes:
+            item = self._unsent.popleft()
+            self._unacked.append(item)
+            entries.append(item[1])
+            size += len(item[1]["content"])
+        self._unsent_bytes -= size
+        return {"type": "logs", "seq": first_seq, "entries": entries}
+
+    def _batch_full(self) -> bool:
+        return (len(self._unsent) >= self.batch_max_lines
+                or self._unsent_bytes >= self.batch_max_bytes)
+
+
+def decode_frame(protocol: str, frame: str | bytes) -> dict:
+    if protocol == "msgpack":
+        return msgpack.unpackb(frame, raw=False)
+    return json.loads(frame)
+
+
+def _chunks(items: List, size: int):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+async def run_bounded(items: Iterable, func: Callable, concurrency: int = 16) -> tuple[list, list]:
+    """以有限并发对每个元素执行协程函数
+
+    返回 (成功结果列表, [(元素, 异常)] 失败列表)，单个失败不会中断其他元素。
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results, errors = [], []
+
+    async def run(item):
+        async with semaphore:
+            try:
+                results.append(await func(item))
+            except Exception as e:
+                errors.append((item, e))
+
+    await asyncio.gather(*(run(item) for item in items))
+    return results, errors
+
+
+def _file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return sha.hexdigest()
+            sha.update(chunk)
+
+
+async def _read_file_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def _aiter(items: AsyncIterable | Iterable):
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+class TaskClient:
+    """AsyncTaskClient 的同步外观，内部持有独立的事件循环以复用连接池"""
+
+    def __init__(self, base_url: str = DEFAULT_BASE_URL, **kwargs):
+        self._loop = asyncio.new_event_loop()
+        self._client = self._run(self._create(base_url, kwargs))
+
+    @staticmethod
+    async def _create(base_url: str, kwargs: Dict[str, Any]) -> AsyncTaskClient:
+        # httpx.AsyncClient 需要在事件循环内创建
+        return AsyncTaskClient(base_url, **kwargs)
+
+    def _run(self, coro):
+        return self._loop.run_until_complete(coro)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._loop.is_closed():
+            return
+        self._run(self._client.aclose())
+        self._loop.close()
+
+    def _iterate(self, agen):
+        while True:
+            try:
+                yield self._run(agen.__anext__())
+            except StopAsyncIteration:
+                return
+
+    def stream_logs(self, *args, **kwargs):
+        return self._iterate(self._client.stream_logs(*args, **kwargs))
+
+    def iter_tasks(self, *args, **kwargs):
+        return self._iterate(self._client.iter_tasks(*args, **kwargs))
+
+    def iter_result_items(self, *args, **kwargs):
+        return self._iterate(self._client.iter_result_items(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        attr = getattr(self._client, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self._run(attr(*args, **kwargs))
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
@@ -0,0 +1,184 @@
+"""
+日志全文检索
+
+LogIndex 是按词项组织的倒排索引：词项 -> task_id -> 包含该词项的日志偏移。
+日志写入时增量更新，查询时先用倒排表求交得到候选行，再逐行校验内容和过滤条件。
+
+分词规则：字母数字连续串作为一个词（不区分大小写），中日韩字符逐字成词，
+因此英文按整词匹配，中文可以匹配任意子串。
+"""
+import re
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import logfilter
+from schemas import Task, TaskLog
+
+# 字母数字串，或单个中日韩字符
+TOKEN_PATTERN = re.compile(
+    r"[0-9A-Za-z_]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]")
+# 超长的词项（如base64数据）不进入索引
+MAX_TOKEN_LENGTH = 64
+SNIPPET_RADIUS = 40
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def tokenize(text: str) -> Set[str]:
+    return {token for token in TOKEN_PATTERN.findall(text.lower())
+            if len(token) <= MAX_TOKEN_LENGTH}
+
+
+def snippet(content: str, term: str) -> str:
+    """截取命中位置附近的内容"""
+    position = content.lower().find(term)
+    if position < 0:
+        position = 0
+    start = max(position - SNIPPET_RADIUS, 0)
+    end = min(position + len(term) + SNIPPET_RADIUS, len(content))
+    text = content[start:end]
+    if start > 0:
+        text = "…" + text
+    if end < len(content):
+        text = text + "…"
+    return text
+
+
+class LogIndex:
+    def __init__(self):
+        # 词项 -> task_id -> 日志偏移（递增）
+        self._postings: Dict[str, Dict[str, array]] = {}
+        # task_id -> 该任务出现过的词项，用于删除任务
+        self._task_tokens: Dict[str, Set[str]] = {}
+        # task_id -> 已索引的行数
+        self._task_lines: Dict[str, int] = {}
+
+    def add(self, task_id: str, start_offset: int, logs: Iterable[TaskLog]):
+        """索引从 start_offset 开始追加的日志"""
+        task_tokens = self._task_tokens.setdefault(task_id, set())
+        lines = 0
+        for offset, log in enumerate(logs, start_offset):
+            for token in tokenize(log.content):
+                tasks = self._postings.get(token)
+                if tasks is None:
+                    tasks = self._postings[token] = {}
+                offsets = tasks.get(task_id)
+                if offsets is None:
+                    offsets = tasks[task_id] = array("I")
+                    task_tokens.add(token)
+                offsets.append(offset)
+            lines += 1
+        self._task_lines[task_id] = self._task_lines.get(task_id, 0) + lines
+
+    def remove(self, task_id: str):
+        self._task_lines.pop(task_id, None)
+        for token in self._task_tokens.pop(task_id, ()):
+            tasks = self._postings.get(token)
+            if tasks is None:
+                continue
+            tasks.pop(task_id, None)
+            if not tasks:
+                del self._postings[token]
+
+    def rebuild(self, task_id: str, logs: List[TaskLog]):
+        """任务日志被整体替换时重建该任务的索引"""
+        self.remove(task_id)
+        self.add(task_id, 0, logs)
+
+    def candidates(self, terms: Set[str],
+                   accept: Optional[Callable[[str], bool]] = None) -> Iterator[Tuple[str, List[int]]]:
+        """按 task_id 顺序逐个产出包含全部词项的 (task_id, 日志偏移)
+
+        惰性求交，查询命中数达到上限后不再处理剩余任务；accept 用于在求交前排除任务。
+        """
+        postings = []
+        for term in terms:
+            tasks = self._postings.get(term)
+            if not tasks:
+                return
+            postings.append(tasks)
+        if not postings:
+            return
+        # 从最短的倒排表开始求交
+        postings.sort(key=len)
+        first, rest = postings[0], postings[1:]
+        for task_id in sorted(first):
+            if not all(task_id in tasks for tasks in rest):
+                continue
+            if accept is not None and not accept(task_id):
+                continue
+            if not rest:
+                yield task_id, first[task_id]
+                continue
+            matched = set(first[task_id])
+            for tasks in rest:
+                matched.intersection_update(tasks[task_id])
+                if not matched:
+                    break
+            if matched:
+                yield task_id, sorted(matched)
+
+    def search(self, query: str, tasks: Dict[str, Task],
+               statuses: Optional[Set[str]] = None, level: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = DEFAULT_LIMIT,
+               epochs: Optional[Callable[[str], Optional[Sequence[float]]]] = None) -> dict:
+        """检索日志内容，query 中的每个词都必须出现
+
+        按 task_id、偏移顺序返回最多 limit 条命中，还有更多命中时 truncated 为True。
+        epochs 返回任务按偏移顺序的日志时间，用于时间范围过滤。
+        """
+        started = time.perf_counter()
+        terms = [term.lower() for term in query.split()]
+        min_rank = logfilter.level_rank(level) if level else None
+        hits = []
+        truncated = False
+        def accept(task_id: str) -> bool:
+            task = tasks.get(task_id)
+            return task is not None and (not statuses or task.status.value in statuses)
+
+        for task_id, offsets in self.candidates(tokenize(query), accept):
+            logs = tasks[task_id].logs
+            task_epochs = epochs(task_id) if epochs is not None else None
+            for offset in offsets:
+                if offset >= len(logs):
+                    continue
+                log = logs[offset]
+                content = log.content.lower()
+                if not all(term in content for term in terms):
+                    continue
+                if min_rank is not None and logfilter.level_rank(log.level) < min_rank:
+                    continue
+                if since is not None or until is not None:
+                    if task_epochs is not None and offset < len(task_epochs):
+                        epoch = task_epochs[offset]
+                    else:
+                        epoch = logfilter.parse_time(log.timestamp)
+                    if epoch is None or (since is not None and epoch < since) \
+                            or (until is not None and epoch > until):
+                        continue
+                if len(hits) >= limit:
+                    truncated = True
+                    break
+                hits.append({
+                    "task_id": task_id,
+                    "offset": offset,
+                    "ts": log.timestamp,
+                    "level": log.level,
+                    "snippet": snippet(log.content, terms[0]),
+                })
+            if truncated:
+                break
+        return {
+            "hits": hits,
+            "truncated": truncated,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "terms": len(self._postings),
+            "tasks": len(self._task_tokens),
+            "lines": sum(self._task_lines.values()),
+        }
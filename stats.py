@@ -0,0 +1,175 @@
+"""
+任务看板统计
+
+在任务创建、状态变更和删除时增量更新，查询时间与任务数量无关：
+- 各状态的任务数
+- 最近一小时按分钟分桶的创建/完成/失败数（吞吐）
+- 当前排队（pending）任务的等待时长分位数：排队任务按进入排队的时间有序保存，分位数直接按下标读取
+- 最近一小时的排队时长（pending -> running）和运行时长（running -> 结束）分位数：
+  每分钟一组对数分桶直方图，超出窗口的分钟整组丢弃；分位数取所在桶的上界，是近似值
+"""
+import time
+from bisect import bisect_left, insort
+from typing import Dict, List, Optional, Tuple
+
+from schemas import TaskStatus
+
+WINDOW_MINUTES = 60
+PERCENTILES = (0.5, 0.9, 0.99)
+# 直方图桶上界（秒）：0.1秒起每桶翻倍，最后一桶约9.7天
+HISTOGRAM_BOUNDS = [0.1 * 2 ** i for i in range(24)]
+TERMINAL = {TaskStatus.COMPLETED.value, TaskStatus.FAILED.value}
+
+
+def _minute(now: float) -> int:
+    return int(now // 60)
+
+
+class SlidingCounter:
+    """最近 WINDOW_MINUTES 分钟的按分钟计数"""
+
+    def __init__(self):
+        self._counts = [0] * WINDOW_MINUTES
+        self._stamps = [-1] * WINDOW_MINUTES
+
+    def add(self, now: float, amount: int = 1):
+        minute = _minute(now)
+        slot = minute % WINDOW_MINUTES
+        if self._stamps[slot] != minute:
+            self._stamps[slot] = minute
+            self._counts[slot] = 0
+        self._counts[slot] += amount
+
+    def total(self, now: float, minutes: int = WINDOW_MINUTES) -> int:
+        current = _minute(now)
+        return sum(count for count, stamp in zip(self._counts, self._stamps)
+                   if 0 <= current - stamp < minutes)
+
+
+class SlidingHistogram:
+    """最近 WINDOW_MINUTES 分钟的对数分桶直方图"""
+
+    def __init__(self):
+        self._buckets = [[0] * (len(HISTOGRAM_BOUNDS) + 1) for _ in range(WINDOW_MINUTES)]
+        self._stamps = [-1] * WINDOW_MINUTES
+
+    def record(self, value: float, now: float):
+        minute = _minute(now)
+        slot = minute % WINDOW_MINUTES
+        buckets = self._buckets[slot]
+        if self._stamps[slot] != minute:
+            self._stamps[slot] = minute
+            buckets[:] = [0] * len(buckets)
+        buckets[bisect_left(HISTOGRAM_BOUNDS, value)] += 1
+
+    def summary(self, now: float) -> dict:
+        current = _minute(now)
+        merged = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        for buckets, stamp in zip(self._buckets, self._stamps):
+            if 0 <= current - stamp < WINDOW_MINUTES:
+                for i, count in enumerate(buckets):
+                    merged[i] += count
+        count = sum(merged)
+        result = {"count": count}
+        for p in PERCENTILES:
+            result[f"p{int(p * 100)}"] = self._percentile(merged, count, p)
+        return result
+
+    @staticmethod
+    def _percentile(merged: List[int], count: int, p: float) -> Optional[float]:
+        if not count:
+            return None
+        rank = max(1, int(p * count + 0.999999))
+        seen = 0
+        for i, bucket in enumerate(merged):
+            seen += bucket
+            if seen >= rank:
+                return HISTOGRAM_BOUNDS[min(i, len(HISTOGRAM_BOUNDS) - 1)]
+        return HISTOGRAM_BOUNDS[-1]
+
+
+class TaskStats:
+    def __init__(self):
+        self.counts: Dict[str, int] = {status.value: 0 for status in TaskStatus}
+        # task_id -> (当前状态, 进入该状态的时间)
+        self._states: Dict[str, Tuple[str, float]] = {}
+        # 排队中的任务，按进入排队的时间排序
+        self._pending: List[Tuple[float, str]] = []
+        self.created = SlidingCounter()
+        self.completed = SlidingCounter()
+        self.failed = SlidingCounter()
+        self.wait_time = SlidingHistogram()
+        self.run_time = SlidingHistogram()
+        # 每次变化递增，推送时据此判断是否需要发送
+        self.version = 0
+
+    def _leave(self, task_id: str, status: str, since: float):
+        self.counts[status] -= 1
+        if status == TaskStatus.PENDING.value:
+            position = bisect_left(self._pending, (since, task_id))
+            if position < len(self._pending) and self._pending[position] == (since, task_id):
+                del self._pending[position]
+
+    def transition(self, task_id: str, status: str, now: Optional[float] = None,
+                   record: bool = True):
+        """记录任务进入 status；record 为False时只更新计数，不计入吞吐和时长（用于导入）"""
+        now = time.time() if now is None else now
+        previous = self._states.get(task_id)
+        if previous is not None and previous[0] == status:
+            return
+        if previous is None:
+            if record:
+                self.created.add(now)
+        else:
+            old_status, since = previous
+            self._leave(task_id, old_status, since)
+            if record and old_status == TaskStatus.PENDING.value and status != old_status:
+                self.wait_time.record(now - since, now)
+            if record and old_status == TaskStatus.RUNNING.value and status in TERMINAL:
+                self.run_time.record(now - since, now)
+        if record and status == TaskStatus.COMPLETED.value:
+            self.completed.add(now)
+        elif record and status == TaskStatus.FAILED.value:
+            self.failed.add(now)
+        self._states[task_id] = (status, now)
+        self.counts[status] += 1
+        if status == TaskStatus.PENDING.value:
+            if not self._pending or self._pending[-1] < (now, task_id):
+                self._pending.append((now, task_id))
+            else:
+                insort(self._pending, (now, task_id))
+        self.version += 1
+
+    def remove(self, task_id: str):
+        previous = self._states.pop(task_id, None)
+        if previous is not None:
+            self._leave(task_id, *previous)
+            self.version += 1
+
+    def queue_age(self, now: float) -> dict:
+        pending = self._pending
+        result = {"count": len(pending), "oldest": now - pending[0][0] if pending else None}
+        for p in PERCENTILES:
+            # 等待时长的 p 分位对应按进入时间排序后的 (1-p) 位置
+            index = int((1 - p) * (len(pending) - 1)) if pending else None
+            result[f"p{int(p * 100)}"] = now - pending[index][0] if pending else None
+        return result
+
+    def snapshot(self, now: Optional[float] = None) -> dict:
+        now = time.time() if now is None else now
+        return {
+            "version": self.version,
+            "counts": dict(self.counts),
+            "total": len(self._states),
+            "throughput": {
+                "window_minutes": WINDOW_MINUTES,
+                "created": self.created.total(now),
+                "completed": self.completed.total(now),
+                "failed": self.failed.total(now),
+                "completed_last_minute": self.completed.total(now, 1),
+                "completed_per_minute": round(self.completed.total(now) / WINDOW_MINUTES, 3),
+            },
+            "queue_age": self.queue_age(now),
+            "wait_time": self.wait_time.summary(now),
+            "run_time": self.run_time.summary(now),
+        }
@@ -1,7 +1,18 @@
 import os
+import shutil
 import sys
+import tempfile
 from pathlib import Path
 
 # 添加项目根目录到Python路径
 root_dir = Path(__file__).parent.parent
 sys.path.append(str(root_dir))
+
+# 上传文件和日志写入临时目录，不污染仓库中的 uploads/ 和 logs/；需在导入 main 之前设置
+_data_dir = tempfile.mkdtemp(prefix="task-manager-tests-")
+os.environ["UPLOAD_DIR"] = os.path.join(_data_dir, "uploads")
+os.environ["LOG_DIR"] = os.path.join(_data_dir, "logs")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_data_dir, ignore_errors=True)
@@ -0,0 +1,114 @@
+from fastapi.testclient import TestClient
+from main import app
+from schemas import MAX_BATCH_SIZE
+import json
+import uuid
+
+client = TestClient(app)
+
+
+def test_batch_create():
+    """测试批量创建任务"""
+    response = client.post("/tasks:batch", json={"tasks": [
+        {"params": {"name": f"批量任务{i}"}} for i in range(3)]})
+
+    assert response.status_code == 200
+    created = response.json()["tasks"]
+    assert [task["params"]["name"] for task in created] == ["批量任务0", "批量任务1", "批量任务2"]
+    assert len({task["id"] for task in created}) == 3
+    for task in created:
+        assert client.get(f"/tasks/{task['id']}").json()["status"] == "pending"
+
+
+def test_batch_create_too_many():
+    """测试超过单批上限时返回422"""
+    response = client.post("/tasks:batch", json={"tasks": [
+        {"params": {}} for _ in range(MAX_BATCH_SIZE + 1)]})
+    assert response.status_code == 422
+
+
+def test_batch_get_views():
+    """测试按ID批量获取任务和结果视图"""
+    ids = [task["id"] for task in client.post("/tasks:batch", json={"tasks": [
+        {"params": {"i": i}} for i in range(2)]}).json()["tasks"]]
+    client.post(f"/tasks/{ids[0]}/result", data={"result_params": json.dumps({"value": 1})})
+
+    response = client.post("/tasks:batchGet", json={"ids": ids + ["non_existent_task"]})
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data["items"]) == set(ids)
+    assert data["items"][ids[1]]["params"] == {"i": 1}
+    assert data["missing"] == ["non_existent_task"]
+
+    data = client.post("/tasks:batchGet", json={"ids": ids, "view": "result"}).json()
+    assert data["items"] == {ids[0]: {"value": 1}, ids[1]: None}
+
+
+def test_batch_create_with_file_refs():
+    """测试批量创建时按哈希引用已上传的文件，引用不存在时不创建任何任务"""
+    digest = client.post("/blobs", files={"file": ("input.csv", b"a,b\n1,2\n")}).json()["sha256"]
+    response = client.post("/tasks:batch", json={"tasks": [
+        {"params": {"i": i}, "file_sha256": digest, "file_name": "input.csv"} for i in range(3)]})
+    assert response.status_code == 200
+    created = response.json()["tasks"]
+    assert {task["params"]["file_sha256"] for task in created} == {digest}
+    assert client.get(f"/blobs/{digest}").json()["refs"] >= 3
+    assert client.get(f"/tasks/{created[0]['id']}/file").content == b"a,b\n1,2\n"
+
+    before = len(client.get("/tasks").json())
+    response = client.post("/tasks:batch", json={"tasks": [
+        {"params": {}}, {"params": {}, "file_sha256": "0" * 64}]})
+    assert response.status_code == 404
+    assert len(client.get("/tasks").json()) == before
+
+
+def test_bulk_update_by_ids_and_query():
+    """测试按ID列表和索引条件批量修改状态"""
+    marker = f"bulk-{uuid.uuid4()}"
+    ids = [task["id"] for task in client.post("/tasks:batch", json={"tasks": [
+        {"params": {"marker": marker}} for _ in range(4)]}).json()["tasks"]]
+
+    response = client.post("/tasks:bulkUpdate", json={"ids": ids[:2], "status": "failed"})
+    assert response.json() == {"matched": 2, "updated": 2, "ids": ids[:2]}
+
+    response = client.post("/tasks:bulkUpdate", json={"ids": ids[:1] + ["non_existent_task"],
+                                                      "status": "pending"})
+    assert response.status_code == 404
+    assert client.get(f"/tasks/{ids[0]}").json()["status"] == "failed"
+
+    client.post("/indexes", json={"field": "params.marker"})
+    response = client.post("/tasks:bulkUpdate", json={"where": [
+        {"field": "params.marker", "value": marker},
+        {"field": "status", "value": "failed"}], "status": "pending"})
+    assert response.json()["updated"] == 2
+    assert [client.get(f"/tasks/{task_id}").json()["status"] for task_id in ids] == ["pending"] * 4
+
+    response = client.post("/tasks:bulkUpdate", json={
+        "ids": ids, "where": [{"field": "status", "value": "pending"}], "status": "running"})
+    assert response.status_code == 400
+
+    # 空条件会匹配全部任务，直接拒绝
+    response = client.post("/tasks:bulkUpdate", json={"where": [], "status": "running"})
+    assert response.status_code == 422
+    assert [client.get(f"/tasks/{task_id}").json()["status"] for task_id in ids] == ["pending"] * 4
+
+
+def test_bulk_update_notifies_receivers():
+    """测试批量更新时结构化帧格式的接收者收到任务变更事件"""
+    task_id = client.post("/tasks:batch", json={"tasks": [{"params": {}}]}).json()["tasks"][0]["id"]
+    client.post(f"/tasks/{task_id}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "开始", "level": "info"})
+
+    with client.websocket_connect("/ws/receiver", subprotocols=["logs.json"]) as receiver:
+        receiver.send_text(json.dumps({"task_id": task_id}))
+        # 收到第一批日志时接收者已经登记
+        assert receiver.receive_json()["type"] == "logs"
+        response = client.post("/tasks:bulkUpdate", json={"ids": [task_id], "status": "running"})
+        assert response.json()["updated"] == 1
+
+        message = receiver.receive_json()
+        assert message["type"] == "task_updated"
+        assert message["task"]["id"] == task_id
+        assert message["task"]["status"] == "running"
+        assert message["task"]["log_count"] == 1
+        assert "logs" not in message["task"]
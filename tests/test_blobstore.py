@@ -0,0 +1,104 @@
+import pytest
+import httpx
+from fastapi.testclient import TestClient
+from main import app, blobs
+from sdk import TaskClient
+import hashlib
+import json
+import os
+import uuid
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def content():
+    """每个测试使用不同的文件内容，避免与其他测试共享文件"""
+    return f"内容寻址 {uuid.uuid4()}\n".encode("utf-8") * 100
+
+
+def create_with_file(content: bytes, filename: str = "input.txt") -> dict:
+    response = client.post("/tasks", data={"params": json.dumps({"test": "blob"})},
+                           files={"file": (filename, content)})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_same_content_stored_once(content):
+    """测试相同内容的上传只保存一份，任务记录哈希和原始文件名"""
+    digest = hashlib.sha256(content).hexdigest()
+    before = client.get("/metrics").json()["blobs"]["dedup_hits"]
+
+    first = create_with_file(content, "a.txt")
+    second = create_with_file(content, "b.txt")
+
+    assert first["params"]["file_sha256"] == digest
+    assert first["params"]["file_path"] == second["params"]["file_path"] == blobs.path(digest)
+    assert first["params"]["file_path"].endswith(os.path.join(digest[:2], digest[2:4], digest))
+    assert second["params"]["original_filename"] == "b.txt"
+    assert client.get("/metrics").json()["blobs"]["dedup_hits"] == before + 1
+
+    info = client.get(f"/blobs/{digest}").json()
+    assert info == {"sha256": digest, "size": len(content), "refs": 2}
+
+    response = client.get(f"/tasks/{second['id']}/file")
+    assert response.content == content
+    assert 'filename="b.txt"' in response.headers["content-disposition"]
+
+
+def test_attach_by_hash(content):
+    """测试先上传文件，再按哈希创建任务"""
+    uploaded = client.post("/blobs", files={"file": ("data.bin", content)}).json()
+    assert uploaded["size"] == len(content)
+    assert client.get(f"/blobs/{uploaded['sha256']}").json()["refs"] == 0
+
+    response = client.post("/tasks", data={
+        "params": json.dumps({"test": "blob"}),
+        "file_sha256": uploaded["sha256"], "file_name": "data.bin"})
+    task = response.json()
+    assert task["params"]["original_filename"] == "data.bin"
+    assert client.get(f"/tasks/{task['id']}/file").content == content
+    assert client.get(f"/blobs/{uploaded['sha256']}").json()["refs"] == 1
+
+
+def test_attach_unknown_hash():
+    """测试引用不存在的文件返回404"""
+    response = client.post("/tasks", data={
+        "params": json.dumps({"test": "blob"}), "file_sha256": "0" * 64})
+    assert response.status_code == 404
+    assert client.get(f"/blobs/{'0' * 64}").status_code == 404
+    assert client.get("/blobs/not-a-hash").status_code == 404
+
+
+def test_release_on_delete(content):
+    """测试最后一个引用的任务删除后文件被删除"""
+    first = create_with_file(content)
+    second = create_with_file(content)
+    path = first["params"]["file_path"]
+
+    client.delete(f"/tasks/{first['id']}")
+    assert os.path.exists(path)
+    client.delete(f"/tasks/{second['id']}")
+    assert not os.path.exists(path)
+
+
+def test_sdk_skips_known_upload(content, tmp_path):
+    """测试SDK发现服务端已有相同文件时不再上传内容"""
+    input_file = tmp_path / "input.txt"
+    input_file.write_bytes(content)
+    uploads = []
+
+    class RecordingTransport(httpx.ASGITransport):
+        async def handle_async_request(self, request):
+            if request.url.path == "/tasks":
+                uploads.append(b"filename=" in await request.aread())
+            return await super().handle_async_request(request)
+
+    with TaskClient("http://testserver", transport=RecordingTransport(app=app),
+                    retries=0) as sdk_client:
+        first = sdk_client.create_task({"n": 1}, file_path=str(input_file))
+        second = sdk_client.create_task({"n": 2}, file_path=str(input_file))
+
+    assert uploads == [True, False]
+    assert second["params"]["file_sha256"] == first["params"]["file_sha256"]
+    assert second["params"]["original_filename"] == "input.txt"
@@ -0,0 +1,114 @@
+import pytest
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from sdk import TaskClient
+import io
+import json
+import os
+import tarfile
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def finished_task(tmp_path):
+    """创建带输入文件、结果文件和日志的已完成任务"""
+    input_file = tmp_path / "input.csv"
+    input_file.write_bytes(b"a,b\n1,2\n" * 1000)
+    with open(input_file, "rb") as f:
+        response = client.post("/tasks", data={"params": json.dumps({"type": "bundle"})},
+                               files={"file": ("input.csv", f)})
+    task = response.json()
+    for i in range(3):
+        client.post(f"/tasks/{task['id']}/log", json={
+            "timestamp": f"2024-03-23T10:00:0{i}", "content": f"日志{i}", "level": "info"})
+    with open(input_file, "rb") as f:
+        client.post(f"/tasks/{task['id']}/result", data={"result_params": json.dumps({"rows": 2})},
+                    files={"file": ("output.csv", f)})
+    yield task
+    stored = client.get(f"/tasks/{task['id']}").json()
+    for path in (stored["params"]["file_path"], stored["result"]["file_path"]):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_bundle_layout(finished_task):
+    """测试归档中每个任务包含元数据、日志、输入文件和结果文件"""
+    task_id = finished_task["id"]
+    response = client.get("/tasks:bundle", params={"ids": task_id, "compression": "none"})
+    assert response.headers["content-type"] == "application/x-tar"
+
+    with tarfile.open(fileobj=io.BytesIO(response.content)) as archive:
+        names = archive.getnames()
+        assert names == [f"tasks/{task_id}/task.json", f"tasks/{task_id}/logs.ndjson",
+                         f"tasks/{task_id}/file/input.csv",
+                         f"tasks/{task_id}/result_file/output.csv"]
+        meta = json.loads(archive.extractfile(names[0]).read())
+        assert meta["status"] == "completed"
+        assert "logs" not in meta
+        logs = archive.extractfile(names[1]).read().decode("utf-8").splitlines()
+        assert json.loads(logs[2])["content"] == "日志2"
+        assert archive.extractfile(names[3]).read() == b"a,b\n1,2\n" * 1000
+
+
+def test_bundle_round_trip(finished_task, tmp_path):
+    """测试通过SDK导出gzip归档并重新导入"""
+    task_id = finished_task["id"]
+    with TaskClient("http://testserver", transport=httpx.ASGITransport(app=app),
+                    retries=0) as sdk_client:
+        path = sdk_client.export_bundle(str(tmp_path / "tasks.tar.gz"), ids=[task_id])
+        before = client.get("/stats").json()
+        result = sdk_client.import_bundle(path)
+        after = client.get("/stats").json()
+        # 导入的任务计入状态计数，不计入吞吐
+        assert after["counts"]["completed"] == before["counts"]["completed"] + 1
+        assert after["throughput"] == before["throughput"]
+
+        assert result["count"] == 1
+        assert result["tasks"][0]["source_id"] == task_id
+        new_id = result["tasks"][0]["id"]
+        assert new_id != task_id
+
+        task = sdk_client.get_task(new_id)
+        assert task["status"] == "completed"
+        assert task["params"]["type"] == "bundle"
+        assert [log["content"] for log in task["logs"]] == ["日志0", "日志1", "日志2"]
+        assert task["result"]["rows"] == 2
+        assert task["result"]["original_filename"] == "output.csv"
+
+        sdk_client.download_result_file(new_id, str(tmp_path / "output.csv"))
+        assert (tmp_path / "output.csv").read_bytes() == b"a,b\n1,2\n" * 1000
+        sdk_client.download_file(new_id, str(tmp_path / "input.csv"))
+        assert (tmp_path / "input.csv").read_bytes() == b"a,b\n1,2\n" * 1000
+
+        # 输入和结果内容相同，导入后与原任务共用同一个文件
+        assert task["params"]["file_path"] == task["result"]["file_path"] == finished_task["params"]["file_path"]
+
+
+def test_import_invalid_bundle():
+    """测试导入无效归档返回400"""
+    response = client.post("/tasks:import", content=b"not a tar file" * 100)
+    assert response.status_code == 400
+
+
+def make_bundle(members: dict) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("members", [
+    {"tasks/a/task.json": b'["not", "a", "dict"]'},
+    {"tasks/a/task.json": b'{"params": ["x"]}'},
+    {"tasks/a/task.json": b'{"params": {}, "result": "done"}'},
+    {"tasks/a/task.json": b'{"params": {}}', "tasks/a/logs.ndjson": b'"line"\n'},
+])
+def test_import_malformed_task_json(members):
+    """测试 task.json、params、result 或日志行不是JSON对象时返回400"""
+    response = client.post("/tasks:import", content=make_bundle(members))
+    assert response.status_code == 400
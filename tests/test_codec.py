@@ -0,0 +1,50 @@
+from fastapi.testclient import TestClient
+import main
+from main import app
+import codec
+import json
+import logging
+from datetime import datetime
+from schemas import TaskStatus
+
+client = TestClient(app)
+
+
+def test_dumps_handles_datetime_and_enum():
+    """测试编码器处理datetime和枚举"""
+    now = datetime(2024, 3, 23, 10, 0, 0)
+    data = codec.loads(codec.dumps({"at": now, "status": TaskStatus.RUNNING}))
+    assert data == {"at": "2024-03-23T10:00:00", "status": "running"}
+
+
+def test_loads_invalid_json():
+    """测试解析无效JSON时抛出JSONDecodeError"""
+    try:
+        codec.loads("invalid json")
+    except codec.JSONDecodeError:
+        pass
+    else:
+        assert False, "应抛出JSONDecodeError"
+
+
+def test_get_tasks_matches_model_dump():
+    """测试快速编码的任务列表与模型输出一致"""
+    response = client.post("/tasks", data={"params": json.dumps({"name": "编码测试"})})
+    task_id = response.json()["id"]
+
+    response = client.get("/tasks")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    listed = {task["id"]: task for task in response.json()}
+    assert listed[task_id]["params"] == {"name": "编码测试"}
+
+    response = client.get(f"/tasks/{task_id}")
+    assert response.json() == listed[task_id]
+
+
+def test_warns_when_fast_codec_missing(monkeypatch, caplog):
+    """测试缺少 orjson 时启动日志给出警告"""
+    monkeypatch.setattr(codec, "orjson", None)
+    with caplog.at_level(logging.WARNING, logger="task_manager"):
+        main.warn_missing_dependencies()
+    assert any("orjson" in record.getMessage() for record in caplog.records)
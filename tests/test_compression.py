@@ -0,0 +1,54 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_task():
+    """创建带大量日志的测试任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "compression"})})
+    task = response.json()
+    for i in range(50):
+        client.post(f"/tasks/{task['id']}/log", json={
+            "timestamp": "2024-03-23T10:00:00", "content": f"处理第{i}条记录", "level": "info"})
+    return task
+
+
+def test_large_json_response_is_gzipped(test_task):
+    """测试超过阈值的JSON响应被gzip压缩"""
+    response = client.get(f"/tasks/{test_task['id']}/logs",
+                          headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert len(response.json()) == 50
+
+
+def test_small_or_unaccepted_response_is_not_compressed(test_task):
+    """测试小响应和不接受压缩的请求保持原样"""
+    response = client.get(f"/tasks/{test_task['id']}/params",
+                          headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+
+    response = client.get(f"/tasks/{test_task['id']}/logs",
+                          headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert len(response.json()) == 50
+
+
+def test_index_page_is_precompressed_and_cacheable():
+    """测试首页预压缩并支持ETag协商"""
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert "max-age" in response.headers["cache-control"]
+    assert "任务管理器" in response.text
+
+    etag = response.headers["etag"]
+    response = client.get("/", headers={"If-None-Match": etag})
+    assert response.status_code == 304
@@ -0,0 +1,75 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_task():
+    """创建测试任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"name": "条件请求"})})
+    return response.json()
+
+
+def test_version_bumps_on_changes(test_task):
+    """测试更新、日志和结果都会递增版本号"""
+    task_id = test_task["id"]
+    assert test_task["version"] == 1
+
+    client.put(f"/tasks/{task_id}", json={"status": "running"})
+    client.post(f"/tasks/{task_id}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "日志", "level": "info"})
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"ok": True})})
+
+    response = client.get(f"/tasks/{task_id}")
+    assert response.json()["version"] == 4
+    assert response.headers["etag"] == f'"{task_id}.4"'
+
+
+@pytest.mark.parametrize("path", ["", "/logs", "/params"])
+def test_if_none_match_returns_304(test_task, path):
+    """测试版本未变化时返回304"""
+    task_id = test_task["id"]
+    response = client.get(f"/tasks/{task_id}{path}")
+    etag = response.headers["etag"]
+
+    response = client.get(f"/tasks/{task_id}{path}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    client.post(f"/tasks/{task_id}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "新日志", "level": "info"})
+    response = client.get(f"/tasks/{task_id}{path}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_result_etag(test_task):
+    """测试结果接口的条件请求"""
+    task_id = test_task["id"]
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"ok": True})})
+
+    response = client.get(f"/tasks/{task_id}/result")
+    response = client.get(f"/tasks/{task_id}/result",
+                          headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+
+def test_update_with_if_match(test_task):
+    """测试If-Match乐观并发控制"""
+    task_id = test_task["id"]
+    etag = client.get(f"/tasks/{task_id}").headers["etag"]
+
+    response = client.put(f"/tasks/{task_id}", json={"status": "running"},
+                          headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    # 旧版本再次更新应失败
+    response = client.put(f"/tasks/{task_id}", json={"status": "failed"},
+                          headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert response.json()["detail"] == "任务版本已变更"
+    assert client.get(f"/tasks/{task_id}").json()["status"] == "running"
@@ -0,0 +1,106 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+import main
+from main import app, tasks, sender_streams
+from drain import DrainState, GOING_AWAY_CODE
+from schemas import TaskLog
+import asyncio
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def drain_state(monkeypatch):
+    """每个测试使用独立的排空状态，避免影响其他测试"""
+    state = DrainState()
+    monkeypatch.setattr(main, "drain_state", state)
+    return state
+
+
+def create_task(lines: int = 0) -> str:
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "drain"})}).json()["id"]
+    if lines:
+        main.append_logs(tasks[task_id], [
+            TaskLog(timestamp="2024-03-23T10:00:00", content=f"第{i}行") for i in range(lines)])
+    return task_id
+
+
+def test_drain_state_wakes_waiters():
+    """测试进入排空状态时唤醒等待者并等待连接结束"""
+    async def run():
+        state = DrainState()
+        waiter = state.subscribe()
+        with state.stream():
+            state.begin()
+            await asyncio.wait_for(waiter, 1)
+            assert await state.wait_streams(0.1) == 1
+        assert await state.wait_streams(0.1) == 0
+        assert state.subscribe().done()
+
+    asyncio.run(run())
+
+
+def test_receiver_gets_resume_offset(drain_state):
+    """测试排空时接收者收到续传偏移"""
+    task_id = create_task(lines=3)
+    with client.websocket_connect("/ws/receiver", subprotocols=["logs.json"]) as websocket:
+        websocket.send_text(json.dumps({"task_id": task_id}))
+        assert len(websocket.receive_json()["entries"]) == 3
+        drain_state.begin()
+        message = websocket.receive_json()
+        assert message["type"] == "going_away"
+        assert message["offset"] == 3
+        assert message["retry_after"] > 0
+        with pytest.raises(WebSocketDisconnect) as e:
+            websocket.receive_json()
+        assert e.value.code == GOING_AWAY_CODE
+
+
+def test_sender_acknowledged_before_going_away(drain_state):
+    """测试排空时空闲的发送端收到已接收的序号，新的日志流被拒绝"""
+    task_id = create_task()
+    with client.websocket_connect("/ws/sender", subprotocols=["logs.json"]) as websocket:
+        websocket.send_text(json.dumps({"task_id": task_id, "stream_id": "s1"}))
+        assert websocket.receive_json() == {"type": "ready", "seq": 0}
+        websocket.send_text(json.dumps({"type": "logs", "seq": 0, "entries": [
+            {"content": f"行{i}"} for i in range(3)]}))
+        assert websocket.receive_json() == {"type": "ack", "seq": 3}
+
+        drain_state.begin()
+        message = websocket.receive_json()
+        assert message["type"] == "going_away"
+        assert message["seq"] == 3
+
+    with pytest.raises(WebSocketDisconnect) as e:
+        with client.websocket_connect("/ws/receiver") as websocket:
+            websocket.receive_text()
+    assert e.value.code == GOING_AWAY_CODE
+    assert len(tasks[task_id].logs) == 3
+
+
+def test_snapshot_restores_ids_offsets_and_streams(tmp_path):
+    """测试快照按原ID恢复任务、日志、文件引用和发送流位置"""
+    task = client.post("/tasks", data={"params": json.dumps({"test": "snapshot"})},
+                       files={"file": ("input.csv", b"a,b\n1,2\n")}).json()
+    task_id = task["id"]
+    # 另一个任务引用同一文件，模拟重启时文件存储中的文件仍然存在
+    client.post("/tasks:batch", json={"tasks": [
+        {"params": {}, "file_sha256": task["params"]["file_sha256"]}]})
+    main.append_logs(tasks[task_id], [
+        TaskLog(timestamp="2024-03-23T10:00:00", content=f"第{i}行") for i in range(5)])
+    client.put(f"/tasks/{task_id}", json={"status": "running"})
+    sender_streams[task_id] = {"s1": 5}
+    path = str(tmp_path / "snapshot.tar")
+
+    asyncio.run(main.save_snapshot(path))
+    main.remove_task(task_id)
+    main.restore_snapshot({task_id: main.read_snapshot(path)[task_id]})
+
+    restored = client.get(f"/tasks/{task_id}").json()
+    assert restored["status"] == "running"
+    assert [log["content"] for log in restored["logs"]] == [f"第{i}行" for i in range(5)]
+    assert client.get(f"/tasks/{task_id}/file").content == b"a,b\n1,2\n"
+    assert sender_streams[task_id] == {"s1": 5}
+    assert task_id in list(main.task_order)
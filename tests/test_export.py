@@ -0,0 +1,94 @@
+import pytest
+import httpx
+from fastapi.testclient import TestClient
+from main import app, append_logs, tasks
+from schemas import TaskLog
+from sdk import TaskClient
+import gzip
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_task():
+    """创建带日志的测试任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "export"})})
+    task = response.json()
+    # 日志超过一个输出块，直接写入避免三千次请求
+    append_logs(tasks[task["id"]], [
+        TaskLog(timestamp=f"2024-03-23T10:{i // 60:02d}:{i % 60:02d}", content=f"第{i}行")
+        for i in range(3000)])
+    return task
+
+
+def test_export_logs_formats(test_task):
+    """测试以NDJSON、JSON数组和纯文本流式导出日志"""
+    task_id = test_task["id"]
+
+    response = client.get(f"/tasks/{task_id}/logs:export", headers={"Accept-Encoding": "identity"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "content-encoding" not in response.headers
+    lines = response.text.splitlines()
+    assert len(lines) == 3000
+    assert json.loads(lines[1]) == {"offset": 1, "ts": "2024-03-23T10:00:01", "level": "info", "content": "第1行"}
+
+    logs = client.get(f"/tasks/{task_id}/logs:export", params={"format": "json"}).json()
+    assert [log["offset"] for log in logs] == list(range(3000))
+
+    # fields=log 与 GET /tasks/{id}/logs 的字段一致
+    logs = client.get(f"/tasks/{task_id}/logs:export", params={"format": "json", "fields": "log"}).json()
+    assert logs == client.get(f"/tasks/{task_id}/logs").json()
+    assert logs[1] == {"timestamp": "2024-03-23T10:00:01", "content": "第1行", "level": "info"}
+
+    response = client.get(f"/tasks/{task_id}/logs:export", params={
+        "format": "text", "from_offset": 2998})
+    assert response.text == "第2998行\n第2999行\n"
+
+    response = client.get(f"/tasks/{task_id}/logs:export", params={
+        "format": "text", "since": "2024-03-23T10:01:00", "until": "2024-03-23T10:01:01",
+        "from_offset": 61})
+    assert response.text == "第61行\n"
+
+    response = client.get(f"/tasks/{task_id}/logs:export", params={
+        "format": "text", "from_offset": 1000, "limit": 2})
+    assert response.text == "第1000行\n第1001行\n"
+
+
+def test_export_logs_gzip(test_task):
+    """测试客户端接受gzip时边生成边压缩"""
+    with client.stream("GET", f"/tasks/{test_task['id']}/logs:export",
+                       headers={"Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        raw = b"".join(response.iter_raw())
+    lines = gzip.decompress(raw).decode("utf-8").splitlines()
+    assert len(lines) == 3000
+
+
+def test_export_tasks():
+    """测试按状态导出任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "export"})})
+    task_id = response.json()["id"]
+    client.put(f"/tasks/{task_id}", json={"status": "failed"})
+
+    response = client.get("/tasks:export")
+    ids = [json.loads(line)["id"] for line in response.text.splitlines()]
+    assert task_id in ids
+
+    tasks = client.get("/tasks:export", params={"format": "json", "status": "failed"}).json()
+    assert task_id in [task["id"] for task in tasks]
+    assert all(task["status"] == "failed" for task in tasks)
+
+
+def test_sdk_export_to_file(test_task, tmp_path):
+    """测试SDK把导出结果直接写入文件，可保留gzip压缩"""
+    with TaskClient("http://testserver", transport=httpx.ASGITransport(app=app),
+                    retries=0) as sdk_client:
+        path = sdk_client.export_logs(test_task["id"], str(tmp_path / "logs.ndjson"))
+        compressed = sdk_client.export_logs(test_task["id"], str(tmp_path / "logs.txt.gz"),
+                                            format="text", compressed=True)
+
+    with open(path, encoding="utf-8") as f:
+        assert sum(1 for _ in f) == 3000
+    with gzip.open(compressed, "rt", encoding="utf-8") as f:
+        assert f.readline() == "第0行\n"
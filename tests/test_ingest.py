@@ -0,0 +1,113 @@
+import pytest
+from fastapi.testclient import TestClient
+import ingest
+import main
+from main import app, tasks
+from ingest import IngestController, LogBudget, TokenBucket
+from schemas import TaskLog
+import json
+
+client = TestClient(app)
+
+
+def make_logs(count: int, prefix: str = "line") -> list:
+    return [TaskLog(timestamp="2024-03-23T10:00:00", content=f"{prefix}{i:05d}") for i in range(count)]
+
+
+@pytest.fixture
+def controller():
+    """测试期间修改全局写入控制的配置，结束后恢复"""
+    saved = dict(vars(main.ingest))
+    yield main.ingest
+    for key in ("task_lines_per_sec", "task_bytes_per_sec", "max_task_log_bytes", "overflow"):
+        setattr(main.ingest, key, saved[key])
+
+
+def test_token_bucket():
+    """测试令牌桶按速率补充，超出时返回需要等待的时间"""
+    bucket = TokenBucket(rate=10)
+    assert bucket.reserve(10, now=bucket.updated) == 0
+    assert bucket.reserve(5, now=bucket.updated) == pytest.approx(0.5)
+    assert bucket.reserve(5, now=bucket.updated + 1.0) == 0
+    assert TokenBucket(rate=0).reserve(10 ** 9) == 0
+
+
+def test_connection_and_global_limits():
+    """测试连接和全局速率限制分别计数"""
+    controller = IngestController()
+    connection = ingest.RateLimit(lines_per_sec=100, bytes_per_sec=0)
+    assert controller.reserve("a", make_logs(100), connection) == 0
+    assert controller.reserve("a", make_logs(50), connection) == pytest.approx(0.5, abs=0.01)
+    assert controller.counters["connection_limit_hits"] == 1
+    assert controller.counters["task_limit_hits"] == 0
+
+
+def test_truncate_budget():
+    """测试超过容量后丢弃日志，结束信号前补充丢弃说明"""
+    budget = LogBudget(max_bytes=90, mode="truncate")
+    accepted = budget.admit(make_logs(20))
+    assert [log.content for log in accepted[:10]] == [f"line{i:05d}" for i in range(10)]
+    assert len(accepted) == 11 and accepted[10].level == "WARNING"
+
+    ended = budget.admit([TaskLog(timestamp="", content="END_SIGNAL")])
+    assert "共丢弃 10 行" in ended[0].content
+    assert ended[-1].content == "END_SIGNAL"
+
+
+def test_head_tail_budget():
+    """测试保留开头和最近的日志，中间的日志在结束时以说明代替"""
+    budget = LogBudget(max_bytes=100, mode="head_tail")
+    accepted = budget.admit(make_logs(20))
+    assert [log.content for log in accepted] == [f"line{i:05d}" for i in range(5)]
+    assert budget.pending
+
+    flushed = budget.flush()
+    assert "省略了中间 10 行" in flushed[0].content
+    assert [log.content for log in flushed[1:]] == [f"line{i:05d}" for i in range(15, 20)]
+    assert not budget.pending
+
+
+def test_rest_log_rate_limited(controller, monkeypatch):
+    """测试REST写入超过任务速率时返回429和Retry-After"""
+    monkeypatch.setattr(ingest, "MAX_REST_DELAY", 0)
+    controller.task_lines_per_sec = 1
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "ingest"})}).json()["id"]
+    log = {"timestamp": "2024-03-23T10:00:00", "content": "日志", "level": "info"}
+
+    assert client.post(f"/tasks/{task_id}/log", json=log).status_code == 200
+    response = client.post(f"/tasks/{task_id}/log", json=log)
+    assert response.status_code == 429
+    assert response.headers["retry-after"] == "1"
+    assert len(tasks[task_id].logs) == 1
+    assert client.get("/metrics").json()["ingest"]["rejected_requests"] >= 1
+
+
+def test_head_tail_flushed_when_task_finishes(controller):
+    """测试任务结束时追加暂存的最近日志，已有日志的偏移不变"""
+    controller.max_task_log_bytes = 100
+    controller.overflow = "head_tail"
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "ingest"})}).json()["id"]
+
+    main.ingest_logs(tasks[task_id], make_logs(20))
+    assert len(tasks[task_id].logs) == 5
+
+    client.put(f"/tasks/{task_id}", json={"status": "completed"})
+    contents = [log.content for log in tasks[task_id].logs]
+    assert contents[:5] == [f"line{i:05d}" for i in range(5)]
+    assert "省略了中间 10 行" in contents[5]
+    assert contents[6:] == [f"line{i:05d}" for i in range(15, 20)]
+
+
+def test_deleted_task_leaves_no_rate_limit_state(controller):
+    """测试向已删除任务发送日志时不建立任务限速状态"""
+    controller.task_lines_per_sec = 1000
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "ingest"})}).json()["id"]
+
+    with client.websocket_connect("/ws/sender") as sender:
+        sender.send_text(json.dumps({"task_id": task_id, "protocol": "json"}))
+        client.delete(f"/tasks/{task_id}")
+        sender.send_text(json.dumps({"type": "logs", "entries": [{"content": "迟到的日志"}]}))
+        with pytest.raises(Exception):
+            sender.receive_text()
+
+    assert task_id not in controller._task_limits
@@ -0,0 +1,171 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app, log_feeds
+import logfilter
+from logfilter import FilteredFeed, LogFilter
+from schemas import TaskLog
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_task():
+    """创建带日志的测试任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "filter"})})
+    task = response.json()
+    lines = [
+        ("2024-03-23T10:00:00", "INFO", "启动 worker"),
+        ("2024-03-23T10:00:01", "DEBUG", "读取配置"),
+        ("2024-03-23T10:00:02", "WARNING", "磁盘空间不足"),
+        ("2024-03-23T10:00:03", "ERROR", "worker 异常退出 code=137"),
+        ("2024-03-23T10:00:04", "INFO", "END_SIGNAL"),
+    ]
+    for ts, level, content in lines:
+        client.post(f"/tasks/{task['id']}/log", json={
+            "timestamp": ts, "level": level, "content": content})
+    return task
+
+
+def test_get_logs_with_level_and_text_filters(test_task):
+    """测试REST接口按级别、子串和正则过滤日志"""
+    task_id = test_task["id"]
+
+    logs = client.get(f"/tasks/{task_id}/logs", params={"level": "warning"}).json()
+    assert [log["content"] for log in logs] == ["磁盘空间不足", "worker 异常退出 code=137", "END_SIGNAL"]
+
+    logs = client.get(f"/tasks/{task_id}/logs", params={"contains": "worker"}).json()
+    assert [log["level"] for log in logs] == ["INFO", "ERROR", "INFO"]
+
+    logs = client.get(f"/tasks/{task_id}/logs", params={"regex": r"code=\d+"}).json()
+    assert [log["content"] for log in logs] == ["worker 异常退出 code=137", "END_SIGNAL"]
+
+    logs = client.get(f"/tasks/{task_id}/logs", params={
+        "since": "2024-03-23T10:00:01", "until": "2024-03-23T10:00:02"}).json()
+    assert [log["content"] for log in logs] == ["读取配置", "磁盘空间不足"]
+
+
+def test_get_logs_invalid_filter(test_task):
+    """测试无效的过滤条件返回400"""
+    response = client.get(f"/tasks/{test_task['id']}/logs", params={"regex": "("})
+    assert response.status_code == 400
+
+    response = client.get(f"/tasks/{test_task['id']}/logs", params={"since": "昨天"})
+    assert response.status_code == 400
+
+
+def test_regex_is_not_vulnerable_to_backtracking(monkeypatch):
+    """测试回溯型正则不会卡住匹配；没有RE2时拒绝这类写法"""
+    line = TaskLog(timestamp="2024-03-23T10:00:00", level="INFO", content="a" * 50 + "!")
+    if logfilter.re2 is not None:
+        assert not LogFilter(regex=r"(a+)+$").matches(line, None)
+
+    monkeypatch.setattr(logfilter, "re2", None)
+    for pattern in (r"(a+)+$", r"(a|aa)*$", r"(a)\1"):
+        with pytest.raises(ValueError):
+            LogFilter(regex=pattern)
+    assert LogFilter(regex=r"code=\d+ (ok|fail)").matches(
+        TaskLog(timestamp="", level="INFO", content="code=1 ok"), None)
+
+
+def test_sampling_summarizes_dropped_lines():
+    """测试限速采样，超出的行汇总为一条摘要"""
+    logs = [TaskLog(timestamp=f"2024-03-23T10:00:0{i // 5}", level="INFO", content=f"line {i}")
+            for i in range(10)]
+    feed = FilteredFeed(LogFilter(rate=2))
+    feed.advance(logs)
+    assert feed.items == [0, 1, (4, 3), 5, 6, (9, 3)]
+
+    # 增量追加只处理新日志
+    logs.append(TaskLog(timestamp="2024-03-23T10:00:05", level="INFO", content="line 10"))
+    assert feed.advance(logs) == 1
+    assert feed.items[-1] == 10
+
+
+def test_receiver_filter_is_shared(test_task):
+    """测试相同过滤条件的接收者共享同一份过滤结果"""
+    task_id = test_task["id"]
+    init = {"task_id": task_id, "protocol": "json", "follow": False,
+            "filter": {"level": "ERROR"}}
+
+    with client.websocket_connect("/ws/receiver") as first, \
+            client.websocket_connect("/ws/receiver") as second:
+        first.send_text(json.dumps(init))
+        second.send_text(json.dumps(init))
+        messages = [json.loads(first.receive_text()), json.loads(second.receive_text())]
+        for receiver in (first, second):
+            end = json.loads(receiver.receive_text())
+            assert end["type"] == "end"
+
+    for message in messages:
+        assert [entry["content"] for entry in message["entries"]] == [
+            "worker 异常退出 code=137", "END_SIGNAL"]
+        assert [entry["offset"] for entry in message["entries"]] == [3, 4]
+    assert log_feeds.stats() == {"feeds": 0, "subscribers": 0}
+
+    feed = log_feeds.subscribe(task_id, LogFilter(level="ERROR"))
+    assert log_feeds.subscribe(task_id, LogFilter(level="error")) is feed
+    assert log_feeds.stats() == {"feeds": 1, "subscribers": 2}
+    log_feeds.unsubscribe(task_id, feed)
+    log_feeds.unsubscribe(task_id, feed)
+
+
+def test_receiver_invalid_filter(test_task):
+    """测试接收者过滤条件无效时连接被关闭"""
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({"task_id": test_task["id"], "filter": {"rate": -1}}))
+        message = receiver.receive()
+    assert message["type"] == "websocket.close"
+    assert message["code"] == 1003
+
+
+def test_replacing_logs_resets_shared_feeds(test_task):
+    """测试整体替换日志（即使不比原来短）后共享的过滤结果重新计算"""
+    task_id = test_task["id"]
+    feed = log_feeds.subscribe(task_id, LogFilter(level="ERROR"))
+    try:
+        logs = client.get(f"/tasks/{task_id}/logs").json()
+        feed.advance([TaskLog(**log) for log in logs])
+        assert feed.items == [3, 4]
+
+        replaced = [{"timestamp": f"2024-03-23T11:00:0{i}", "level": level, "content": f"line {i}"}
+                    for i, level in enumerate(["INFO", "ERROR", "INFO", "INFO", "INFO", "INFO"])]
+        client.put(f"/tasks/{task_id}", json={"logs": replaced})
+        feed.advance([TaskLog(**log) for log in replaced])
+        assert feed.items == [1]
+    finally:
+        log_feeds.unsubscribe(task_id, feed)
+
+
+def test_feed_scans_in_chunks_and_backfills():
+    """测试过滤结果从指定偏移开始分块过滤，需要更早的偏移时向前补扫"""
+    logs = [TaskLog(timestamp="", level="ERROR" if i % 2 == 0 else "INFO", content=f"line {i}")
+            for i in range(100)]
+    feed = FilteredFeed(LogFilter(level="ERROR"))
+    feed.advance(logs, from_offset=60, limit=10)
+    assert (feed.start, feed.scanned) == (60, 70)
+    assert not feed.covers(60, len(logs))
+    while not feed.covers(60, len(logs)):
+        feed.advance(logs, from_offset=60, limit=10)
+    assert feed.items == list(range(60, 100, 2))
+
+    while not feed.covers(20, len(logs)):
+        feed.advance(logs, from_offset=20, limit=15)
+    assert feed.items == list(range(20, 100, 2))
+    assert feed.offsets == feed.items
+
+
+def test_receiver_time_range_feed_starts_at_window(test_task):
+    """测试带时间范围的接收者从时间索引圈定的第一行开始过滤"""
+    task_id = test_task["id"]
+    log_filter = {"level": "ERROR", "since": "2024-03-23T10:00:03"}
+    feed = log_feeds.subscribe(task_id, LogFilter(**log_filter))
+    try:
+        with client.websocket_connect("/ws/receiver") as receiver:
+            receiver.send_text(json.dumps({"task_id": task_id, "protocol": "json", "follow": False,
+                                           "filter": log_filter}))
+            message = json.loads(receiver.receive_text())
+            assert [entry["offset"] for entry in message["entries"]] == [3, 4]
+        assert feed.start == 3
+    finally:
+        log_feeds.unsubscribe(task_id, feed)
@@ -0,0 +1,170 @@
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from main import app, sender_streams
+import framing
+import json
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def test_task():
+    """创建测试任务"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "framing"})})
+    return response.json()
+
+
+def test_msgpack_sender_and_receiver(test_task):
+    """测试通过子协议协商MessagePack批量帧"""
+    msgpack = pytest.importorskip("msgpack")
+    task_id = test_task["id"]
+
+    with client.websocket_connect("/ws/sender", subprotocols=["logs.msgpack"]) as sender:
+        sender.send_text(json.dumps({"task_id": task_id}))
+        sender.send_bytes(msgpack.packb({"type": "logs", "entries": [
+            {"content": "第一行", "level": "INFO"},
+            {"content": "第二行", "level": "ERROR", "ts": "2024-03-23T10:00:00"},
+            {"content": "END_SIGNAL"},
+        ]}))
+
+    logs = client.get(f"/tasks/{task_id}/logs").json()
+    assert [log["content"] for log in logs] == ["第一行", "第二行", "END_SIGNAL"]
+    assert logs[1]["level"] == "ERROR"
+    assert logs[1]["timestamp"] == "2024-03-23T10:00:00"
+
+    with client.websocket_connect("/ws/receiver", subprotocols=["logs.msgpack"]) as receiver:
+        receiver.send_text(json.dumps({"task_id": task_id}))
+        message = msgpack.unpackb(receiver.receive_bytes())
+
+    assert message["type"] == "logs"
+    assert [entry["offset"] for entry in message["entries"]] == [0, 1, 2]
+    assert message["entries"][1] == {
+        "offset": 1, "ts": "2024-03-23T10:00:00", "level": "ERROR", "content": "第二行"}
+
+
+def test_json_framing_via_init_message(test_task):
+    """测试通过初始化消息选择JSON帧格式"""
+    task_id = test_task["id"]
+    client.post(f"/tasks/{task_id}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "END_SIGNAL", "level": "info"})
+
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({"task_id": task_id, "protocol": "json"}))
+        message = json.loads(receiver.receive_text())
+
+    assert message["entries"][0]["content"] == "END_SIGNAL"
+
+
+def test_subprotocol_falls_back_to_json(test_task, monkeypatch):
+    """测试服务端没有 msgpack 时，同时提供两种子协议的客户端协商为JSON"""
+    monkeypatch.setattr(framing, "msgpack", None)
+    task_id = test_task["id"]
+    client.post(f"/tasks/{task_id}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "END_SIGNAL", "level": "info"})
+
+    with client.websocket_connect("/ws/receiver", subprotocols=["logs.msgpack", "logs.json"]) as receiver:
+        assert receiver.accepted_subprotocol == "logs.json"
+        receiver.send_text(json.dumps({"task_id": task_id}))
+        message = json.loads(receiver.receive_text())
+
+    assert message["entries"][0]["content"] == "END_SIGNAL"
+
+
+def test_unsupported_framing(test_task):
+    """测试请求不支持的帧格式时连接被关闭"""
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({"task_id": test_task["id"], "protocol": "xml"}))
+        with pytest.raises(Exception):
+            receiver.receive_text()
+
+
+def test_resumable_stream_acks_and_dedupes(test_task):
+    """测试带stream_id的发送流：确认序号、重连续传时丢弃重复行"""
+    task_id = test_task["id"]
+    init = json.dumps({"task_id": task_id, "protocol": "json", "stream_id": "s1"})
+
+    with client.websocket_connect("/ws/sender") as sender:
+        sender.send_text(init)
+        assert json.loads(sender.receive_text()) == {"type": "ready", "seq": 0}
+        sender.send_text(json.dumps({"type": "logs", "seq": 0, "entries": [
+            {"content": "行0"}, {"content": "行1"}]}))
+        assert json.loads(sender.receive_text()) == {"type": "ack", "seq": 2}
+
+    # 重连后服务端报告已接收的序号，重复发送的行被丢弃
+    with client.websocket_connect("/ws/sender") as sender:
+        sender.send_text(init)
+        assert json.loads(sender.receive_text()) == {"type": "ready", "seq": 2}
+        sender.send_text(json.dumps({"type": "logs", "seq": 1, "entries": [
+            {"content": "行1"}, {"content": "行2"}]}))
+        assert json.loads(sender.receive_text()) == {"type": "ack", "seq": 3}
+
+        # 序号跳跃说明有数据丢失，连接被关闭
+        sender.send_text(json.dumps({"type": "logs", "seq": 5, "entries": [
+            {"content": "行5"}]}))
+        with pytest.raises(Exception):
+            sender.receive_text()
+
+    logs = client.get(f"/tasks/{task_id}/logs").json()
+    assert [log["content"] for log in logs] == ["行0", "行1", "行2"]
+
+    # 任务结束或删除后不再保留续传位置
+    assert "s1" in sender_streams[task_id]
+    client.put(f"/tasks/{task_id}", json={"status": "completed"})
+    assert task_id not in sender_streams
+
+
+def test_receiver_from_offset_and_end_status(test_task):
+    """测试接收者从指定偏移读取，并在任务结束时收到最终状态"""
+    task_id = test_task["id"]
+    for i in range(3):
+        client.post(f"/tasks/{task_id}/log", json={
+            "timestamp": "2024-03-23T10:00:00", "content": f"行{i}", "level": "info"})
+
+    # 不跟随时读完现有日志即结束
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({
+            "task_id": task_id, "protocol": "json", "from_offset": 1, "follow": False}))
+        message = json.loads(receiver.receive_text())
+        assert [entry["offset"] for entry in message["entries"]] == [1, 2]
+        assert json.loads(receiver.receive_text()) == {
+            "type": "end", "status": "pending", "offset": 3}
+
+    # 任务失败后跟随模式的接收者收到最终状态
+    client.put(f"/tasks/{task_id}", json={"status": "failed"})
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({
+            "task_id": task_id, "protocol": "json", "from_offset": 3}))
+        assert json.loads(receiver.receive_text()) == {
+            "type": "end", "status": "failed", "offset": 3}
+
+
+def test_receiver_invalid_from_offset(test_task):
+    """测试起始偏移不是整数时以1003关闭连接并给出原因"""
+    with client.websocket_connect("/ws/receiver") as receiver:
+        receiver.send_text(json.dumps({
+            "task_id": test_task["id"], "protocol": "json", "from_offset": "abc"}))
+        with pytest.raises(WebSocketDisconnect) as e:
+            receiver.receive_text()
+    assert e.value.code == 1003
+    assert "起始偏移" in e.value.reason
+
+
+@pytest.mark.parametrize("batch", [
+    {"type": "logs", "entries": [{"level": "INFO"}]},
+    {"type": "logs", "entries": ["行0"]},
+    {"type": "logs", "entries": {"content": "行0"}},
+    {"type": "logs", "seq": "0", "entries": [{"content": "行0"}]},
+    ["行0"],
+])
+def test_sender_invalid_batch(test_task, batch):
+    """测试发送端的日志条目缺少 content 或序号不是整数时以1003关闭连接"""
+    task_id = test_task["id"]
+    with client.websocket_connect("/ws/sender") as sender:
+        sender.send_text(json.dumps({"task_id": task_id, "protocol": "json", "stream_id": "bad"}))
+        assert json.loads(sender.receive_text()) == {"type": "ready", "seq": 0}
+        sender.send_text(json.dumps(batch))
+        with pytest.raises(WebSocketDisconnect) as e:
+            sender.receive_text()
+    assert e.value.code == 1003
+    assert client.get(f"/tasks/{task_id}/logs").json() == []
@@ -0,0 +1,90 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from search import LogIndex
+from schemas import Task, TaskLog
+import json
+
+client = TestClient(app)
+
+
+def create_task_with_logs(lines):
+    response = client.post("/tasks", data={"params": json.dumps({"test": "search"})})
+    task = response.json()
+    for ts, level, content in lines:
+        client.post(f"/tasks/{task['id']}/log", json={
+            "timestamp": ts, "level": level, "content": content})
+    return task
+
+
+@pytest.fixture
+def tasks_with_logs():
+    """创建两个带日志的任务，其中一个已完成"""
+    first = create_task_with_logs([
+        ("2024-03-23T10:00:00", "INFO", "连接 redis 成功"),
+        ("2024-03-23T10:00:05", "ERROR", "Kafka consumer timeout after 30s"),
+    ])
+    second = create_task_with_logs([
+        ("2024-03-23T11:00:00", "WARNING", "kafka CONSUMER lag 1200"),
+        ("2024-03-23T11:00:01", "ERROR", "数据库连接超时"),
+    ])
+    client.put(f"/tasks/{second['id']}", json={"status": "completed"})
+    return first, second
+
+
+def test_search_across_tasks(tasks_with_logs):
+    """测试跨任务检索，英文不区分大小写，中文按子串匹配"""
+    first, second = tasks_with_logs
+
+    result = client.get("/logs:search", params={"q": "kafka consumer"}).json()
+    hits = [(hit["task_id"], hit["offset"]) for hit in result["hits"]]
+    assert (first["id"], 1) in hits
+    assert (second["id"], 0) in hits
+    assert result["truncated"] is False
+
+    result = client.get("/logs:search", params={"q": "连接超时"}).json()
+    assert [(hit["task_id"], hit["offset"]) for hit in result["hits"]] == [(second["id"], 1)]
+    assert result["hits"][0]["snippet"] == "数据库连接超时"
+
+
+def test_search_filters(tasks_with_logs):
+    """测试按任务状态、日志级别和时间范围过滤"""
+    first, second = tasks_with_logs
+
+    result = client.get("/logs:search", params={"q": "kafka", "status": "completed"}).json()
+    assert {hit["task_id"] for hit in result["hits"]} >= {second["id"]}
+    assert first["id"] not in {hit["task_id"] for hit in result["hits"]}
+
+    result = client.get("/logs:search", params={"q": "kafka", "level": "error"}).json()
+    assert second["id"] not in {hit["task_id"] for hit in result["hits"]}
+
+    result = client.get("/logs:search", params={
+        "q": "kafka", "since": "2024-03-23T10:30:00", "until": "2024-03-23T11:30:00"}).json()
+    assert first["id"] not in {hit["task_id"] for hit in result["hits"]}
+
+    response = client.get("/logs:search", params={"q": "kafka", "since": "昨天"})
+    assert response.status_code == 400
+
+
+def test_index_follows_replace_and_delete(tasks_with_logs):
+    """测试日志被替换或任务被删除后索引同步更新"""
+    first, _ = tasks_with_logs
+    client.put(f"/tasks/{first['id']}", json={"logs": [
+        {"timestamp": "2024-03-23T12:00:00", "content": "zookeeper session expired"}]})
+    result = client.get("/logs:search", params={"q": "zookeeper"}).json()
+    assert (first["id"], 0) in [(hit["task_id"], hit["offset"]) for hit in result["hits"]]
+    assert client.get(f"/tasks/{first['id']}/logs").json()[0]["content"] == "zookeeper session expired"
+
+    client.delete(f"/tasks/{first['id']}")
+    result = client.get("/logs:search", params={"q": "zookeeper"}).json()
+    assert first["id"] not in {hit["task_id"] for hit in result["hits"]}
+
+
+def test_search_limit():
+    """测试命中数超过limit时截断"""
+    index = LogIndex()
+    logs = [TaskLog(timestamp="2024-03-23T10:00:00", content=f"retry {i}") for i in range(5)]
+    index.add("t1", 0, logs)
+    result = index.search("retry", {"t1": Task(id="t1", logs=logs)}, limit=3)
+    assert [hit["offset"] for hit in result["hits"]] == [0, 1, 2]
+    assert result["truncated"] is True
@@ -0,0 +1,62 @@
+from fastapi.testclient import TestClient
+import main
+from main import app, tasks
+from memory import LOG_OVERHEAD, MemoryAccounting
+from schemas import TaskLog
+import json
+
+client = TestClient(app)
+
+
+def test_accounting_totals_and_top():
+    """测试增量记账的总量、按任务移除和取占用最多的任务"""
+    accounting = MemoryAccounting()
+    accounting.add("a", "logs", 100)
+    accounting.add("b", "logs", 50)
+    accounting.set("b", "result", 500)
+    accounting.set("b", "result", 300)
+    accounting.add("c", "params", 10)
+
+    assert accounting.total_bytes == 460
+    assert accounting.top(2) == [("b", 350), ("a", 100)]
+    assert accounting.usage("b")["result"] == 300
+
+    accounting.remove("b")
+    assert accounting.total_bytes == 110
+    assert accounting.totals["result"] == 0
+    assert accounting.top(5) == [("a", 100), ("c", 10)]
+
+
+def test_documents_measured_only_when_replaced():
+    """测试 params/result 对象未替换时不重新估算"""
+    accounting = MemoryAccounting()
+    params = {"name": "x"}
+    accounting.measure_documents("a", params, None)
+    first = accounting.usage("a")["params"]
+    params["padding"] = "y" * 1000
+    accounting.measure_documents("a", params, None)
+    assert accounting.usage("a")["params"] == first
+    accounting.measure_documents("a", dict(params), {"ok": True})
+    assert accounting.usage("a")["params"] > first
+    assert accounting.usage("a")["result"] > 0
+
+
+def test_memory_endpoint_follows_task():
+    """测试日志和结果写入后任务出现在占用排行中，删除后总量回落"""
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "memory"})}).json()["id"]
+    main.append_logs(tasks[task_id], [
+        TaskLog(timestamp="2024-03-23T10:00:00", content="x" * 10000) for _ in range(200)])
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"rows": list(range(1000))})})
+
+    report = client.get("/memory", params={"top": 1}).json()
+    heavy = report["top"][0]
+    assert heavy["task_id"] == task_id
+    assert heavy["log_count"] == 200
+    assert heavy["logs"] >= 200 * (10000 + LOG_OVERHEAD)
+    assert heavy["result"] > 0
+    assert heavy["bytes"] == heavy["logs"] + heavy["params"] + heavy["result"] + heavy["pending"]
+
+    client.delete(f"/tasks/{task_id}")
+    after = client.get("/memory").json()
+    assert after["total_bytes"] <= report["total_bytes"] - heavy["bytes"]
+    assert task_id not in [item["task_id"] for item in after["top"]]
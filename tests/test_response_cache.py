@@ -0,0 +1,57 @@
+from fastapi.testclient import TestClient
+from main import app
+from cache import ResponseCache
+import json
+
+client = TestClient(app)
+
+
+def test_cache_evicts_by_bytes():
+    """测试按字节上限淘汰最久未使用的条目"""
+    cache = ResponseCache(max_bytes=10)
+    cache.put("1", 1, "task", b"aaaa")
+    cache.put("2", 1, "task", b"bbbb")
+    assert cache.get("1", 1, "task") == b"aaaa"
+
+    cache.put("3", 1, "task", b"cccc")
+    assert cache.get("2", 1, "task") is None
+    assert cache.get("1", 1, "task") == b"aaaa"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+    # 超过上限的条目不缓存
+    cache.put("4", 1, "task", b"x" * 11)
+    assert cache.get("4", 1, "task") is None
+
+
+def test_cache_invalidate_task():
+    """测试按任务失效所有视图"""
+    cache = ResponseCache()
+    cache.put("1", 1, "task", b"{}")
+    cache.put("1", 1, "result", b"{}")
+    cache.put("2", 1, "task", b"{}")
+
+    cache.invalidate("1")
+    assert cache.get("1", 1, "task") is None
+    assert cache.get("1", 1, "result") is None
+    assert cache.get("2", 1, "task") == b"{}"
+    assert cache.stats()["entries"] == 1
+
+
+def test_task_view_cache_hits_and_invalidation():
+    """测试读取命中缓存、写入后返回新内容"""
+    task_id = client.post("/tasks", data={"params": json.dumps({"name": "缓存"})}).json()["id"]
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"v": 1})})
+
+    before = client.get("/metrics").json()["response_cache"]
+    assert client.get(f"/tasks/{task_id}/result").json() == {"v": 1}
+    assert client.get(f"/tasks/{task_id}/result").json() == {"v": 1}
+    after = client.get("/metrics").json()["response_cache"]
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"v": 2})})
+    assert client.get(f"/tasks/{task_id}/result").json() == {"v": 2}
+
+    client.delete(f"/tasks/{task_id}")
+    assert client.get(f"/tasks/{task_id}/result").status_code == 404
@@ -0,0 +1,150 @@
+import pytest
+from fastapi.testclient import TestClient
+import main
+from main import app, blobs, tasks
+from retention import ExpiryQueue, parse_duration, parse_ttl
+import asyncio
+import json
+import os
+import time
+import uuid
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def policy():
+    """测试期间修改保留策略，结束后恢复"""
+    policy = main.retention_policy
+    saved = policy.describe()
+    yield policy
+    policy.ttl = saved["ttl"]
+    policy.max_tasks = saved["max_tasks"]
+    policy.max_upload_bytes = saved["max_upload_bytes"]
+    policy.orphan_grace = saved["orphan_grace"]
+
+
+def create_task(status: str, content: bytes = None) -> dict:
+    files = {"file": ("input.bin", content)} if content is not None else None
+    task = client.post("/tasks", data={"params": json.dumps({"test": "retention"})}, files=files).json()
+    client.put(f"/tasks/{task['id']}", json={"status": status})
+    return task
+
+
+def test_parse_policy():
+    """测试时长和TTL配置解析"""
+    assert parse_duration("90") == 90
+    assert parse_duration("30m") == 1800
+    assert parse_duration("7d") == 7 * 86400
+    assert parse_ttl("completed=7d, failed=1h,running=0") == {"completed": 7 * 86400, "failed": 3600}
+    with pytest.raises(ValueError):
+        parse_duration("soon")
+    with pytest.raises(ValueError):
+        parse_ttl("complted=7d")
+
+
+def test_expiry_queue_reschedule():
+    """测试重新设置过期时间后旧条目失效"""
+    queue = ExpiryQueue()
+    queue.schedule("a", 10)
+    queue.schedule("b", 20)
+    queue.schedule("a", 30)
+    queue.schedule("c", 5)
+    queue.cancel("c")
+    assert queue.next_deadline() == 20
+    assert queue.pop_expired(25) == ["b"]
+    assert queue.pop_expired(100) == ["a"]
+    assert len(queue) == 0
+
+
+def test_expired_task_removed_with_files(policy):
+    """测试到期的任务连同只被它引用的文件一起删除"""
+    policy.ttl = {"failed": 60}
+    content = f"过期任务 {uuid.uuid4()}".encode("utf-8") * 100
+    task = create_task("failed", content)
+    kept = create_task("completed")
+    path = client.get(f"/tasks/{task['id']}").json()["params"]["file_path"]
+
+    client.post("/retention:sweep")
+    assert task["id"] in tasks
+
+    report = asyncio.run(main.sweep_retention(time.time() + 120))
+    assert report["expired"] >= 1
+    assert report["bytes_freed"] >= len(content)
+    assert task["id"] not in tasks
+    assert kept["id"] in tasks
+    assert not os.path.exists(path)
+
+
+def test_orphan_blob_reclaimed(policy):
+    """测试没有任务引用的文件在宽限期后回收"""
+    policy.orphan_grace = 3600
+    content = f"无引用文件 {uuid.uuid4()}".encode("utf-8") * 100
+    digest = client.post("/blobs", files={"file": ("orphan.bin", content)}).json()["sha256"]
+
+    client.post("/retention:sweep")
+    assert os.path.exists(blobs.path(digest))
+
+    policy.orphan_grace = 0
+    report = client.post("/retention:sweep").json()
+    assert report["orphan_blobs"] >= 1
+    assert report["bytes_freed"] >= len(content)
+    assert not os.path.exists(blobs.path(digest))
+    assert client.get("/retention").json()["totals"]["bytes_freed"] >= len(content)
+
+
+def test_max_tasks_evicts_oldest_finished(policy):
+    """测试超过任务数上限时从最早的已结束任务开始删除，不删除运行中的任务"""
+    running = create_task("running")
+    first = create_task("completed")
+    second = create_task("completed")
+    older_finished = [task_id for task_id in main.task_order
+                      if tasks[task_id].status in main.TERMINAL_STATUSES and task_id < first["id"]]
+
+    # 改回未结束状态的任务不参与淘汰
+    reopened = create_task("completed")
+    client.put(f"/tasks/{reopened['id']}", json={"status": "pending"})
+    assert list(main.finished_order) == [task_id for task_id in main.task_order
+                                         if tasks[task_id].status in main.TERMINAL_STATUSES]
+
+    policy.max_tasks = len(tasks) - len(older_finished) - 1
+    report = client.post("/retention:sweep").json()
+
+    assert report["evicted"] == len(older_finished) + 1
+    assert first["id"] not in tasks
+    assert second["id"] in tasks
+    assert running["id"] in tasks
+    assert reopened["id"] in tasks
+
+
+def test_max_upload_bytes_only_evicts_tasks_that_free_bytes(policy):
+    """测试超过磁盘上限时只淘汰能释放文件的已结束任务，释放不了时停止而不是删光已结束任务"""
+    running_content = f"运行中 {uuid.uuid4()}".encode("utf-8") * 500
+    running = create_task("running", running_content)
+    without_files = [create_task("completed") for _ in range(10)]
+    content = f"已结束 {uuid.uuid4()}".encode("utf-8") * 100
+    with_file = create_task("completed", content)
+    # 与运行中任务共享同一个文件的已结束任务，删除它释放不了任何字节
+    shared = create_task("completed", running_content)
+
+    policy.max_upload_bytes = 1024
+    report = client.post("/retention:sweep").json()
+
+    assert with_file["id"] not in tasks
+    assert report["bytes_freed"] >= len(content)
+    assert running["id"] in tasks
+    assert shared["id"] in tasks
+    assert all(task["id"] in tasks for task in without_files)
+    assert blobs.total_bytes > policy.max_upload_bytes
+
+
+def test_added_log_reschedules_expiry(policy):
+    """测试通过REST写入日志后从写入时间重新计算过期时间"""
+    policy.ttl = {"running": 60}
+    task = create_task("running")
+    deadline = main.expiry_queue.deadline(task["id"])
+
+    time.sleep(0.01)
+    client.post(f"/tasks/{task['id']}/log", json={
+        "timestamp": "2024-03-23T10:00:00", "content": "仍在运行", "level": "info"})
+    assert main.expiry_queue.deadline(task["id"]) > deadline
@@ -0,0 +1,110 @@
+import pytest
+import httpx
+from main import app
+from sdk import AsyncTaskClient, LogStreamSender, TaskClient, TaskClientError
+import asyncio
+import os
+
+
+@pytest.fixture
+def sdk_client():
+    """通过ASGI传输直接调用应用的同步SDK客户端"""
+    with TaskClient("http://testserver", transport=httpx.ASGITransport(app=app),
+                    retries=0) as client:
+        yield client
+
+
+@pytest.fixture
+def test_file(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("SDK上传的文件内容", encoding="utf-8")
+    return str(path)
+
+
+def test_task_lifecycle(sdk_client, test_file, tmp_path):
+    """测试通过SDK完成创建、更新、提交结果和下载"""
+    task = sdk_client.create_task({"name": "SDK任务"}, file_path=test_file)
+    task_id = task["id"]
+    assert task["params"]["name"] == "SDK任务"
+
+    updated = sdk_client.update_task(task_id, status="running")
+    assert updated["status"] == "running"
+
+    sdk_client.add_log(task_id, "开始处理")
+    assert sdk_client.get_logs(task_id)[0]["content"] == "开始处理"
+
+    sdk_client.submit_result(task_id, {"ok": True}, file_path=test_file)
+    assert sdk_client.get_result(task_id)["ok"] is True
+
+    output = str(tmp_path / "result.txt")
+    sdk_client.download_result_file(task_id, output)
+    with open(output, encoding="utf-8") as f:
+        assert f.read() == "SDK上传的文件内容"
+
+    for path in (task["params"]["file_path"], sdk_client.get_result(task_id)["file_path"]):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def test_error_raises_task_client_error(sdk_client, tmp_path):
+    """测试服务端错误转换为TaskClientError"""
+    with pytest.raises(TaskClientError) as exc_info:
+        sdk_client.get_result("non_existent_task")
+    assert exc_info.value.status_code == 404
+    assert exc_info.value.detail == "任务不存在"
+
+    with pytest.raises(TaskClientError):
+        sdk_client.download_file("non_existent_task", str(tmp_path / "missing"))
+
+
+def test_post_not_retried_after_read_timeout():
+    """测试非幂等请求读超时后不重发，连接失败时重发；GET 读超时后重试"""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if len(calls) == 1:
+            raise httpx.ReadTimeout("读取超时", request=request)
+        if request.url.path == "/tasks:batch":
+            return httpx.Response(200, json={"tasks": [{"id": "1"}]})
+        return httpx.Response(200, json={"id": "1"})
+
+    with TaskClient("http://testserver", transport=httpx.MockTransport(handler),
+                    backoff=0) as client:
+        with pytest.raises(httpx.ReadTimeout):
+            client.create_tasks([{"name": "批量"}])
+        assert calls == [("POST", "/tasks:batch")]
+
+        calls.clear()
+        assert client.get_task("1")["id"] == "1"
+        assert calls == [("GET", "/tasks/1")] * 2
+
+    calls.clear()
+
+    def refuse_once(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if len(calls) == 1:
+            raise httpx.ConnectError("连接被拒绝", request=request)
+        return httpx.Response(200, json={"tasks": [{"id": "1"}]})
+
+    with TaskClient("http://testserver", transport=httpx.MockTransport(refuse_once),
+                    backoff=0) as client:
+        client.create_tasks([{"name": "批量"}])
+        assert calls == [("POST", "/tasks:batch")] * 2
+
+
+def test_idle_sender_notices_closed_connection():
+    """测试空闲的发送端在连接关闭时立即返回，而不是等到下一批数据"""
+    async def run():
+        sender = LogStreamSender(AsyncTaskClient("http://testserver"), "task", "json")
+
+        async def closed():
+            # 发送端已进入空闲等待后连接才关闭
+            await asyncio.sleep(0.05)
+            raise ConnectionError("连接已关闭")
+
+        acks = asyncio.ensure_future(closed())
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(sender._next_batch(acks), 1)
+
+    asyncio.run(run())
@@ -0,0 +1,66 @@
+from fastapi.testclient import TestClient
+from main import app
+from stats import TaskStats, WINDOW_MINUTES
+import json
+
+client = TestClient(app)
+
+
+def test_transitions_update_counts_and_histograms():
+    """测试状态变化时更新计数、吞吐和时长分位数"""
+    stats = TaskStats()
+    now = 1_700_000_000.0
+    for i in range(10):
+        stats.transition(f"t{i}", "pending", now + i)
+    for i in range(5):
+        stats.transition(f"t{i}", "running", now + 20)
+        stats.transition(f"t{i}", "completed", now + 60)
+    stats.transition("t5", "running", now + 20)
+    stats.transition("t5", "failed", now + 30)
+    stats.remove("t9")
+
+    snapshot = stats.snapshot(now + 60)
+    assert snapshot["counts"] == {"pending": 3, "running": 0, "completed": 5, "failed": 1}
+    assert snapshot["total"] == 9
+    assert snapshot["throughput"]["completed"] == 5
+    assert snapshot["throughput"]["failed"] == 1
+    assert snapshot["queue_age"]["count"] == 3
+    assert snapshot["queue_age"]["oldest"] == 54
+    assert snapshot["wait_time"]["count"] == 6
+    assert 12.8 <= snapshot["wait_time"]["p50"] <= 25.6
+    assert snapshot["run_time"]["count"] == 6
+    assert snapshot["run_time"]["p99"] == 51.2
+
+    later = stats.snapshot(now + (WINDOW_MINUTES + 2) * 60)
+    assert later["throughput"]["completed"] == 0
+    assert later["wait_time"]["count"] == 0
+    assert later["counts"]["completed"] == 5
+
+
+def test_stats_endpoint_follows_tasks():
+    """测试接口统计随创建、状态更新和删除变化"""
+    before = client.get("/stats").json()
+    task_id = client.post("/tasks", data={"params": json.dumps({"test": "stats"})}).json()["id"]
+    client.put(f"/tasks/{task_id}", json={"status": "running"})
+    client.post(f"/tasks/{task_id}/result", data={"result_params": json.dumps({"ok": True})})
+    client.put(f"/tasks/{task_id}", json={"status": "completed"})
+
+    after = client.get("/stats").json()
+    assert after["counts"]["completed"] == before["counts"]["completed"] + 1
+    assert after["counts"]["pending"] == before["counts"]["pending"]
+    assert after["throughput"]["completed"] == before["throughput"]["completed"] + 1
+    assert after["run_time"]["count"] == before["run_time"]["count"] + 1
+
+    client.delete(f"/tasks/{task_id}")
+    assert client.get("/stats").json()["counts"]["completed"] == before["counts"]["completed"]
+
+
+def test_stats_pushed_on_change():
+    """测试统计变化后通过WebSocket推送"""
+    with client.websocket_connect("/ws/stats") as websocket:
+        first = websocket.receive_json()
+        assert first["type"] == "stats"
+        client.post("/tasks", data={"params": json.dumps({"test": "stats"})})
+        second = websocket.receive_json()
+        assert second["stats"]["version"] > first["stats"]["version"]
+        assert second["stats"]["counts"]["pending"] == first["stats"]["counts"]["pending"] + 1
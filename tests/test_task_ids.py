@@ -0,0 +1,95 @@
+import pytest
+import httpx
+from fastapi.testclient import TestClient
+from main import app
+from ids import IdGenerator, TaskOrder, id_time
+from sdk import TaskClient
+import json
+import time
+
+client = TestClient(app)
+
+
+def create_task(name: str) -> dict:
+    return client.post("/tasks", data={"params": json.dumps({"name": name})}).json()
+
+
+def test_ids_are_monotonic():
+    """测试同一毫秒内大量生成的ID唯一且按生成顺序排列"""
+    generator = IdGenerator()
+    ids = [generator.new() for _ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(len(task_id) == 26 for task_id in ids)
+    assert abs(id_time(ids[0]) - time.time()) < 5
+    assert id_time("42") is None
+
+
+def test_task_order_page():
+    """测试有序索引的分页和倒序"""
+    order = TaskOrder()
+    for task_id in ["b", "d", "a", "c"]:
+        order.add(task_id)
+    assert list(order) == ["a", "b", "c", "d"]
+    assert order.page(2) == ["a", "b"]
+    assert order.page(2, after="b") == ["c", "d"]
+    assert order.newest(3) == ["d", "c", "b"]
+    assert order.page(2, after="c", descending=True) == ["b", "a"]
+    order.remove("c")
+    assert order.page(after="b") == ["d"]
+    assert "d" in order and "c" not in order and "e" not in order
+
+
+def test_no_collision_after_delete():
+    """测试删除任务后新建任务不会覆盖已有任务"""
+    first = create_task("first")
+    second = create_task("second")
+    client.delete(f"/tasks/{first['id']}")
+    third = create_task("third")
+
+    assert third["id"] not in (first["id"], second["id"])
+    assert client.get(f"/tasks/{second['id']}").json()["params"]["name"] == "second"
+
+
+def test_newest_and_cursor_pagination():
+    """测试取最新任务和按游标遍历全部任务"""
+    created = [create_task(f"page{i}")["id"] for i in range(5)]
+
+    response = client.get("/tasks", params={"order": "desc", "limit": 2})
+    assert [task["id"] for task in response.json()] == created[:2:-1]
+    assert response.headers["x-next-cursor"] == created[3]
+
+    seen = []
+    params = {"limit": 3}
+    while True:
+        response = client.get("/tasks", params=params)
+        seen.extend(task["id"] for task in response.json())
+        if "x-next-cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["x-next-cursor"]
+    assert seen == [task["id"] for task in client.get("/tasks").json()]
+    assert seen == sorted(seen)
+    assert seen[-5:] == created
+
+
+def test_summary_view():
+    """测试摘要视图不含日志，只给出日志行数"""
+    task_id = create_task("summary")["id"]
+    log = {"timestamp": "2024-03-23T10:00:00", "content": "日志", "level": "info"}
+    client.post(f"/tasks/{task_id}/log", json=log)
+    client.post(f"/tasks/{task_id}/log", json=log)
+
+    summary = client.get("/tasks", params={"order": "desc", "limit": 1, "view": "summary"}).json()[0]
+    assert summary["id"] == task_id
+    assert summary["log_count"] == 2
+    assert "logs" not in summary
+
+
+def test_sdk_iter_tasks():
+    """测试SDK按游标分页遍历任务"""
+    created = [create_task(f"sdk{i}")["id"] for i in range(3)]
+    with TaskClient("http://testserver", transport=httpx.ASGITransport(app=app),
+                    retries=0) as sdk_client:
+        newest = [task["id"] for task in sdk_client.iter_tasks(order="desc", page_size=2)]
+        assert newest[:3] == created[::-1]
+        assert [task["id"] for task in sdk_client.list_tasks(limit=1, order="desc")] == created[-1:]
@@ -0,0 +1,72 @@
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from paramindex import TaskIndexes
+from schemas import Task
+import json
+
+client = TestClient(app)
+
+
+def test_field_index_equality_and_range():
+    """测试索引的等值、范围查询和更新后的增量维护"""
+    indexes = TaskIndexes(["status", "params.priority", "params.parameters.batch_size"])
+    for i, (priority, size) in enumerate([("high", 100), ("low", 500), ("high", 1000), ("low", "n/a")]):
+        indexes.add(Task(id=str(i), params={"priority": priority, "parameters": {"batch_size": size}}))
+
+    assert indexes.query([("params.priority", "eq", "high")], []) == {"0", "2"}
+    assert indexes.query([("params.parameters.batch_size", "gte", 500)], []) == {"1", "2"}
+    assert indexes.query([("params.parameters.batch_size", "lt", 500)], []) == {"0"}
+    assert indexes.query([("params.parameters.batch_size", "gt", 100),
+                          ("params.priority", "in", ["low"])], []) == {"1"}
+
+    indexes.add(Task(id="0", params={"priority": "low"}))
+    assert indexes.query([("params.priority", "eq", "high")], []) == {"2"}
+    assert indexes.query([("params.parameters.batch_size", "lte", 100)], []) == set()
+
+    indexes.remove("2")
+    assert indexes.group_counts("params.priority") == [{"value": "low", "count": 3}]
+
+    with pytest.raises(ValueError):
+        indexes.query([("params.name", "eq", "x")], [])
+
+
+def test_query_endpoint():
+    """测试按状态和参数查询任务并统计"""
+    created = []
+    for priority in ["high", "high", "low"]:
+        response = client.post("/tasks", data={"params": json.dumps(
+            {"type": "query_test", "priority": priority, "parameters": {"batch_size": len(created)}})})
+        created.append(response.json()["id"])
+    client.put(f"/tasks/{created[1]}", json={"status": "running"})
+
+    response = client.post("/tasks:query", json={
+        "where": [{"field": "params.type", "value": "query_test"},
+                  {"field": "params.priority", "value": "high"}],
+        "group_by": "status"})
+    body = response.json()
+    assert body["count"] == 2
+    assert [task["id"] for task in body["items"]] == created[:2]
+    assert sorted((g["value"], g["count"]) for g in body["groups"]) == [("pending", 1), ("running", 1)]
+
+    body = client.post("/tasks:query", json={
+        "where": [{"field": "status", "value": "running"},
+                  {"field": "params.type", "value": "query_test"}],
+        "view": "id"}).json()
+    assert body == {"count": 1, "items": [created[1]]}
+
+    response = client.post("/tasks:query", json={
+        "where": [{"field": "params.parameters.batch_size", "op": "gte", "value": 1}]})
+    assert response.status_code == 400
+
+    response = client.post("/indexes", json={"field": "params.parameters.batch_size"})
+    assert response.status_code == 200
+    body = client.post("/tasks:query", json={
+        "where": [{"field": "params.type", "value": "query_test"},
+                  {"field": "params.parameters.batch_size", "op": "gte", "value": 1}],
+        "view": "id", "limit": 1}).json()
+    assert body == {"count": 2, "items": [created[1]]}
+
+    body = client.post("/tasks:query", json={
+        "where": [{"field": "params.type", "value": "query_test"}], "limit": 0}).json()
+    assert body == {"count": 3, "items": []}
@@ -1,5 +1,6 @@
 import pytest
 from fastapi.testclient import TestClient
+import main
 from main import app
 import json
 from datetime import datetime
@@ -153,3 +154,51 @@ def test_get_task_result_file_not_found(test_task):
 
     assert response.status_code == 404
     assert response.json()["detail"] == "任务结果没有关联的文件"
+
+
+def test_get_task_result_by_pointer(test_task):
+    """测试按JSON Pointer读取结果节点和分页读取数组"""
+    task_id = test_task["id"]
+    with open("tests/data/task_result.json", encoding="utf-8") as f:
+        result = json.load(f)
+    result["output"]["details"] = [{"id": i, "value": i * 100} for i in range(25)]
+    client.post(
+        f"/tasks/{task_id}/result",
+        data={"result_params": json.dumps(result)}
+    )
+
+    response = client.get(f"/tasks/{task_id}/result", params={"pointer": "/output/summary"})
+    assert response.status_code == 200
+    assert response.json() == result["output"]["summary"]
+    assert client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/details/3/value"}).json() == 300
+
+    response = client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/details", "offset": 20, "limit": 10})
+    assert [item["id"] for item in response.json()] == list(range(20, 25))
+    assert response.headers["x-total-count"] == "25"
+    assert "x-next-offset" not in response.headers
+
+    response = client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/details", "limit": 10})
+    assert response.headers["x-next-offset"] == "10"
+
+    assert client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/missing"}).status_code == 404
+    assert client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "output"}).status_code == 400
+    assert client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/summary", "limit": 10}).status_code == 400
+
+
+def test_result_offset_without_limit_uses_page_size(test_task, monkeypatch):
+    """测试只带 offset 时按单页上限返回并给出下一页偏移"""
+    monkeypatch.setattr(main, "MAX_RESULT_PAGE_SIZE", 10)
+    task_id = test_task["id"]
+    client.post(f"/tasks/{task_id}/result", data={
+        "result_params": json.dumps({"output": {"details": list(range(25))}})})
+
+    response = client.get(f"/tasks/{task_id}/result", params={
+        "pointer": "/output/details", "offset": 5})
+    assert response.json() == list(range(5, 15))
+    assert response.headers["x-next-offset"] == "15"
@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+from main import app, time_index
+from timeindex import TaskTimeline, TAIL_MERGE_SIZE
+from logfilter import parse_time
+import json
+import random
+
+client = TestClient(app)
+
+
+def test_timeline_window():
+    """测试有序和乱序时间戳下的时间窗口查询"""
+    timeline = TaskTimeline()
+    for epoch in [10, 20, 20, 30, 40]:
+        timeline.append(epoch)
+    assert timeline.ordered
+    assert timeline.window(20, 30) == range(1, 4)
+    assert timeline.window(None, 15) == range(0, 1)
+    assert list(timeline.window(50, None)) == []
+
+    timeline.append(25)
+    assert not timeline.ordered
+    assert list(timeline.window(20, 30)) == [1, 2, 3, 5]
+    assert list(timeline.window(None, None)) == [0, 1, 2, 3, 4, 5]
+
+
+def test_unordered_timeline_is_not_resorted_per_append():
+    """测试乱序后继续写入时不重建排序排列，查询结果与逐行扫描一致"""
+    rng = random.Random(7)
+    timeline = TaskTimeline()
+    epochs = [float(i) for i in range(100)] + [50.5]
+    for epoch in epochs:
+        timeline.append(epoch)
+    timeline.window(None, None)
+    order = timeline._order
+
+    for i in range(TAIL_MERGE_SIZE - 10):
+        # 大部分单调递增，偶尔有迟到的日志
+        epoch = 100.0 + i if rng.random() < 0.9 else rng.uniform(0, 100 + i)
+        epochs.append(epoch)
+        timeline.append(epoch)
+        if i % 100 == 0:
+            since, until = sorted(rng.uniform(0, 100 + i) for _ in range(2))
+            assert list(timeline.window(since, until)) == [
+                offset for offset, e in enumerate(epochs) if since <= e <= until]
+    assert timeline._order is order
+
+    # 迟到的日志积累到上限时归并进排列
+    for i in range(TAIL_MERGE_SIZE):
+        epochs.append(float(i % 50))
+        timeline.append(float(i % 50))
+    assert timeline._order is not order
+    assert list(timeline.window(5, 10)) == [offset for offset, e in enumerate(epochs) if 5 <= e <= 10]
+
+
+def test_get_logs_by_time_range():
+    """测试按时间范围读取日志只返回窗口内的切片"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "timeindex"})})
+    task_id = response.json()["id"]
+    for minute in range(10):
+        client.post(f"/tasks/{task_id}/log", json={
+            "timestamp": f"2024-03-23T10:0{minute}:00", "content": f"第{minute}分钟",
+            "level": "ERROR" if minute % 2 else "INFO"})
+
+    logs = client.get(f"/tasks/{task_id}/logs", params={
+        "since": "2024-03-23T10:02:00", "until": "2024-03-23T10:05:00"}).json()
+    assert [log["content"] for log in logs] == ["第2分钟", "第3分钟", "第4分钟", "第5分钟"]
+
+    # epoch秒与ISO时间等价，可以和其他条件组合
+    since = parse_time("2024-03-23T10:06:00")
+    logs = client.get(f"/tasks/{task_id}/logs", params={"since": since, "level": "ERROR"}).json()
+    assert [log["content"] for log in logs] == ["第7分钟", "第9分钟"]
+
+    assert len(time_index.epochs(task_id)) == 10
+
+
+def test_unparseable_timestamp_uses_ingest_time():
+    """测试无法解析的时间戳按写入时间建立索引"""
+    response = client.post("/tasks", data={"params": json.dumps({"test": "timeindex"})})
+    task_id = response.json()["id"]
+    client.post(f"/tasks/{task_id}/log", json={"timestamp": "刚才", "content": "hello"})
+
+    epochs = time_index.epochs(task_id)
+    assert len(epochs) == 1
+    logs = client.get(f"/tasks/{task_id}/logs", params={"since": epochs[0] - 1}).json()
+    assert [log["content"] for log in logs] == ["hello"]
@@ -0,0 +1,127 @@
+"""
+日志时间索引
+
+日志写入时把 TaskLog.timestamp 规范化为epoch秒，按偏移顺序存入每个任务的数组。
+时间戳单调不减时数组本身有序，时间范围查询直接二分得到连续的偏移区间；
+出现乱序时间戳后，在下次查询时建立一次按时间排序的偏移排列。之后不早于排列末尾的新日志直接追加到排列，
+更早的放入按时间有序的尾部（插入排序），查询时排列和尾部分别二分，尾部积累到 TAIL_MERGE_SIZE 时线性归并进排列。
+"""
+import heapq
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from logfilter import parse_time
+from schemas import TaskLog
+
+# 乱序尾部达到该长度时归并进排序排列
+TAIL_MERGE_SIZE = 1024
+
+
+def _bounds(epochs: Sequence[float], since: Optional[float], until: Optional[float]):
+    lo = bisect_left(epochs, since) if since is not None else 0
+    hi = bisect_right(epochs, until) if until is not None else len(epochs)
+    return lo, max(lo, hi)
+
+
+class TaskTimeline:
+    def __init__(self):
+        self.epochs = array("d")
+        self.ordered = True
+        # 乱序时按时间排序的偏移排列及对应的时间，None表示还没有建立
+        self._order: Optional[array] = None
+        self._sorted_epochs: Optional[array] = None
+        # 建立排列后写入、早于排列末尾的日志，按时间有序
+        self._tail_order: List[int] = []
+        self._tail_epochs: List[float] = []
+
+    def append(self, epoch: float):
+        if self.ordered:
+            if self.epochs and epoch < self.epochs[-1]:
+                self.ordered = False
+        elif self._order is not None:
+            self._insert(len(self.epochs), epoch)
+        self.epochs.append(epoch)
+
+    def _insert(self, offset: int, epoch: float):
+        if not self._tail_epochs and epoch >= self._sorted_epochs[-1]:
+            self._order.append(offset)
+            self._sorted_epochs.append(epoch)
+            return
+        i = bisect_right(self._tail_epochs, epoch)
+        self._tail_epochs.insert(i, epoch)
+        self._tail_order.insert(i, offset)
+        if len(self._tail_epochs) >= TAIL_MERGE_SIZE:
+            self._merge_tail()
+
+    def _merge_tail(self):
+        order = array("I")
+        epochs = array("d")
+        for epoch, offset in heapq.merge(zip(self._sorted_epochs, self._order),
+                                         zip(self._tail_epochs, self._tail_order)):
+            epochs.append(epoch)
+            order.append(offset)
+        self._order, self._sorted_epochs = order, epochs
+        self._tail_order = []
+        self._tail_epochs = []
+
+    def _sorted(self):
+        if self._order is None:
+            epochs = self.epochs
+            self._order = array("I", sorted(range(len(epochs)), key=epochs.__getitem__))
+            self._sorted_epochs = array("d", (epochs[i] for i in self._order))
+        return self._order, self._sorted_epochs
+
+    def window(self, since: Optional[float], until: Optional[float]) -> Sequence[int]:
+        """返回时间落在 [since, until] 内的日志偏移，按偏移递增"""
+        if self.ordered:
+            return range(*_bounds(self.epochs, since, until))
+        order, epochs = self._sorted()
+        lo, hi = _bounds(epochs, since, until)
+        offsets = order[lo:hi].tolist()
+        if self._tail_epochs:
+            lo, hi = _bounds(self._tail_epochs, since, until)
+            offsets.extend(self._tail_order[lo:hi])
+        offsets.sort()
+        return offsets
+
+
+class TimeIndex:
+    def __init__(self):
+        self._timelines: Dict[str, TaskTimeline] = {}
+
+    def add(self, task_id: str, logs: Iterable[TaskLog]):
+        """记录追加日志的时间，无法解析的时间戳按写入时间处理"""
+        timeline = self._timelines.get(task_id)
+        if timeline is None:
+            timeline = self._timelines[task_id] = TaskTimeline()
+        now = time.time()
+        for log in logs:
+            epoch = parse_time(log.timestamp)
+            timeline.append(epoch if epoch is not None else now)
+
+    def remove(self, task_id: str):
+        self._timelines.pop(task_id, None)
+
+    def rebuild(self, task_id: str, logs: Iterable[TaskLog]):
+        self.remove(task_id)
+        self.add(task_id, logs)
+
+    def epochs(self, task_id: str) -> Optional[Sequence[float]]:
+        timeline = self._timelines.get(task_id)
+        return timeline.epochs if timeline is not None else None
+
+    def window(self, task_id: str, since: Optional[float],
+               until: Optional[float]) -> Sequence[int]:
+        timeline = self._timelines.get(task_id)
+        if timeline is None:
+            return range(0)
+        return timeline.window(since, until)
+
+    def stats(self) -> dict:
+        return {
+            "tasks": len(self._timelines),
+            "entries": sum(len(t.epochs) for t in self._timelines.values()),
+            "unordered_tasks": sum(1 for t in self._timelines.values() if not t.ordered),
+        }